@@ -0,0 +1,27 @@
+# Generated by Django 5.2.11 on 2026-10-18 06:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='summary_message_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'id'], name='ai_chat_mes_chat_id_4b878c_idx'),
+        ),
+    ]
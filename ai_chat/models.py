@@ -10,6 +10,9 @@ class Chat(models.Model):
         related_name="ai_chats",
     )
     title = models.CharField(max_length=255)
+    # Rolling summary of turns that no longer fit the request history.
+    summary = models.TextField(blank=True, default="")
+    summary_message_id = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -33,6 +36,9 @@ class Message(models.Model):
 
     class Meta:
         ordering = ("created_at", "id")
+        indexes = [
+            models.Index(fields=["chat", "id"]),
+        ]
 
     def save(self, *args, **kwargs):
         is_create = self._state.adding
@@ -19,6 +19,7 @@ class MessageSerializer(serializers.ModelSerializer):
 class SendMessageSerializer(serializers.Serializer):
     chat_id = serializers.IntegerField(required=False, allow_null=True, default=None)
     content = serializers.CharField()
+    stream = serializers.BooleanField(required=False, default=False)
 
     def validate_content(self, value):
         cleaned = value.strip()
@@ -5,7 +5,8 @@ from openai import APIConnectionError
 from openai import APIError
 from openai import APITimeoutError
 from openai import AuthenticationError
-from openai import OpenAI
+
+from paylog.openai_clients import get_openai_client
 
 
 logger = logging.getLogger(__name__)
@@ -23,20 +24,17 @@ class OpenAICompatibleAIService:
         self.timeout = timeout
 
     def _client(self):
-        kwargs = {
-            "api_key": self.api_key,
-            "timeout": self.timeout,
-        }
-        if self.base_url:
-            kwargs["base_url"] = self.base_url
-        return OpenAI(**kwargs)
+        return get_openai_client(self.api_key, self.base_url).with_options(timeout=self.timeout)
 
-    def generate_reply(self, messages):
+    def _check_configuration(self):
         if not self.api_key:
             raise AIServiceError("AI_API_KEY is not configured.")
         if not self.model:
             raise AIServiceError("AI_MODEL is not configured.")
 
+    def generate_reply(self, messages):
+        self._check_configuration()
+
         try:
             response = self._client().chat.completions.create(
                 model=self.model,
@@ -49,24 +47,56 @@ class OpenAICompatibleAIService:
         if not response.choices:
             raise AIServiceError("AI service returned no choices.")
 
-        content = response.choices[0].message.content
-        text = ""
-
-        if isinstance(content, str):
-            text = content
-        elif isinstance(content, list):
-            parts = []
-            for item in content:
-                if isinstance(item, dict):
-                    part = item.get("text")
-                else:
-                    part = getattr(item, "text", None)
-                if part:
-                    parts.append(part)
-            text = "".join(parts)
-
-        cleaned = text.strip()
+        cleaned = _content_text(response.choices[0].message.content).strip()
         if not cleaned:
             raise AIServiceError("AI service returned empty response.")
 
         return cleaned
+
+    def stream_reply(self, messages):
+        """
+        Yield reply text deltas as the model produces them.
+
+        Closing the generator early (client went away) closes the upstream
+        HTTP response, so the provider stops generating.
+        """
+        self._check_configuration()
+
+        try:
+            stream = self._client().chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+            )
+        except (AuthenticationError, APITimeoutError, APIConnectionError, APIError) as exc:
+            logger.exception("AI service request failed")
+            raise AIServiceError("AI service request failed.") from exc
+
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = _content_text(chunk.choices[0].delta.content)
+                if text:
+                    yield text
+        except (APITimeoutError, APIConnectionError, APIError) as exc:
+            logger.exception("AI service stream failed")
+            raise AIServiceError("AI service request failed.") from exc
+        finally:
+            stream.close()
+
+
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for item in content:
+            if isinstance(item, dict):
+                part = item.get("text")
+            else:
+                part = getattr(item, "text", None)
+            if part:
+                parts.append(part)
+        return "".join(parts)
+    return ""
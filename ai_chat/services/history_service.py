@@ -0,0 +1,217 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models import Chat, Message
+from .ai_service import AIServiceError
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_MAX_MESSAGES = 20
+DEFAULT_HISTORY_TOKEN_BUDGET = 3000
+DEFAULT_SUMMARY_BATCH = 10
+DEFAULT_SUMMARY_MAX_FOLD = 50
+DEFAULT_SUMMARY_MAX_CHARS = 2000
+MESSAGE_TOKEN_OVERHEAD = 4
+
+_summary_executor = None
+_summary_lock = threading.Lock()
+_summaries_in_flight = set()
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for your own future reference. "
+    "Keep names, numbers, decisions and open questions; drop small talk. "
+    "Answer in the conversation's language, in at most 150 words."
+)
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for the Latin/Cyrillic text we see; no tokenizer dependency.
+    return len(text) // 4 + MESSAGE_TOKEN_OVERHEAD
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _summary_message(summary):
+    return {"role": Message.Role.SYSTEM, "content": f"Conversation summary so far:\n{summary}"}
+
+
+def _fallback_summary(previous, messages, max_chars):
+    lines = [previous] if previous else []
+    lines.extend(f"{message['role']}: {message['content'][:200]}" for message in messages)
+    return "\n".join(lines)[-max_chars:]
+
+
+def fold_into_summary(chat, messages, summarize=None):
+    """
+    Merge ``messages`` (oldest first) into ``chat.summary`` and advance the cursor.
+
+    ``summarize`` takes chat-completion messages and returns text; when it is
+    missing or fails, a truncated transcript is kept instead so the cursor
+    still moves and history stays bounded.
+    """
+    if not messages:
+        return chat.summary
+
+    max_chars = _setting("AI_HISTORY_SUMMARY_MAX_CHARS", DEFAULT_SUMMARY_MAX_CHARS)
+    summary = ""
+    if summarize is not None:
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        prompt = f"Previous summary:\n{chat.summary}\n\nNew messages:\n{transcript}" if chat.summary else transcript
+        try:
+            summary = summarize(
+                [
+                    {"role": Message.Role.SYSTEM, "content": SUMMARY_INSTRUCTIONS},
+                    {"role": Message.Role.USER, "content": prompt},
+                ]
+            )[:max_chars]
+        except AIServiceError:
+            logger.warning("Summarizing chat %s failed; keeping a truncated transcript", chat.id)
+    if not summary:
+        summary = _fallback_summary(chat.summary, messages, max_chars)
+
+    # Only advance from the cursor this summary was built on, so a concurrent fold never goes backwards.
+    Chat.objects.filter(pk=chat.pk, summary_message_id=chat.summary_message_id).update(
+        summary=summary, summary_message_id=messages[-1]["id"]
+    )
+    chat.summary = summary
+    chat.summary_message_id = messages[-1]["id"]
+    return summary
+
+
+def summarize_overflow(chat, window_start, summarize=None):
+    """Fold the unsummarized messages of ``chat`` older than ``window_start`` into its summary."""
+    fold = list(
+        Message.objects.filter(chat=chat, id__gt=chat.summary_message_id, id__lt=window_start)
+        .order_by("id")
+        .values("id", "role", "content")[: _setting("AI_HISTORY_SUMMARY_MAX_FOLD", DEFAULT_SUMMARY_MAX_FOLD)]
+    )
+    fold_into_summary(chat, fold, summarize=summarize)
+
+
+def _get_summary_executor():
+    global _summary_executor
+
+    with _summary_lock:
+        if _summary_executor is None:
+            _summary_executor = ThreadPoolExecutor(
+                max_workers=_setting("AI_HISTORY_SUMMARY_WORKERS", 1), thread_name_prefix="ai-summary"
+            )
+        return _summary_executor
+
+
+def _summarize_in_background(chat_id, window_start, summarize):
+    try:
+        chat = Chat.objects.filter(pk=chat_id).first()
+        if chat is not None:
+            summarize_overflow(chat, window_start, summarize=summarize)
+    except Exception:  # noqa: BLE001
+        logger.exception("Background summary of chat %s failed", chat_id)
+    finally:
+        with _summary_lock:
+            _summaries_in_flight.discard(chat_id)
+        connection.close()
+
+
+def schedule_summary(chat, window_start, summarize=None):
+    """
+    Fold the chat's overflow off the request path, at most one fold per chat at a time.
+
+    With ``AI_HISTORY_SUMMARY_IN_BACKGROUND`` off the fold runs inline and
+    updates ``chat``.
+    """
+    chat_id = chat.id
+    if not _setting("AI_HISTORY_SUMMARY_IN_BACKGROUND", True):
+        summarize_overflow(chat, window_start, summarize=summarize)
+        return
+
+    def submit():
+        with _summary_lock:
+            if chat_id in _summaries_in_flight:
+                return
+            _summaries_in_flight.add(chat_id)
+        _get_summary_executor().submit(_summarize_in_background, chat_id, window_start, summarize)
+
+    # The worker uses its own connection, so it must only look once the new messages are committed.
+    transaction.on_commit(submit)
+
+
+def _fit_window(messages, max_messages, budget):
+    """Count how many of ``messages`` (newest first) fit ``budget``; the newest always does."""
+    window = 0
+    for message in messages[:max_messages]:
+        cost = estimate_tokens(message["content"])
+        if window and cost > budget:
+            break
+        window += 1
+        budget -= cost
+    return window, budget
+
+
+def _overflow_message(messages, budget):
+    """Truncated transcript of ``messages`` (newest first) that fits ``budget``, or None."""
+    lines = []
+    content = None
+    for message in messages:
+        lines.insert(0, f"{message['role']}: {message['content'][:200]}")
+        candidate = "Earlier messages, not summarized yet:\n" + "\n".join(lines)
+        if estimate_tokens(candidate) > budget:
+            break
+        content = candidate
+    if content is None:
+        return None
+    return {"role": Message.Role.SYSTEM, "content": content}
+
+
+def build_history(chat, summarize=None, max_messages=None, token_budget=None):
+    """
+    Return the chat-completion messages for the next request of ``chat``.
+
+    The newest ``max_messages`` messages after the summary cursor are
+    trimmed from the oldest end until they fit ``token_budget`` together
+    with the summary. Unsummarized messages older than that window are
+    sent as a truncated transcript in whatever budget is left; once
+    ``AI_HISTORY_SUMMARY_BATCH`` of them pile up they are folded into the
+    rolling summary off the request path (``schedule_summary``). Reads are
+    one reverse query on the (chat, id) index.
+    """
+    max_messages = max_messages or _setting("AI_HISTORY_MAX_MESSAGES", DEFAULT_HISTORY_MAX_MESSAGES)
+    token_budget = token_budget or _setting("AI_HISTORY_TOKEN_BUDGET", DEFAULT_HISTORY_TOKEN_BUDGET)
+    batch = _setting("AI_HISTORY_SUMMARY_BATCH", DEFAULT_SUMMARY_BATCH)
+
+    recent = list(
+        Message.objects.filter(chat=chat, id__gt=chat.summary_message_id)
+        .order_by("-id")
+        .values("id", "role", "content")[: max_messages + batch]
+    )
+    if not recent:
+        return [_summary_message(chat.summary)] if chat.summary else []
+
+    def summary_cost():
+        return estimate_tokens(_summary_message(chat.summary)["content"]) if chat.summary else 0
+
+    window, remaining = _fit_window(recent, max_messages, token_budget - summary_cost())
+
+    # Older messages than the last one fetched may exist too (e.g. a fold kept failing
+    # to run); the fold picks them up from the cursor.
+    if len(recent) - window >= batch:
+        previous_summary = chat.summary
+        schedule_summary(chat, recent[window - 1]["id"], summarize=summarize)
+        if chat.summary != previous_summary:
+            # Folded inline: the longer summary leaves less room for the window.
+            window, remaining = _fit_window(recent, max_messages, token_budget - summary_cost())
+
+    history = [{"role": message["role"], "content": message["content"]} for message in reversed(recent[:window])]
+    overflow = [message for message in recent[window:] if message["id"] > chat.summary_message_id]
+    overflow_message = _overflow_message(overflow, remaining) if overflow else None
+    if overflow_message is not None:
+        history.insert(0, overflow_message)
+    if chat.summary:
+        history.insert(0, _summary_message(chat.summary))
+    return history
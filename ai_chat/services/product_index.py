@@ -0,0 +1,311 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from decimal import Decimal
+
+from django.conf import settings
+
+from market.models import Product
+from market.search import tokenize
+
+
+DEFAULT_PRODUCT_INDEX_MAX_AGE = 300
+MIN_PREFIX_LENGTH = 2
+# Weight of a token by the field it came from; an exact token match counts double a prefix match.
+FIELD_WEIGHTS = {"name": 3, "category": 2, "description": 1}
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class IndexedProduct:
+    id: int
+    name: str
+    description: str | None
+    price: Decimal
+    image_url: str | None
+    image_urls: list
+    category_id: int
+    category_name: str
+    is_available: bool
+    tokens: dict = field(default_factory=dict, compare=False)
+
+    @classmethod
+    def build(cls, **values):
+        tokens = {}
+        for field_name, text in (
+            ("description", values["description"]),
+            ("category", values["category_name"]),
+            ("name", values["name"]),
+        ):
+            for token in tokenize(text):
+                tokens[token] = max(tokens.get(token, 0), FIELD_WEIGHTS[field_name])
+        return cls(**values, tokens=tokens)
+
+    @classmethod
+    def from_product(cls, product):
+        return cls.build(
+            id=product.id,
+            name=product.name,
+            description=product.description,
+            price=product.price,
+            image_url=product.image_url,
+            image_urls=product.image_urls,
+            category_id=product.category_id,
+            category_name=product.category.name,
+            is_available=product.is_available,
+        )
+
+    def to_product(self):
+        """Unsaved ``Product`` carrying the indexed fields, for serializing without a query."""
+        return Product(
+            id=self.id,
+            name=self.name,
+            description=self.description,
+            price=self.price,
+            image_url=self.image_url,
+            image_urls=self.image_urls,
+            category_id=self.category_id,
+            is_available=self.is_available,
+        )
+
+
+class ProductIndex:
+    """
+    Inverted index over product name, description and category name.
+
+    Built from one query on first use and then kept current by the
+    ``ai_chat.signals`` receivers. Other processes' writes are only picked
+    up by the full rebuild every ``PRODUCT_INDEX_MAX_AGE`` seconds.
+    """
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age if max_age is not None else getattr(
+            settings, "PRODUCT_INDEX_MAX_AGE", DEFAULT_PRODUCT_INDEX_MAX_AGE
+        )
+        self.built_at = None
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._products = {}
+        self._postings = defaultdict(set)
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def rebuild(self):
+        rows = (
+            Product.objects.order_by()
+            .values_list(
+                "id",
+                "name",
+                "description",
+                "price",
+                "image_url",
+                "image_urls",
+                "category_id",
+                "category__name",
+                "is_available",
+            )
+            .iterator(chunk_size=2000)
+        )
+        products = {}
+        postings = defaultdict(set)
+        for row in rows:
+            entry = IndexedProduct.build(
+                id=row[0],
+                name=row[1],
+                description=row[2],
+                price=row[3],
+                image_url=row[4],
+                image_urls=row[5],
+                category_id=row[6],
+                category_name=row[7],
+                is_available=row[8],
+            )
+            products[entry.id] = entry
+            for token in entry.tokens:
+                postings[token].add(entry.id)
+
+        with self._lock:
+            self._products = products
+            self._postings = postings
+            self._vocabulary = sorted(postings)
+            self._vocabulary_dirty = False
+            self.built_at = time.monotonic()
+
+    def _is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.max_age
+
+    def _ensure_fresh(self):
+        """
+        Rebuild a stale index in exactly one thread.
+
+        Until the first build everyone waits for it; afterwards a request that
+        finds another thread already rebuilding keeps using the current index.
+        """
+        if not self._is_stale():
+            return
+        if not self._rebuild_lock.acquire(blocking=not self.is_built):
+            return
+        try:
+            if self._is_stale():
+                self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def _remove(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        for token in entry.tokens:
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(product_id)
+            if not ids:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+
+    def _add(self, entry):
+        self._products[entry.id] = entry
+        for token in entry.tokens:
+            if token not in self._postings:
+                self._vocabulary_dirty = True
+            self._postings[token].add(entry.id)
+
+    def update_product(self, product):
+        if not self.is_built:
+            return
+        entry = IndexedProduct.from_product(product)
+        with self._lock:
+            self._remove(entry.id)
+            self._add(entry)
+
+    def remove_product(self, product_id):
+        if not self.is_built:
+            return
+        with self._lock:
+            self._remove(product_id)
+
+    def mark_unavailable(self, product_ids):
+        if not self.is_built:
+            return
+        with self._lock:
+            for product_id in product_ids:
+                entry = self._products.get(product_id)
+                if entry is not None:
+                    self._products[product_id] = replace(entry, is_available=False)
+
+    def rename_category(self, category_id, name):
+        if not self.is_built:
+            return
+        with self._lock:
+            for entry in [entry for entry in self._products.values() if entry.category_id == category_id]:
+                self._remove(entry.id)
+                values = {
+                    key: value for key, value in vars(entry).items() if key not in {"tokens", "category_name"}
+                }
+                self._add(IndexedProduct.build(**values, category_name=name))
+
+    def _matching_tokens(self, query_token):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        if len(query_token) < MIN_PREFIX_LENGTH:
+            return [query_token] if query_token in self._postings else []
+        vocabulary = self._vocabulary
+        position = bisect.bisect_left(vocabulary, query_token)
+        matches = []
+        while position < len(vocabulary) and vocabulary[position].startswith(query_token):
+            matches.append(vocabulary[position])
+            position += 1
+        return matches
+
+    def search(self, query, limit=None):
+        """
+        Products matching every query token (as a word or word prefix), best first.
+
+        Returns ``(score, IndexedProduct)`` pairs ordered by score, then newest.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return []
+
+        self._ensure_fresh()
+        with self._lock:
+            scores = None
+            for query_token in query_tokens:
+                token_scores = {}
+                for token in self._matching_tokens(query_token):
+                    multiplier = 2 if token == query_token else 1
+                    for product_id in self._postings[token]:
+                        score = self._products[product_id].tokens[token] * multiplier
+                        if score > token_scores.get(product_id, 0):
+                            token_scores[product_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        product_id: scores[product_id] + score
+                        for product_id, score in token_scores.items()
+                        if product_id in scores
+                    }
+                if not scores:
+                    return []
+            ranked = sorted(
+                ((score, self._products[product_id]) for product_id, score in scores.items()),
+                key=lambda item: (item[0], item[1].id),
+                reverse=True,
+            )
+        return ranked[:limit] if limit else ranked
+
+    def best_match(self, query, max_price=None):
+        entry = choose_best_product(
+            [(score, entry) for score, entry in self.search(query) if entry.is_available],
+            max_price=max_price,
+        )
+        return entry.to_product() if entry is not None else None
+
+
+def choose_best_product(candidates, max_price=None):
+    """
+    Pick from ``(score, product)`` pairs: the most relevant product, ties
+    going to the priciest one within ``max_price``. When nothing fits the
+    budget, the most relevant cheapest product is returned instead.
+
+    Relevance comes first on purpose: the old ``icontains`` matcher treated
+    every hit as equal and picked the priciest, so a description mentioning
+    "cola" could beat the cola itself.
+    """
+    if not candidates:
+        return None
+
+    within_budget = [
+        (score, product) for score, product in candidates if max_price is None or product.price <= max_price
+    ]
+    if within_budget:
+        return max(within_budget, key=lambda item: (item[0], item[1].price, item[1].id))[1]
+    return min(candidates, key=lambda item: (-item[0], item[1].price, item[1].id))[1]
+
+
+def get_product_index():
+    global _index
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ProductIndex()
+    return _index
+
+
+def reset_product_index():
+    global _index
+
+    with _index_lock:
+        _index = None
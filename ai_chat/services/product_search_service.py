@@ -1,8 +1,12 @@
 import re
 from decimal import Decimal
 
+from django.conf import settings
+
 from market.models import Product
-from market.services import filter_products
+from market.search import search_products
+
+from .product_index import choose_best_product, get_product_index
 
 BUDGET_UNIT_PATTERN = re.compile(
     r"(?P<amount>\d+(?:[.,]\d+)?)\s*(?P<unit>k|ming|mln|million|m)\b",
@@ -12,6 +16,7 @@ BUDGET_CURRENCY_PATTERN = re.compile(
     r"(?P<amount>[\d\s.,]+)\s*(so'm|som|soum|uzs|sum)\b",
     re.IGNORECASE,
 )
+SEARCH_CANDIDATES = 20
 STOP_WORDS = {
     "menga",
     "kerak",
@@ -79,26 +84,14 @@ def _product_image_urls(product):
 def find_best_product_from_message(raw_text):
     query_text = _extract_query(raw_text)
     max_price = _extract_budget(raw_text)
+    if getattr(settings, "AI_CHAT_PRODUCT_INDEX", True):
+        return get_product_index().best_match(query_text, max_price=max_price)
 
-    base_queryset = Product.objects.select_related("category").all()
-
-    filtered = filter_products(
-        base_queryset,
-        q=query_text,
-        is_available="true",
-        max_price=str(max_price) if max_price is not None else None,
-    )
-
-    best = filtered.order_by("-price", "-id").first()
-    if best is not None:
-        return best
-
-    fallback = filter_products(
-        base_queryset,
-        q=query_text,
-        is_available="true",
+    candidates = search_products(Product.objects.filter(is_available=True), query_text)[:SEARCH_CANDIDATES]
+    return choose_best_product(
+        [(getattr(product, "search_rank", 0), product) for product in candidates],
+        max_price=max_price,
     )
-    return fallback.order_by("price", "id").first()
 
 
 def serialize_product(product):
@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from market.models import Category, Product
+from market.signals import stock_changed
+
+from .services.product_index import get_product_index
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_product_index().update_product(instance))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    product_id = instance.id
+    transaction.on_commit(lambda: get_product_index().remove_product(product_id))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: get_product_index().rename_category(instance.id, instance.name))
+
+
+@receiver(stock_changed)
+def unindex_sold_out_products(sender, sold_out_ids=(), **kwargs):
+    if sold_out_ids:
+        transaction.on_commit(lambda: get_product_index().mark_unavailable(sold_out_ids))
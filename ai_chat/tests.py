@@ -1,20 +1,39 @@
+import json
+import threading
+import time
 from datetime import timedelta
-from unittest.mock import patch
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
 
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from market.models import Category, Product
+from market.services import place_checkout_order
+from paylog.ai_reply_cache import normalize_prompt, reply_cache_stats, reset_reply_cache_stats
+from paylog.openai_clients import close_openai_clients, get_openai_client
 from users.models import User
 
 from .models import Chat, Message
+from .services.ai_service import AIServiceError, OpenAICompatibleAIService
+from .services import history_service
+from .services.history_service import build_history, estimate_tokens
+from .services.product_index import get_product_index, reset_product_index
+from .services.product_search_service import find_best_product_from_message, serialize_product
 
 
 class AIChatAPITests(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(phone="+19990000001", password="pass")
         self.other_user = User.objects.create_user(phone="+19990000002", password="pass")
+        caches["ai_replies"].clear()
 
     @patch("ai_chat.views.ai_service.generate_reply", return_value="Hello from AI")
     def test_first_message_creates_new_chat(self, generate_reply_mock):
@@ -112,3 +131,497 @@ class AIChatAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 3)
         self.assertEqual([item["content"] for item in response.data], ["System", "Hi", "Hello"])
+
+
+class OpenAIStubServer:
+    """Local OpenAI-compatible chat completions endpoint that records which connection served each call."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                stub.requests.append((self.client_address, self.path, payload))
+                if stub.failures:
+                    stub.failures -= 1
+                    self._send(500, {"error": {"message": "try again"}}, {"retry-after-ms": "10"})
+                    return
+                if payload.get("stream"):
+                    self._send_stream(payload, ["Hel", "lo", "!"])
+                    return
+                self._send(
+                    200,
+                    {
+                        "id": "chatcmpl-1",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": payload.get("model", ""),
+                        "choices": [
+                            {
+                                "index": 0,
+                                "finish_reason": "stop",
+                                "message": {"role": "assistant", "content": f"reply {len(stub.requests)}"},
+                            }
+                        ],
+                    },
+                )
+
+            def _send(self, code, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, payload, deltas):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for delta in deltas:
+                    chunk = {
+                        "id": "chatcmpl-1",
+                        "object": "chat.completion.chunk",
+                        "created": 0,
+                        "model": payload.get("model", ""),
+                        "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        close_openai_clients()
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def connections(self):
+        return {client_address for client_address, _path, _payload in self.requests}
+
+
+@override_settings(OPENAI_MAX_RETRIES=2)
+class PooledOpenAIClientTests(SimpleTestCase):
+    def test_client_is_shared_per_base_url_and_key(self):
+        client = get_openai_client("key-1", "http://127.0.0.1:1/v1")
+
+        self.assertIs(get_openai_client("key-1", "http://127.0.0.1:1/v1"), client)
+        self.assertIsNot(get_openai_client("key-2", "http://127.0.0.1:1/v1"), client)
+        close_openai_clients()
+
+    def test_replies_reuse_one_keep_alive_connection(self):
+        with OpenAIStubServer() as stub:
+            service = OpenAICompatibleAIService(api_key="test-key", model="test-model", base_url=stub.url)
+            replies = [service.generate_reply([{"role": "user", "content": "hi"}]) for _ in range(3)]
+
+        self.assertEqual(replies, ["reply 1", "reply 2", "reply 3"])
+        self.assertEqual(stub.requests[0][1], "/v1/chat/completions")
+        self.assertEqual(len(stub.connections), 1)
+
+    def test_server_errors_are_retried(self):
+        with OpenAIStubServer(failures=1) as stub:
+            service = OpenAICompatibleAIService(api_key="test-key", model="test-model", base_url=stub.url)
+            reply = service.generate_reply([{"role": "user", "content": "hi"}])
+
+        self.assertEqual(reply, "reply 2")
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_stream_reply_yields_deltas(self):
+        with OpenAIStubServer() as stub:
+            service = OpenAICompatibleAIService(api_key="test-key", model="test-model", base_url=stub.url)
+            deltas = list(service.stream_reply([{"role": "user", "content": "hi"}]))
+
+        self.assertEqual(deltas, ["Hel", "lo", "!"])
+        self.assertTrue(stub.requests[0][2]["stream"])
+
+
+def parse_sse(chunks):
+    events = []
+    for block in b"".join(chunks).decode("utf-8").split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class StreamingSendMessageTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+19990000011", password="pass")
+        self.client.force_authenticate(user=self.user)
+        caches["ai_replies"].clear()
+
+    @patch("ai_chat.views.ai_service.stream_reply")
+    def test_deltas_are_forwarded_and_reply_saved_at_end(self, stream_reply_mock):
+        stream_reply_mock.return_value = (delta for delta in ["Salom", ", ", "dunyo"])
+
+        response = self.client.post(
+            reverse("ai-chat-send-message"),
+            {"content": "Hello", "stream": True},
+            format="json",
+        )
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = parse_sse(response.streaming_content)
+        self.assertEqual([name for name, _data in events], ["start", "delta", "delta", "delta", "done"])
+        self.assertEqual(events[0][1]["user_message"]["content"], "Hello")
+        self.assertEqual("".join(data["content"] for name, data in events if name == "delta"), "Salom, dunyo")
+        assistant = Message.objects.get(role=Message.Role.ASSISTANT)
+        self.assertEqual(assistant.content, "Salom, dunyo")
+        self.assertEqual(events[-1][1]["assistant_message"]["id"], assistant.id)
+
+    @patch("ai_chat.views.ai_service.stream_reply")
+    def test_client_disconnect_closes_upstream_without_saving(self, stream_reply_mock):
+        closed = []
+
+        def deltas(history):
+            try:
+                yield "partial"
+                yield "never sent"
+            finally:
+                closed.append(True)
+
+        stream_reply_mock.side_effect = deltas
+
+        response = self.client.post(
+            reverse("ai-chat-send-message"),
+            {"content": "Hello"},
+            format="json",
+            HTTP_ACCEPT="text/event-stream",
+        )
+        chunks = iter(response.streaming_content)
+        next(chunks)
+        self.assertIn(b"partial", next(chunks))
+        response.close()
+
+        self.assertEqual(closed, [True])
+        self.assertFalse(Message.objects.filter(role=Message.Role.ASSISTANT).exists())
+
+    @patch("ai_chat.views.ai_service.stream_reply")
+    def test_stream_error_is_reported_as_event(self, stream_reply_mock):
+        def deltas(history):
+            raise AIServiceError("AI service request failed.")
+            yield
+
+        stream_reply_mock.side_effect = deltas
+
+        response = self.client.post(
+            reverse("ai-chat-send-message"),
+            {"content": "Hello", "stream": True},
+            format="json",
+        )
+
+        events = parse_sse(response.streaming_content)
+        self.assertEqual(events[-1], ("error", {"ai_error": "AI service request failed."}))
+        self.assertFalse(Message.objects.filter(role=Message.Role.ASSISTANT).exists())
+
+
+@override_settings(AI_HISTORY_SUMMARY_IN_BACKGROUND=False)
+class HistoryBuilderTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+19990000021", password="pass")
+        self.chat = Chat.objects.create(user=self.user, title="Long chat")
+        # Mocked executors never run the job that would clear its chat from the in-flight set.
+        self.addCleanup(history_service._summaries_in_flight.clear)
+
+    def _add(self, count, content="message"):
+        for i in range(count):
+            role = Message.Role.USER if i % 2 == 0 else Message.Role.ASSISTANT
+            Message.objects.create(chat=self.chat, role=role, content=f"{content} {i}")
+
+    def test_only_messages_after_the_summary_are_read(self):
+        self._add(8)
+        folded = Message.objects.filter(chat=self.chat).order_by("id")[2]
+        Chat.objects.filter(pk=self.chat.pk).update(summary="Earlier turns.", summary_message_id=folded.id)
+        self.chat.refresh_from_db()
+
+        with CaptureQueriesContext(connection) as queries:
+            history = build_history(self.chat, max_messages=5)
+
+        self.assertIn("Earlier turns.", history[0]["content"])
+        self.assertEqual([item["content"] for item in history[1:]], [f"message {i}" for i in range(3, 8)])
+        self.assertLessEqual(len(queries), 2)
+
+    @override_settings(AI_HISTORY_SUMMARY_BATCH=1)
+    def test_token_budget_drops_oldest_but_keeps_latest(self):
+        Message.objects.create(chat=self.chat, role=Message.Role.USER, content="x" * 4000)
+        Message.objects.create(chat=self.chat, role=Message.Role.ASSISTANT, content="short answer")
+        Message.objects.create(chat=self.chat, role=Message.Role.USER, content="y" * 4000)
+
+        history = build_history(self.chat, token_budget=1200)
+
+        self.assertEqual(history[0]["role"], Message.Role.SYSTEM)
+        self.assertEqual([item["content"][:5] for item in history[1:]], ["short", "yyyyy"])
+
+    @override_settings(AI_HISTORY_SUMMARY_BATCH=4)
+    def test_overflow_is_folded_into_rolling_summary(self):
+        self._add(10)
+        summarize = Mock(return_value="User asked about messages 0-5.")
+
+        history = build_history(self.chat, summarize=summarize, max_messages=4)
+
+        self.chat.refresh_from_db()
+        folded = Message.objects.filter(chat=self.chat).order_by("id")[5]
+        self.assertEqual(self.chat.summary, "User asked about messages 0-5.")
+        self.assertEqual(self.chat.summary_message_id, folded.id)
+        self.assertIn("message 5", summarize.call_args.args[0][1]["content"])
+        self.assertEqual(history[0]["role"], Message.Role.SYSTEM)
+        self.assertIn("User asked about messages 0-5.", history[0]["content"])
+        self.assertEqual([item["content"] for item in history[1:]], [f"message {i}" for i in range(6, 10)])
+
+        summarize.reset_mock()
+        build_history(self.chat, summarize=summarize, max_messages=4)
+        summarize.assert_not_called()
+
+    @override_settings(AI_HISTORY_SUMMARY_BATCH=4)
+    def test_overflow_below_a_batch_is_still_sent(self):
+        self._add(7)
+        summarize = Mock(return_value="unused")
+
+        history = build_history(self.chat, summarize=summarize, max_messages=4)
+
+        summarize.assert_not_called()
+        self.assertEqual(history[0]["role"], Message.Role.SYSTEM)
+        self.assertIn("user: message 0\nassistant: message 1\nuser: message 2", history[0]["content"])
+        self.assertEqual([item["content"] for item in history[1:]], [f"message {i}" for i in range(3, 7)])
+
+    @override_settings(AI_HISTORY_SUMMARY_BATCH=2, AI_HISTORY_SUMMARY_IN_BACKGROUND=True)
+    def test_summary_runs_off_the_request_after_commit(self):
+        self._add(5)
+        summarize = Mock(return_value="summary")
+
+        with patch("ai_chat.services.history_service._get_summary_executor") as executor_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                history = build_history(self.chat, summarize=summarize, max_messages=2)
+                executor_mock.return_value.submit.assert_not_called()
+
+        summarize.assert_not_called()
+        executor_mock.return_value.submit.assert_called_once()
+        self.assertIn("assistant: message 1\nuser: message 2", history[0]["content"])
+        self.assertEqual([item["content"] for item in history[1:]], [f"message {i}" for i in range(3, 5)])
+
+    @override_settings(AI_HISTORY_SUMMARY_IN_BACKGROUND=True)
+    def test_history_stays_within_budget_while_summary_is_pending(self):
+        self._add(25, content="z" * 4000)
+        Chat.objects.filter(pk=self.chat.pk).update(summary="s" * 2000)
+        self.chat.refresh_from_db()
+
+        with patch("ai_chat.services.history_service._get_summary_executor") as executor_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                history = build_history(self.chat, summarize=Mock(return_value="summary"))
+
+        executor_mock.return_value.submit.assert_called_once()
+        self.assertLessEqual(sum(estimate_tokens(item["content"]) for item in history), 3000)
+        self.assertTrue(history[-1]["content"].endswith(" 24"))
+
+    @override_settings(AI_HISTORY_SUMMARY_BATCH=2)
+    def test_failed_summary_falls_back_to_truncated_transcript(self):
+        self._add(5)
+
+        build_history(self.chat, summarize=Mock(side_effect=AIServiceError("down")), max_messages=2)
+
+        self.chat.refresh_from_db()
+        self.assertIn("user: message 0", self.chat.summary)
+        self.assertGreater(self.chat.summary_message_id, 0)
+
+
+class ReplyCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+19990000031", password="pass")
+        self.client.force_authenticate(user=self.user)
+        caches["ai_replies"].clear()
+        reset_reply_cache_stats()
+
+    def _send(self, content, chat_id=None, **extra):
+        return self.client.post(
+            reverse("ai-chat-send-message"),
+            {"chat_id": chat_id, "content": content, **extra},
+            format="json",
+        )
+
+    def test_prompt_normalization(self):
+        self.assertEqual(normalize_prompt("  Salom,   qalaysiz?! "), normalize_prompt("salom, QALAYSIZ"))
+
+    @patch("ai_chat.views.ai_service.generate_reply", return_value="Salom! Qanday yordam bera olaman?")
+    def test_repeated_prompt_is_answered_from_cache(self, generate_reply_mock):
+        first = self._send("Salom")
+        second = self._send("  salom! ")
+
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data["assistant_message"]["content"], first.data["assistant_message"]["content"])
+        generate_reply_mock.assert_called_once()
+        stats = reply_cache_stats()["ai_chat"]
+        self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (1, 1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    @override_settings(AI_REPLY_CACHE_STATS_LOG_EVERY=2)
+    @patch("ai_chat.views.ai_service.generate_reply", return_value="Salom!")
+    def test_hit_ratio_is_logged_periodically(self, generate_reply_mock):
+        self._send("Salom")
+        with self.assertLogs("paylog.ai_reply_cache", level="INFO") as logs:
+            self._send("Salom")
+
+        self.assertEqual(
+            logs.output, ["INFO:paylog.ai_reply_cache:AI reply cache ai_chat: 1 hits, 1 misses, hit ratio 0.50"]
+        )
+
+    @patch("ai_chat.views.ai_service.generate_reply", side_effect=["First", "With context"])
+    def test_history_is_part_of_the_key(self, generate_reply_mock):
+        chat = Chat.objects.create(user=self.user, title="Context")
+        Message.objects.create(chat=chat, role=Message.Role.USER, content="Narxi qancha?")
+        Message.objects.create(chat=chat, role=Message.Role.ASSISTANT, content="10 000 so'm")
+
+        self._send("Rahmat")
+        response = self._send("Rahmat", chat_id=chat.id)
+
+        self.assertEqual(response.data["assistant_message"]["content"], "With context")
+        self.assertEqual(generate_reply_mock.call_count, 2)
+
+    @patch("ai_chat.views.ai_service.stream_reply")
+    def test_streamed_reply_is_cached(self, stream_reply_mock):
+        stream_reply_mock.return_value = (delta for delta in ["Salom", "!"])
+        parse_sse(self._send("Salom", stream=True).streaming_content)
+
+        events = parse_sse(self._send("Salom", stream=True).streaming_content)
+
+        self.assertEqual([name for name, _data in events], ["start", "done"])
+        self.assertEqual(events[-1][1]["assistant_message"]["content"], "Salom!")
+        stream_reply_mock.assert_called_once()
+
+    @override_settings(AI_REPLY_CACHE={"ai_chat": {"timeout": 0}})
+    @patch("ai_chat.views.ai_service.generate_reply", return_value="Hello")
+    def test_cache_can_be_disabled_per_endpoint(self, generate_reply_mock):
+        self._send("Hello")
+        self._send("Hello")
+
+        self.assertEqual(generate_reply_mock.call_count, 2)
+        self.assertEqual(reply_cache_stats(), {})
+
+    @patch("ai_chat.views.ai_service.generate_reply", side_effect=AIServiceError("AI service request failed."))
+    def test_failures_are_not_cached(self, generate_reply_mock):
+        self._send("Hello")
+        self._send("Hello")
+
+        self.assertEqual(generate_reply_mock.call_count, 2)
+        self.assertNotIn("stores", {key for key, value in reply_cache_stats()["ai_chat"].items() if value})
+
+
+class ProductIndexTests(TestCase):
+    def setUp(self):
+        reset_product_index()
+        self.drinks = Category.objects.create(name="Ichimliklar")
+        self.food = Category.objects.create(name="Taomlar")
+        self.cola = Product.objects.create(name="Coca-Cola 1L", price=Decimal("12000"), category=self.drinks)
+        self.cola_big = Product.objects.create(name="Coca-Cola 2L", price=Decimal("18000"), category=self.drinks)
+        self.plov = Product.objects.create(
+            name="O‘zbek oshi",
+            description="Choyxona uslubida, cola bilan",
+            price=Decimal("35000"),
+            category=self.food,
+        )
+
+    def test_search_ranks_name_matches_above_description_matches(self):
+        results = get_product_index().search("cola")
+
+        self.assertEqual([entry.id for _score, entry in results], [self.cola_big.id, self.cola.id, self.plov.id])
+
+    def test_apostrophe_variants_and_prefixes_match(self):
+        self.assertEqual(get_product_index().search("o'zbek osh")[0][1].id, self.plov.id)
+        self.assertEqual(get_product_index().search("ichimlik")[0][1].category_name, "Ichimliklar")
+
+    def test_best_match_is_served_without_queries(self):
+        get_product_index().rebuild()
+
+        with self.assertNumQueries(0):
+            within_budget = find_best_product_from_message("Menga coca cola kerak 15 ming so'm")
+            over_budget = find_best_product_from_message("coca cola 5k")
+            unbounded = find_best_product_from_message("coca cola")
+
+        self.assertEqual(within_budget.id, self.cola.id)
+        self.assertEqual(over_budget.id, self.cola.id)
+        self.assertEqual(unbounded.id, self.cola_big.id)
+        self.assertEqual(serialize_product(unbounded)["price"], "18000.00")
+
+    def test_relevance_outranks_price_within_budget(self):
+        # Intentional change from the icontains matcher, which returned the priciest hit:
+        # the plov only mentions cola in its description, so the cheaper cola wins.
+        self.assertEqual(get_product_index().best_match("cola", max_price=Decimal("50000")).id, self.cola_big.id)
+        self.assertEqual(get_product_index().best_match("cola 1l", max_price=Decimal("50000")).id, self.cola.id)
+
+    def test_concurrent_stale_lookups_rebuild_once(self):
+        index = get_product_index()
+        index.rebuild()
+        index.built_at -= index.max_age + 1
+        started = threading.Event()
+        release = threading.Event()
+        rebuilds = []
+
+        def slow_rebuild():
+            rebuilds.append(threading.current_thread().name)
+            started.set()
+            release.wait(5)
+            index.built_at = time.monotonic()
+
+        with patch.object(index, "rebuild", side_effect=slow_rebuild):
+            worker = threading.Thread(target=index.search, args=("cola",))
+            worker.start()
+            started.wait(5)
+            # The stale index keeps answering while one thread rebuilds it.
+            self.assertEqual(index.search("cola")[0][1].id, self.cola_big.id)
+            release.set()
+            worker.join(5)
+
+        self.assertEqual(len(rebuilds), 1)
+
+    def test_signals_update_the_index_incrementally(self):
+        index = get_product_index()
+        index.rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cola_big.is_available = False
+            self.cola_big.save()
+            Product.objects.create(name="Fanta", price=Decimal("11000"), category=self.drinks)
+            self.cola.delete()
+            self.food.name = "Milliy taomlar"
+            self.food.save()
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(find_best_product_from_message("coca cola"))
+            self.assertEqual(find_best_product_from_message("fanta").name, "Fanta")
+            self.assertEqual(index.search("milliy")[0][1].id, self.plov.id)
+
+    def test_sold_out_products_leave_the_index_after_checkout(self):
+        user = User.objects.create_user(phone="+19990000041", password="pass")
+        self.cola.stock = 1
+        self.cola.save()
+        get_product_index().rebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            place_checkout_order(user, {self.cola.id: 1})
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(find_best_product_from_message("coca cola 1l"))
+
+    @override_settings(AI_CHAT_PRODUCT_INDEX=False)
+    def test_matcher_can_use_the_search_backend(self):
+        self.assertEqual(find_best_product_from_message("coca cola 15 ming so'm").id, self.cola.id)
+        self.assertEqual(find_best_product_from_message("ozbek oshi").id, self.plov.id)
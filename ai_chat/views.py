@@ -1,14 +1,23 @@
+import logging
+
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.generics import ListAPIView, RetrieveDestroyAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
+from message.events import format_sse
+from message.renderers import EventStreamRenderer
+from paylog.ai_reply_cache import get_cached_reply, reply_cache_key, store_reply
+
 from .models import Chat, Message
 from .serializers import ChatSerializer, MessageSerializer, SendMessageSerializer
 from .services.ai_service import AIServiceError, OpenAICompatibleAIService
+from .services.history_service import build_history
 from .services.product_search_service import (
     find_best_product_from_message,
     format_product_reply,
@@ -17,11 +26,58 @@ from .services.product_search_service import (
 from .services.telegram_service import is_food_order_message, notify_food_order
 
 
+logger = logging.getLogger(__name__)
+
 ai_service = OpenAICompatibleAIService()
+# Summaries run in the background; a short timeout keeps a slow model from tying up the worker.
+summary_service = OpenAICompatibleAIService(timeout=getattr(settings, "AI_HISTORY_SUMMARY_TIMEOUT", 15.0))
+
+REPLY_CACHE_ENDPOINT = "ai_chat"
+
+
+def stream_send_message_events(payload, chat, history=None, assistant_message=None, cache_key=None):
+    """
+    SSE body for a streamed send: ``start`` with the request context, ``delta``
+    events while the model writes, then ``done`` with the saved assistant
+    message (or ``error``). The assistant message is only stored once the
+    reply is complete; if the client disconnects the upstream request is
+    closed and nothing is saved.
+    """
+    yield format_sse(payload, event="start")
+
+    if assistant_message is None:
+        parts = []
+        deltas = ai_service.stream_reply(history)
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield format_sse({"content": delta}, event="delta")
+        except AIServiceError as exc:
+            yield format_sse({"ai_error": str(exc)}, event="error")
+            return
+        except GeneratorExit:
+            logger.info("AI reply stream for chat %s cancelled by the client", chat.id)
+            raise
+        finally:
+            deltas.close()
+
+        content = "".join(parts).strip()
+        if not content:
+            yield format_sse({"ai_error": "AI service returned empty response."}, event="error")
+            return
+        assistant_message = Message.objects.create(
+            chat=chat,
+            role=Message.Role.ASSISTANT,
+            content=content,
+        )
+        store_reply(REPLY_CACHE_ENDPOINT, cache_key, content)
+
+    yield format_sse({"assistant_message": MessageSerializer(assistant_message).data}, event="done")
 
 
 class SendMessageAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
 
     def post(self, request):
         serializer = SendMessageSerializer(data=request.data)
@@ -29,6 +85,7 @@ class SendMessageAPIView(APIView):
 
         chat_id = serializer.validated_data.get("chat_id")
         content = serializer.validated_data["content"]
+        stream = serializer.validated_data["stream"] or request.accepted_renderer.media_type == "text/event-stream"
 
         if chat_id is None:
             chat = Chat.objects.create(user=request.user, title=content[:40])
@@ -49,15 +106,15 @@ class SendMessageAPIView(APIView):
         best_product = find_best_product_from_message(content)
         best_product_data = serialize_product(best_product)
 
+        assistant_message = None
+        history = None
+        cache_key = None
         if best_product is not None:
             assistant_message = Message.objects.create(
                 chat=chat,
                 role=Message.Role.ASSISTANT,
                 content=format_product_reply(best_product),
             )
-            assistant_data = MessageSerializer(assistant_message).data
-            ai_error = None
-            response_status = status.HTTP_201_CREATED
         else:
             allowed_phone = getattr(settings, "AI_CHAT_ALLOWED_PHONE", "")
             if allowed_phone and request.user.phone == allowed_phone:
@@ -66,37 +123,59 @@ class SendMessageAPIView(APIView):
                     role=Message.Role.ASSISTANT,
                     content=getattr(settings, "AI_CHAT_STATIC_REPLY", ""),
                 )
-                assistant_data = MessageSerializer(assistant_message).data
-                ai_error = None
-                response_status = status.HTTP_201_CREATED
             else:
-                history = list(
-                    Message.objects.filter(chat=chat)
-                    .order_by("created_at", "id")
-                    .values("role", "content")
-                )
-
-                try:
-                    ai_reply = ai_service.generate_reply(history)
+                history = build_history(chat, summarize=summary_service.generate_reply)
+                cache_key = reply_cache_key(REPLY_CACHE_ENDPOINT, ai_service.model, history)
+                cached_reply = get_cached_reply(REPLY_CACHE_ENDPOINT, cache_key)
+                if cached_reply is not None:
                     assistant_message = Message.objects.create(
                         chat=chat,
                         role=Message.Role.ASSISTANT,
-                        content=ai_reply,
+                        content=cached_reply,
                     )
-                    assistant_data = MessageSerializer(assistant_message).data
-                    ai_error = None
-                    response_status = status.HTTP_201_CREATED
-                except AIServiceError as exc:
-                    assistant_data = None
-                    ai_error = str(exc)
-                    response_status = status.HTTP_502_BAD_GATEWAY
+
+        if stream:
+            payload = {
+                "chat": ChatSerializer(chat).data,
+                "created_new_chat": created_new_chat,
+                "user_message": MessageSerializer(user_message).data,
+                "best_product": best_product_data,
+            }
+            response = StreamingHttpResponse(
+                stream_send_message_events(
+                    payload,
+                    chat,
+                    history=history,
+                    assistant_message=assistant_message,
+                    cache_key=cache_key,
+                ),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        ai_error = None
+        response_status = status.HTTP_201_CREATED
+        if assistant_message is None:
+            try:
+                ai_reply = ai_service.generate_reply(history)
+                assistant_message = Message.objects.create(
+                    chat=chat,
+                    role=Message.Role.ASSISTANT,
+                    content=ai_reply,
+                )
+                store_reply(REPLY_CACHE_ENDPOINT, cache_key, ai_reply)
+            except AIServiceError as exc:
+                ai_error = str(exc)
+                response_status = status.HTTP_502_BAD_GATEWAY
 
         return Response(
             {
                 "chat": ChatSerializer(chat).data,
                 "created_new_chat": created_new_chat,
                 "user_message": MessageSerializer(user_message).data,
-                "assistant_message": assistant_data,
+                "assistant_message": MessageSerializer(assistant_message).data if assistant_message else None,
                 "best_product": best_product_data,
                 "ai_error": ai_error,
             },
@@ -1,7 +1,6 @@
 from rest_framework import serializers
 
-from finance.models import DebtorTransaction
-from finance.services import get_balance_data_for_queryset
+from finance.services import get_balance_data_by_phone
 
 from .models import PayNoteChat, DebtorChat
 
@@ -49,13 +48,10 @@ class DebtorChatSerializer(serializers.ModelSerializer):
         if not request:
             return None
 
-        balance_data = get_balance_data_for_queryset(
-            DebtorTransaction.objects.filter(user=request.user, phone=obj.phone)
-        )
-        if balance_data["currency"] is None:
-            return {"balance": 0, "currency": None}
-
-        return balance_data
+        balances = self.context.get("balances")
+        if balances is None:
+            balances = get_balance_data_by_phone(user=request.user, phones=[obj.phone])
+        return balances.get(obj.phone) or {"balance": 0, "currency": None}
 
 
 class DebtorChatCreateSerializer(serializers.ModelSerializer):
@@ -1,3 +1,102 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from finance.models import Currency, DebtorTransaction
+from finance.services import backfill_ledger_summaries
+from users.models import User
+
+from .models import DebtorChat
+
+
+class ChatListTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000041", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.client.force_authenticate(user=self.user)
+
+    def _create_debtors(self, count, start=0):
+        for i in range(start, start + count):
+            phone = f"+99890000{i:04d}"
+            DebtorChat.objects.create(owner=self.user, full_name=f"Debtor {i}", phone=phone)
+            DebtorTransaction.objects.create(
+                user=self.user,
+                type=DebtorTransaction.Type.INCOME,
+                amount=Decimal("10.00"),
+                currency=self.currency,
+                phone=phone,
+            )
+            DebtorTransaction.objects.create(
+                user=self.user,
+                type=DebtorTransaction.Type.EXPENSE,
+                amount=Decimal("3.00"),
+                currency=self.currency,
+                phone=phone,
+            )
+        list(backfill_ledger_summaries())
+
+    def _list(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("chat-list"), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_list_query_count_does_not_grow_with_debtors(self):
+        self._create_debtors(2)
+        self._list()
+        _, small_count = self._list()
+
+        self._create_debtors(28, start=2)
+        response, large_count = self._list()
+
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(response.data["results"]), 31)
+        debtor = response.data["results"][1]
+        self.assertEqual(debtor["total_balance"], {"balance": Decimal("7.00"), "currency": "USD"})
+
+    def test_debtor_without_transactions_has_zero_balance(self):
+        DebtorChat.objects.create(owner=self.user, full_name="New", phone="+998911111111")
+
+        response, _ = self._list()
+
+        self.assertEqual(response.data["results"][0]["type"], "PAYNOTE")
+        self.assertEqual(response.data["results"][1]["total_balance"], {"balance": 0, "currency": None})
+
+    def test_list_is_paginated_when_requested(self):
+        self._create_debtors(5)
+
+        first, _ = self._list({"page_size": 2})
+        second, _ = self._list({"page_size": 2, "page": 2})
+
+        self.assertEqual(first.data["count"], 5)
+        self.assertEqual([item["type"] for item in first.data["results"]], ["DEBTOR", "DEBTOR"])
+        self.assertEqual([item["type"] for item in second.data["results"]], ["DEBTOR", "DEBTOR"])
+        self.assertEqual(first.data["paynote"]["type"], "PAYNOTE")
+        self.assertEqual(second.data["paynote"]["type"], "PAYNOTE")
+        self.assertIsNotNone(second.data["next"])
+
+    def test_paginated_pages_add_up_to_count(self):
+        self._create_debtors(5)
+
+        pages = [self._list({"page_size": 2, "page": page})[0] for page in (1, 2, 3)]
+
+        self.assertEqual(sum(len(page.data["results"]) for page in pages), pages[0].data["count"])
+        self.assertIsNone(pages[-1].data["next"])
+
+    def test_retrieve_reads_totals_from_summary(self):
+        self._create_debtors(1)
+        debtor = DebtorChat.objects.get(owner=self.user)
+
+        response = self.client.get(reverse("chat-detail", args=[debtor.id]), {"type": "DEBTOR"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["transactions"]), 2)
+        self.assertEqual(
+            response.data["totals"],
+            {"income_total": Decimal("10.00"), "expense_total": Decimal("3.00")},
+        )
+        self.assertEqual(response.data["balance"], {"balance": Decimal("7.00"), "currency": "USD"})
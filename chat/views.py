@@ -1,6 +1,3 @@
-from decimal import Decimal
-
-from django.db.models import Case, DecimalField, Sum, Value, When
 from rest_framework import status
 from django.utils.translation import gettext as _
 from rest_framework.permissions import IsAuthenticated
@@ -8,8 +5,14 @@ from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
 from finance.models import DebtorTransaction
+from finance.pagination import DefaultPagination
 from finance.serializers import DebtorTransactionSerializer
-from finance.services import get_balance_data_for_queryset
+from finance.services import (
+    get_balance_data_by_phone,
+    get_ledger_summaries_by_phone,
+    summary_balance_data,
+    summary_totals,
+)
 
 from .models import DebtorChat, PayNoteChat
 from .serializers import ChatListSerializer, DebtorChatSerializer, DebtorChatCreateSerializer
@@ -24,42 +27,31 @@ class ChatViewSet(ViewSet):
             defaults={"message": None, "photo_url": None},
         )
 
-        debtors = DebtorChat.objects.filter(owner=request.user).order_by("-updated_at")
+        debtors = DebtorChat.objects.filter(owner=request.user).order_by("-updated_at", "-id")
+
+        # Pagination is opt-in so clients that expect the full list keep working.
+        paginator = None
+        phones = None
+        if "page" in request.query_params or "page_size" in request.query_params:
+            paginator = DefaultPagination()
+            debtors = paginator.paginate_queryset(debtors, request, view=self)
+            phones = [debtor.phone for debtor in debtors]
 
+        balances = get_balance_data_by_phone(user=request.user, phones=phones)
         debtor_serializer = DebtorChatSerializer(
             debtors,
             many=True,
-            context={"request": request},
+            context={"request": request, "balances": balances},
         )
 
-        results = [
-            ChatListSerializer(paynote).data,
-            *debtor_serializer.data,
-        ]
-
-        return Response({"results": results})
-
-    def _get_totals(self, queryset):
-        totals = queryset.aggregate(
-            income=Sum(
-                Case(
-                    When(type=DebtorTransaction.Type.INCOME, then="amount"),
-                    default=Value(0),
-                    output_field=DecimalField(max_digits=12, decimal_places=2),
-                )
-            ),
-            expense=Sum(
-                Case(
-                    When(type=DebtorTransaction.Type.EXPENSE, then="amount"),
-                    default=Value(0),
-                    output_field=DecimalField(max_digits=12, decimal_places=2),
-                )
-            ),
-        )
-        return {
-            "income_total": totals["income"] or Decimal("0.00"),
-            "expense_total": totals["expense"] or Decimal("0.00"),
-        }
+        paynote_data = ChatListSerializer(paynote).data
+        if paginator is not None:
+            # Keep the PayNote chat out of ``results`` so every page holds ``page_size`` debtors
+            # and ``count`` matches them; it is returned alongside on each page instead.
+            response = paginator.get_paginated_response(debtor_serializer.data)
+            response.data["paynote"] = paynote_data
+            return response
+        return Response({"results": [paynote_data, *debtor_serializer.data]})
 
     def retrieve(self, request, pk=None):
         chat_type = request.query_params.get("type")
@@ -95,18 +87,13 @@ class ChatViewSet(ViewSet):
             )
 
         tx_qs = DebtorTransaction.objects.filter(user=request.user, phone=debtor.phone)
-        totals = self._get_totals(tx_qs)
-        balance_data = get_balance_data_for_queryset(tx_qs)
+        summary = get_ledger_summaries_by_phone(user=request.user, phones=[debtor.phone]).get(debtor.phone)
 
         return Response(
             {
                 "transactions": DebtorTransactionSerializer(tx_qs, many=True).data,
-                "totals": totals,
-                "balance": (
-                    balance_data
-                    if balance_data["currency"]
-                    else {"balance": 0, "currency": None}
-                ),
+                "totals": summary_totals(summary),
+                "balance": summary_balance_data(summary),
             }
         )
 
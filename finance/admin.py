@@ -1,13 +1,26 @@
 from django.contrib import admin
+from django.db import transaction
 
 from .models import (
     Category,
     Currency,
     DebtorBalance,
+    DebtorLedgerSummary,
     DebtorTransaction,
     Transaction,
     VirtualCard,
 )
+from .services import (
+    apply_transaction_to_balance,
+    apply_transaction_to_ledger_summary,
+    apply_transaction_to_rollup,
+    apply_transaction_update_to_balance,
+    apply_transaction_update_to_ledger_summary,
+    apply_transaction_update_to_rollup,
+    revert_transaction_from_balance,
+    revert_transaction_from_ledger_summary,
+    revert_transaction_from_rollup,
+)
 
 
 @admin.register(Currency)
@@ -29,6 +42,26 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ("type", "currency")
     search_fields = ("user__phone", "category__name")
 
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        old_tx = Transaction.objects.get(pk=obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        if old_tx is None:
+            apply_transaction_to_rollup(obj)
+        else:
+            apply_transaction_update_to_rollup(obj, old_tx)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        revert_transaction_from_rollup(obj)
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for tx in queryset:
+            revert_transaction_from_rollup(tx)
+        super().delete_queryset(request, queryset)
+
 
 @admin.register(DebtorBalance)
 class DebtorBalanceAdmin(admin.ModelAdmin):
@@ -43,6 +76,66 @@ class DebtorTransactionAdmin(admin.ModelAdmin):
     list_filter = ("type", "currency")
     search_fields = ("user__phone", "phone", "note")
 
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        old_tx = DebtorTransaction.objects.get(pk=obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        if old_tx is None:
+            self._apply(obj)
+        elif old_tx.user_id != obj.user_id:
+            self._revert(old_tx)
+            self._apply(obj)
+        else:
+            apply_transaction_update_to_balance(
+                user=obj.user,
+                tx=obj,
+                old_type=old_tx.type,
+                old_amount=old_tx.amount,
+                old_currency_id=old_tx.currency_id,
+            )
+            apply_transaction_update_to_ledger_summary(
+                user=obj.user,
+                tx=obj,
+                old_type=old_tx.type,
+                old_amount=old_tx.amount,
+                old_phone=old_tx.phone,
+            )
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self._revert(obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        deleted = list(queryset.select_related("user"))
+        super().delete_queryset(request, queryset)
+        for tx in deleted:
+            self._revert(tx)
+
+    def _apply(self, tx):
+        apply_transaction_to_balance(user=tx.user, tx=tx)
+        apply_transaction_to_ledger_summary(user=tx.user, tx=tx)
+
+    def _revert(self, tx):
+        """Remove a transaction that no longer belongs to ``tx.user`` from the user's balance and summary."""
+        revert_transaction_from_balance(user=tx.user, tx_type=tx.type, amount=tx.amount)
+        revert_transaction_from_ledger_summary(user=tx.user, phone=tx.phone, tx_type=tx.type, amount=tx.amount)
+
+
+@admin.register(DebtorLedgerSummary)
+class DebtorLedgerSummaryAdmin(admin.ModelAdmin):
+    list_display = ("user", "phone", "balance", "currency", "transaction_count", "last_transaction_date")
+    search_fields = ("user__phone", "phone")
+    readonly_fields = (
+        "income_total",
+        "expense_total",
+        "balance",
+        "transaction_count",
+        "last_transaction_date",
+        "updated_at",
+    )
+
 
 @admin.register(VirtualCard)
 class VirtualCardAdmin(admin.ModelAdmin):
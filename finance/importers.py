@@ -0,0 +1,211 @@
+import codecs
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from django.utils.translation import gettext as _
+
+from .models import Category, Currency, Transaction
+from .services import apply_transactions_to_rollup, bump_transaction_totals_version
+
+
+IMPORT_FORMAT_CSV = "csv"
+IMPORT_FORMAT_NDJSON = "ndjson"
+IMPORT_FIELDS = ("type", "amount", "currency", "category", "date", "note")
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+AMOUNT_MAX_DIGITS = 12
+AMOUNT_DECIMAL_PLACES = 2
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def iter_text_lines(stream, chunk_size=64 * 1024, encoding="utf-8-sig"):
+    """
+    Decode a binary stream into text lines without reading it all into memory.
+
+    Lines end at ``\n`` only (keeping it, and any ``\r`` before it, for the
+    csv module); ``str.splitlines`` would also break inside a note on
+    U+2028, U+0085, form feeds and the like.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_csv_rows(lines):
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [column.strip().lower() for column in header]
+    missing = [field for field in IMPORT_FIELDS if field != "note" and field not in header]
+    if missing:
+        raise ImportFormatError(_("Missing CSV columns: %(columns)s.") % {"columns": ", ".join(missing)})
+
+    for row_number, values in enumerate(reader, start=1):
+        if not any(value.strip() for value in values):
+            continue
+        yield row_number, dict(zip(header, values))
+
+
+def iter_ndjson_rows(lines):
+    row_number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            yield row_number, None
+            continue
+        yield row_number, data
+
+
+class TransactionRowValidator:
+    """Validates import rows against currency/category maps loaded once per import."""
+
+    def __init__(self, user):
+        self.user = user
+        self.currencies = {}
+        for currency in Currency.objects.all():
+            self.currencies[str(currency.id)] = currency
+            self.currencies[currency.code.upper()] = currency
+
+        self.categories = {}
+        for category in Category.objects.all():
+            self.categories[str(category.id)] = category
+            for name in (category.name, category.name_uz, category.name_ru, category.name_en):
+                if name:
+                    self.categories.setdefault(name.strip().lower(), category)
+
+    def validate(self, data):
+        """Return ``(Transaction, None)`` for a valid row or ``(None, errors)``."""
+        if data is None:
+            return None, {"row": [_("Invalid JSON object.")]}
+
+        errors = {}
+        values = {key: ("" if value is None else str(value)).strip() for key, value in data.items()}
+
+        tx_type = values.get("type", "").upper()
+        if tx_type not in Transaction.Type.values:
+            errors["type"] = [_("Invalid transaction type.")]
+
+        amount = None
+        try:
+            amount = Decimal(values.get("amount", ""))
+            if not amount.is_finite():
+                raise InvalidOperation
+        except InvalidOperation:
+            errors["amount"] = [_("Invalid amount.")]
+        else:
+            if amount <= 0:
+                errors["amount"] = [_("Amount must be greater than zero.")]
+            elif amount.as_tuple().exponent < -AMOUNT_DECIMAL_PLACES or amount.adjusted() >= (
+                AMOUNT_MAX_DIGITS - AMOUNT_DECIMAL_PLACES
+            ):
+                errors["amount"] = [_("Invalid amount.")]
+
+        currency = self.currencies.get(values.get("currency", "").upper())
+        if currency is None:
+            errors["currency"] = [_("Currency does not exist.")]
+        elif not currency.is_active:
+            errors["currency"] = [_("Selected currency is inactive.")]
+
+        raw_category = values.get("category", "")
+        category = self.categories.get(raw_category) or self.categories.get(raw_category.lower())
+        if category is None:
+            errors["category"] = [_("Category does not exist.")]
+
+        raw_date = values.get("date", "")
+        tx_date = None
+        if not raw_date:
+            errors["date"] = [_("Date is required.")]
+        else:
+            try:
+                tx_date = parse_date(raw_date)
+            except ValueError:
+                tx_date = None
+            if tx_date is None:
+                errors["date"] = [_("Invalid date.")]
+
+        if errors:
+            return None, errors
+
+        return (
+            Transaction(
+                user=self.user,
+                type=tx_type,
+                amount=amount,
+                currency=currency,
+                category=category,
+                date=tx_date,
+                note=values.get("note") or None,
+            ),
+            None,
+        )
+
+
+def import_transactions(*, user, rows, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """
+    Validate and insert ``(row_number, data)`` pairs in chunks.
+
+    Valid rows are inserted with ``bulk_create`` one chunk per transaction,
+    together with the matching rollup deltas; invalid rows are reported and
+    skipped. Returns a summary dict with per-row errors.
+    """
+    validator = TransactionRowValidator(user)
+    created = 0
+    error_count = 0
+    errors = []
+    pending = []
+
+    def _flush():
+        nonlocal created
+        if not pending:
+            return
+        if not dry_run:
+            with transaction.atomic():
+                Transaction.objects.bulk_create(pending, batch_size=chunk_size)
+                apply_transactions_to_rollup(pending)
+        created += len(pending)
+        pending.clear()
+
+    for row_number, data in rows:
+        tx, row_errors = validator.validate(data)
+        if row_errors:
+            error_count += 1
+            if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                errors.append({"row": row_number, "errors": row_errors})
+            continue
+        pending.append(tx)
+        if len(pending) >= chunk_size:
+            _flush()
+    _flush()
+
+    if created and not dry_run:
+        bump_transaction_totals_version(user.id)
+
+    return {
+        "created": created,
+        "failed": error_count,
+        "dry_run": dry_run,
+        "errors": errors,
+    }
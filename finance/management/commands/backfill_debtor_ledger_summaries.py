@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from finance.services import backfill_ledger_summaries
+
+
+class Command(BaseCommand):
+    help = "Build or refresh DebtorLedgerSummary rows from existing debtor transactions in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of (user, phone) summaries written per chunk.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for written in backfill_ledger_summaries(chunk_size=options["chunk_size"]):
+            total += written
+            self.stdout.write(f"Written {total} summaries...")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} debtor ledger summaries."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from finance.services import rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyTransactionRollup rows from finance transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Limit the rebuild to this user id. Can be passed multiple times.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rollup rows inserted per batch.",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_rollups(
+            user_ids=options["user_ids"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} daily transaction rollups."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from finance.services import reconcile_debtor_balances
+
+
+class Command(BaseCommand):
+    help = "Verify stored debtor balances against the full ledger aggregate and repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Limit the check to this user id. Can be passed multiple times.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without repairing it.",
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_debtor_balances(
+            user_ids=options["user_ids"],
+            repair=not options["dry_run"],
+        )
+
+        for user_id, stored, expected in drift:
+            self.stdout.write(f"user={user_id} stored={stored} expected={expected}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All debtor balances are consistent."))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"Found drift for {len(drift)} users."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired drift for {len(drift)} users."))
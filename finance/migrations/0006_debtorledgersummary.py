@@ -0,0 +1,48 @@
+# Generated by Django 5.2.11 on 2026-10-18 05:27
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_virtualcard_balance_alter_category_name_en_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DebtorLedgerSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20)),
+                ('income_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('expense_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('last_transaction_date', models.DateField(blank=True, null=True)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='debtortransaction',
+            index=models.Index(fields=['user', 'phone'], name='finance_deb_user_id_cd7c50_idx'),
+        ),
+        migrations.AddField(
+            model_name='debtorledgersummary',
+            name='currency',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='finance.currency'),
+        ),
+        migrations.AddField(
+            model_name='debtorledgersummary',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debtor_ledger_summaries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='debtorledgersummary',
+            unique_together={('user', 'phone')},
+        ),
+    ]
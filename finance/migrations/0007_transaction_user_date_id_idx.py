@@ -0,0 +1,19 @@
+# Generated by Django 5.2.11 on 2026-10-18 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_debtorledgersummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'id'], name='finance_tra_user_id_c625ef_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.11 on 2026-10-18 05:32
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_transaction_user_date_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('type', models.CharField(choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense')], max_length=7)),
+                ('amount_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=30)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='finance.category')),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='finance.currency')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_transaction_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='finance_dai_user_id_6f2029_idx')],
+                'unique_together': {('user', 'date', 'currency', 'category', 'type')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.11 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_dailytransactionrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='name_en',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name_ru',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name_uz',
+            field=models.CharField(max_length=100),
+        ),
+    ]
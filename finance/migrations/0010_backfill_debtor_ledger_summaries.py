@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+
+CHUNK_SIZE = 1000
+
+
+def backfill_ledger_summaries(apps, schema_editor):
+    # Frozen copy of finance.services.backfill_ledger_summaries on the historical models,
+    # so existing deployments have balances as soon as they migrate.
+    DebtorTransaction = apps.get_model("finance", "DebtorTransaction")
+    DebtorLedgerSummary = apps.get_model("finance", "DebtorLedgerSummary")
+
+    latest_currency = (
+        DebtorTransaction.objects.filter(user_id=OuterRef("user_id"), phone=OuterRef("phone"))
+        .order_by("-date", "-id")
+        .values("currency_id")[:1]
+    )
+    groups = (
+        DebtorTransaction.objects.exclude(phone__isnull=True)
+        .exclude(phone="")
+        .order_by()
+        .values("user_id", "phone")
+        .annotate(
+            latest_currency_id=Subquery(latest_currency),
+            income=Sum("amount", filter=Q(type="INCOME")),
+            expense=Sum("amount", filter=Q(type="EXPENSE")),
+            count=Count("id"),
+            last_date=Max("date"),
+        )
+        .order_by("user_id", "phone")
+    )
+
+    last_key = None
+    while True:
+        chunk_qs = groups
+        if last_key is not None:
+            last_user_id, last_phone = last_key
+            chunk_qs = chunk_qs.filter(Q(user_id__gt=last_user_id) | Q(user_id=last_user_id, phone__gt=last_phone))
+        rows = list(chunk_qs[:CHUNK_SIZE])
+        if not rows:
+            return
+
+        now = timezone.now()
+        summaries = []
+        for row in rows:
+            income = row["income"] or Decimal("0.00")
+            expense = row["expense"] or Decimal("0.00")
+            summaries.append(
+                DebtorLedgerSummary(
+                    user_id=row["user_id"],
+                    phone=row["phone"],
+                    currency_id=row["latest_currency_id"],
+                    income_total=income,
+                    expense_total=expense,
+                    balance=income - expense,
+                    last_transaction_date=row["last_date"],
+                    transaction_count=row["count"],
+                    updated_at=now,
+                )
+            )
+        DebtorLedgerSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=["user", "phone"],
+            update_fields=[
+                "currency",
+                "income_total",
+                "expense_total",
+                "balance",
+                "last_transaction_date",
+                "transaction_count",
+                "updated_at",
+            ],
+        )
+        last_key = (rows[-1]["user_id"], rows[-1]["phone"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_alter_category_name_translations'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledger_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+CHUNK_SIZE = 1000
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    # Frozen copy of finance.services.rebuild_daily_rollups on the historical models,
+    # so /transactions/summary/ covers existing transactions as soon as they migrate.
+    Transaction = apps.get_model("finance", "Transaction")
+    DailyTransactionRollup = apps.get_model("finance", "DailyTransactionRollup")
+
+    groups = (
+        Transaction.objects.order_by()
+        .values("user_id", "date", "currency_id", "category_id", "type")
+        .annotate(amount_total=Sum("amount"), transaction_count=Count("id"))
+    )
+
+    DailyTransactionRollup.objects.all().delete()
+    batch = []
+    for row in groups.iterator(chunk_size=CHUNK_SIZE):
+        batch.append(DailyTransactionRollup(**row))
+        if len(batch) >= CHUNK_SIZE:
+            DailyTransactionRollup.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        DailyTransactionRollup.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_backfill_debtor_ledger_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
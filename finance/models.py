@@ -97,11 +97,37 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [
+            models.Index(fields=["user", "date", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.type} {self.amount} {self.currency}"
 
 
+class DailyTransactionRollup(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="daily_transaction_rollups",
+    )
+    date = models.DateField()
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name="+")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+")
+    type = models.CharField(max_length=7, choices=Transaction.Type.choices)
+    amount_total = models.DecimalField(max_digits=30, decimal_places=2, default=Decimal("0.00"))
+    transaction_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "date", "currency", "category", "type")
+        indexes = [
+            models.Index(fields=["user", "date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date} {self.type} {self.amount_total} {self.currency}"
+
+
 class DebtorBalance(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -138,6 +164,31 @@ class DebtorTransaction(models.Model):
 
     class Meta:
         ordering = ["-date", "-id"]
+        indexes = [
+            models.Index(fields=["user", "phone"]),
+        ]
+
+
+class DebtorLedgerSummary(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="debtor_ledger_summaries",
+    )
+    phone = models.CharField(max_length=20)
+    currency = models.ForeignKey(Currency, on_delete=models.PROTECT, null=True, blank=True)
+    income_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    expense_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    last_transaction_date = models.DateField(null=True, blank=True)
+    transaction_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "phone")
+
+    def __str__(self):
+        return f"{self.user_id}:{self.phone} - {self.balance} {self.currency}"
 
 
 class VirtualCard(models.Model):
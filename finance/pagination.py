@@ -1,7 +1,103 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = "page_size"
     max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a descending ``(ordering[0], ordering[1])`` key.
+
+    Each page is fetched with ``WHERE (a, b) < (cursor_a, cursor_b)`` so deep
+    pages cost the same as the first one, and no COUNT query is issued. The
+    cursor is an opaque token; the response only carries a ``next`` link.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering = ("date", "id")
+    invalid_cursor_message = _("Invalid cursor.")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        primary, secondary = self.ordering
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f"{primary}__lt": value}) | Q(**{primary: value, f"{secondary}__lt": pk})
+            )
+
+        rows = list(queryset.order_by(f"-{primary}", f"-{secondary}")[: page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_position = None
+        if self.has_next:
+            last = rows[-1]
+            self.next_position = (getattr(last, primary), getattr(last, secondary))
+        return rows
+
+    def get_page_size(self, request):
+        """``?page_size=`` clamped to ``max_page_size``; missing, non-numeric or < 1 means the default."""
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, TypeError, ValueError):
+                return self.page_size
+            if page_size > 0:
+                return min(page_size, self.max_page_size) if self.max_page_size else page_size
+        return self.page_size
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    @staticmethod
+    def encode_cursor(position):
+        value, pk = position
+        raw = json.dumps([str(value), pk]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            value, pk = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+            return self.parse_cursor_value(model, value), int(pk)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_cursor_value(self, model, value):
+        return model._meta.get_field(self.ordering[0]).to_python(value)
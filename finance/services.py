@@ -1,18 +1,182 @@
 ﻿# services.py
+import hashlib
+import json
+import time
 from decimal import Decimal
 
-from django.db import IntegrityError
-from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
 
 from .models import (
+    DailyTransactionRollup,
     DebtorBalance,
+    DebtorLedgerSummary,
     DebtorTransaction,
+    Transaction,
     VirtualCard,
     calculate_virtual_card_valid_until,
     generate_virtual_card_number,
 )
 
 
+TRANSACTION_TOTALS_CACHE_PREFIX = "finance:transaction-totals"
+TRANSACTION_TOTALS_CACHE_TIMEOUT = 300
+
+
+def filter_transactions(queryset, filters):
+    """Apply filters normalized by ``TransactionViewSet.get_filters``."""
+    if "type" in filters:
+        queryset = queryset.filter(type=filters["type"])
+    if "category_id" in filters:
+        queryset = queryset.filter(category_id=filters["category_id"])
+    if "currency_id" in filters:
+        queryset = queryset.filter(currency_id=filters["currency_id"])
+    if "date_from" in filters:
+        queryset = queryset.filter(date__gte=filters["date_from"])
+    if "date_to" in filters:
+        queryset = queryset.filter(date__lte=filters["date_to"])
+    return queryset
+
+
+def get_transaction_totals_cache_timeout():
+    return getattr(settings, "TRANSACTION_TOTALS_CACHE_TIMEOUT", TRANSACTION_TOTALS_CACHE_TIMEOUT)
+
+
+def _transaction_totals_version_key(user_id):
+    return f"{TRANSACTION_TOTALS_CACHE_PREFIX}:version:{user_id}"
+
+
+def get_transaction_totals_version(user_id):
+    key = _transaction_totals_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted version never resurrects older entries.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_transaction_totals_version(user_id):
+    key = _transaction_totals_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def bump_transaction_totals_version(user_id):
+    """Invalidate every cached totals entry of the user by moving to a new version."""
+    # Bump now and again on commit: totals another request recomputes from the
+    # pre-commit rows in between would otherwise be cached under the new version.
+    _bump_transaction_totals_version(user_id)
+    transaction.on_commit(lambda: _bump_transaction_totals_version(user_id))
+
+
+def transaction_totals_cache_key(user_id, filters):
+    normalized = json.dumps(filters, sort_keys=True, default=str)
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    version = get_transaction_totals_version(user_id)
+    return f"{TRANSACTION_TOTALS_CACHE_PREFIX}:{user_id}:v{version}:{digest}"
+
+
+def _rollup_key(tx):
+    return {
+        "user_id": tx.user_id,
+        "date": tx.date,
+        "currency_id": tx.currency_id,
+        "category_id": tx.category_id,
+        "type": tx.type,
+    }
+
+
+def _change_daily_rollup(*, key, amount, count):
+    with transaction.atomic():
+        rows = DailyTransactionRollup.objects.filter(**key)
+        updated = rows.update(
+            amount_total=F("amount_total") + amount,
+            transaction_count=F("transaction_count") + count,
+        )
+        if not updated and count > 0:
+            try:
+                with transaction.atomic():
+                    DailyTransactionRollup.objects.create(amount_total=amount, transaction_count=count, **key)
+            except IntegrityError:
+                rows.update(
+                    amount_total=F("amount_total") + amount,
+                    transaction_count=F("transaction_count") + count,
+                )
+        if count < 0:
+            rows.filter(transaction_count__lte=0).delete()
+
+
+def apply_transaction_to_rollup(tx: Transaction):
+    _change_daily_rollup(key=_rollup_key(tx), amount=tx.amount, count=1)
+
+
+def apply_transactions_to_rollup(transactions):
+    """Apply many new transactions at once, one rollup write per distinct key."""
+    grouped = {}
+    for tx in transactions:
+        key = tuple(sorted(_rollup_key(tx).items()))
+        amount, count = grouped.get(key, (Decimal("0.00"), 0))
+        grouped[key] = (amount + tx.amount, count + 1)
+
+    for key, (amount, count) in grouped.items():
+        _change_daily_rollup(key=dict(key), amount=amount, count=count)
+
+
+def revert_transaction_from_rollup(tx: Transaction):
+    _change_daily_rollup(key=_rollup_key(tx), amount=-tx.amount, count=-1)
+
+
+def apply_transaction_update_to_rollup(tx: Transaction, old_tx: Transaction):
+    old_key, new_key = _rollup_key(old_tx), _rollup_key(tx)
+    if old_key == new_key:
+        if tx.amount != old_tx.amount:
+            _change_daily_rollup(key=new_key, amount=tx.amount - old_tx.amount, count=0)
+        return
+    revert_transaction_from_rollup(old_tx)
+    apply_transaction_to_rollup(tx)
+
+
+def rebuild_daily_rollups(*, user_ids=None, chunk_size=1000):
+    """
+    Recreate rollup rows from ``Transaction`` for the given users (all by default).
+
+    Returns the number of rollup rows written.
+    """
+    tx_qs = Transaction.objects.all()
+    rollup_qs = DailyTransactionRollup.objects.all()
+    if user_ids is not None:
+        tx_qs = tx_qs.filter(user_id__in=user_ids)
+        rollup_qs = rollup_qs.filter(user_id__in=user_ids)
+
+    groups = (
+        tx_qs.order_by()
+        .values("user_id", "date", "currency_id", "category_id", "type")
+        .annotate(amount_total=Sum("amount"), transaction_count=Count("id"))
+    )
+
+    written = 0
+    with transaction.atomic():
+        rollup_qs.delete()
+        batch = []
+        for row in groups.iterator(chunk_size=chunk_size):
+            batch.append(DailyTransactionRollup(**row))
+            if len(batch) >= chunk_size:
+                DailyTransactionRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            DailyTransactionRollup.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
 def _signed_amount_expression():
     return Case(
         When(type=DebtorTransaction.Type.INCOME, then=F("amount")),
@@ -31,6 +195,37 @@ def get_balance_data_for_queryset(qs):
     return {"balance": total, "currency": str(tx.currency)}
 
 
+def summary_balance_data(summary):
+    if summary is None:
+        return {"balance": 0, "currency": None}
+    return {"balance": summary.balance, "currency": str(summary.currency) if summary.currency_id else None}
+
+
+def summary_totals(summary):
+    if summary is None:
+        return {"income_total": Decimal("0.00"), "expense_total": Decimal("0.00")}
+    return {"income_total": summary.income_total, "expense_total": summary.expense_total}
+
+
+def get_ledger_summaries_by_phone(*, user, phones=None):
+    """Materialized per-phone ledger summaries; ``phones=None`` covers every phone of the user."""
+    qs = DebtorLedgerSummary.objects.filter(user=user).select_related("currency")
+    if phones is not None:
+        qs = qs.filter(phone__in=list(phones))
+    return {summary.phone: summary for summary in qs}
+
+
+def get_balance_data_by_phone(*, user, phones=None):
+    """
+    Balance data for several debtor phones from the ledger summary table.
+
+    Returns ``{phone: {"balance": ..., "currency": ...}}`` shaped like
+    ``get_balance_data_for_queryset``; phones without transactions are omitted.
+    """
+    summaries = get_ledger_summaries_by_phone(user=user, phones=phones)
+    return {phone: summary_balance_data(summary) for phone, summary in summaries.items()}
+
+
 def recompute_debtor_balance(*, user):
     qs = DebtorTransaction.objects.filter(user=user)
     balance_data = get_balance_data_for_queryset(qs)
@@ -49,8 +244,281 @@ def recompute_debtor_balance(*, user):
     return balance_obj
 
 
+def signed_amount(tx_type, amount):
+    if tx_type == DebtorTransaction.Type.INCOME:
+        return amount
+    if tx_type == DebtorTransaction.Type.EXPENSE:
+        return -amount
+    return Decimal("0.00")
+
+
+def _latest_debtor_currency_id(user):
+    return DebtorTransaction.objects.filter(user=user).values_list("currency_id", flat=True).first()
+
+
+def _apply_balance_delta(*, user, delta, currency_id=None):
+    """
+    Add ``delta`` to the user's stored balance under a row lock.
+
+    A missing balance row is rebuilt from the full aggregate once, so users
+    whose history predates incremental maintenance converge on first write.
+    """
+    with transaction.atomic():
+        balance_obj = DebtorBalance.objects.select_for_update().filter(user=user).first()
+        if balance_obj is None:
+            return recompute_debtor_balance(user=user)
+
+        updates = {"balance": F("balance") + delta}
+        if currency_id is not None:
+            updates["currency_id"] = currency_id
+        DebtorBalance.objects.filter(pk=balance_obj.pk).update(**updates)
+        balance_obj.refresh_from_db(fields=["balance", "currency"])
+        return balance_obj
+
+
 def apply_transaction_to_balance(*, user, tx: DebtorTransaction):
-    return recompute_debtor_balance(user=user)
+    return _apply_balance_delta(
+        user=user,
+        delta=signed_amount(tx.type, tx.amount),
+        currency_id=tx.currency_id,
+    )
+
+
+def apply_transaction_update_to_balance(*, user, tx: DebtorTransaction, old_type, old_amount, old_currency_id):
+    delta = signed_amount(tx.type, tx.amount) - signed_amount(old_type, old_amount)
+    currency_id = None
+    if tx.currency_id != old_currency_id:
+        currency_id = _latest_debtor_currency_id(user)
+    if not delta and currency_id is None:
+        return DebtorBalance.objects.filter(user=user).first()
+    return _apply_balance_delta(user=user, delta=delta, currency_id=currency_id)
+
+
+def revert_transaction_from_balance(*, user, tx_type, amount):
+    """Remove an already deleted transaction's contribution from the balance."""
+    currency_id = _latest_debtor_currency_id(user)
+    if currency_id is None:
+        DebtorBalance.objects.filter(user=user).delete()
+        return None
+    return _apply_balance_delta(user=user, delta=-signed_amount(tx_type, amount), currency_id=currency_id)
+
+
+def reconcile_debtor_balances(*, user_ids=None, repair=True):
+    """
+    Compare stored balances with the full aggregate and optionally repair drift.
+
+    Returns a list of ``(user_id, stored, expected)`` tuples for every user whose
+    stored balance disagrees with the ledger (``stored``/``expected`` are None when
+    the row is missing or should not exist).
+    """
+    tx_qs = DebtorTransaction.objects.all()
+    balance_qs = DebtorBalance.objects.all()
+    if user_ids is not None:
+        tx_qs = tx_qs.filter(user_id__in=user_ids)
+        balance_qs = balance_qs.filter(user_id__in=user_ids)
+
+    expected = {
+        row["user_id"]: row["total"] or Decimal("0.00")
+        for row in tx_qs.order_by().values("user_id").annotate(total=Sum(_signed_amount_expression()))
+    }
+    stored = dict(balance_qs.values_list("user_id", "balance"))
+
+    drift = []
+    for user_id in sorted(set(expected) | set(stored)):
+        if stored.get(user_id) != expected.get(user_id):
+            drift.append((user_id, stored.get(user_id), expected.get(user_id)))
+
+    if repair and drift:
+        users = get_user_model().objects.filter(id__in=[user_id for user_id, _, _ in drift])
+        for user in users:
+            with transaction.atomic():
+                recompute_debtor_balance(user=user)
+
+    return drift
+
+
+def _ledger_amounts(tx_type, amount):
+    if tx_type == DebtorTransaction.Type.INCOME:
+        return amount, Decimal("0.00")
+    if tx_type == DebtorTransaction.Type.EXPENSE:
+        return Decimal("0.00"), amount
+    return Decimal("0.00"), Decimal("0.00")
+
+
+def _ledger_aggregates():
+    return {
+        "income": Sum("amount", filter=Q(type=DebtorTransaction.Type.INCOME)),
+        "expense": Sum("amount", filter=Q(type=DebtorTransaction.Type.EXPENSE)),
+        "count": Count("id"),
+        "last_date": Max("date"),
+    }
+
+
+def rebuild_ledger_summary(*, user, phone):
+    """Rebuild one (user, phone) summary from the full ledger."""
+    qs = DebtorTransaction.objects.filter(user=user, phone=phone)
+    totals = qs.order_by().aggregate(**_ledger_aggregates())
+    if not totals["count"]:
+        DebtorLedgerSummary.objects.filter(user=user, phone=phone).delete()
+        return None
+
+    income = totals["income"] or Decimal("0.00")
+    expense = totals["expense"] or Decimal("0.00")
+    summary, _ = DebtorLedgerSummary.objects.update_or_create(
+        user=user,
+        phone=phone,
+        defaults={
+            "currency_id": qs.values_list("currency_id", flat=True).first(),
+            "income_total": income,
+            "expense_total": expense,
+            "balance": income - expense,
+            "last_transaction_date": totals["last_date"],
+            "transaction_count": totals["count"],
+        },
+    )
+    return summary
+
+
+def _change_ledger_summary(*, user, phone, income, expense, count, latest=None):
+    """
+    Apply deltas to a (user, phone) summary under a row lock.
+
+    ``latest`` is the ``(date, currency_id)`` of the newest transaction when the
+    caller knows it; otherwise it is re-read with the (user, phone) index.
+    """
+    if not phone:
+        return None
+
+    with transaction.atomic():
+        summary = DebtorLedgerSummary.objects.select_for_update().filter(user=user, phone=phone).first()
+        if summary is None:
+            return rebuild_ledger_summary(user=user, phone=phone)
+
+        if summary.transaction_count + count <= 0:
+            summary.delete()
+            return None
+
+        if latest is None:
+            latest = (
+                DebtorTransaction.objects.filter(user=user, phone=phone)
+                .values_list("date", "currency_id")
+                .first()
+            )
+        updates = {
+            "income_total": F("income_total") + income,
+            "expense_total": F("expense_total") + expense,
+            "balance": F("balance") + income - expense,
+            "transaction_count": F("transaction_count") + count,
+            "updated_at": timezone.now(),
+        }
+        if latest is not None:
+            updates["last_transaction_date"], updates["currency_id"] = latest
+        DebtorLedgerSummary.objects.filter(pk=summary.pk).update(**updates)
+        summary.refresh_from_db()
+        return summary
+
+
+def apply_transaction_to_ledger_summary(*, user, tx: DebtorTransaction):
+    income, expense = _ledger_amounts(tx.type, tx.amount)
+    return _change_ledger_summary(
+        user=user,
+        phone=tx.phone,
+        income=income,
+        expense=expense,
+        count=1,
+        latest=(tx.date, tx.currency_id),
+    )
+
+
+def apply_transaction_update_to_ledger_summary(*, user, tx: DebtorTransaction, old_type, old_amount, old_phone):
+    new_income, new_expense = _ledger_amounts(tx.type, tx.amount)
+    old_income, old_expense = _ledger_amounts(old_type, old_amount)
+
+    if tx.phone == old_phone:
+        return _change_ledger_summary(
+            user=user,
+            phone=tx.phone,
+            income=new_income - old_income,
+            expense=new_expense - old_expense,
+            count=0,
+        )
+
+    _change_ledger_summary(user=user, phone=old_phone, income=-old_income, expense=-old_expense, count=-1)
+    return _change_ledger_summary(user=user, phone=tx.phone, income=new_income, expense=new_expense, count=1)
+
+
+def revert_transaction_from_ledger_summary(*, user, phone, tx_type, amount):
+    """Remove an already deleted transaction's contribution from its summary."""
+    income, expense = _ledger_amounts(tx_type, amount)
+    return _change_ledger_summary(user=user, phone=phone, income=-income, expense=-expense, count=-1)
+
+
+def backfill_ledger_summaries(*, chunk_size=1000):
+    """
+    Build or refresh every ledger summary from ``DebtorTransaction``.
+
+    Groups are walked in (user_id, phone) keyset order and upserted one chunk at
+    a time, so memory stays bounded by ``chunk_size``. Yields the number of
+    summaries written per chunk.
+    """
+    latest_currency = (
+        DebtorTransaction.objects.filter(user_id=OuterRef("user_id"), phone=OuterRef("phone"))
+        .order_by("-date", "-id")
+        .values("currency_id")[:1]
+    )
+    groups = (
+        DebtorTransaction.objects.exclude(phone__isnull=True)
+        .exclude(phone="")
+        .order_by()
+        .values("user_id", "phone")
+        .annotate(latest_currency_id=Subquery(latest_currency), **_ledger_aggregates())
+        .order_by("user_id", "phone")
+    )
+
+    last_key = None
+    while True:
+        chunk_qs = groups
+        if last_key is not None:
+            last_user_id, last_phone = last_key
+            chunk_qs = chunk_qs.filter(Q(user_id__gt=last_user_id) | Q(user_id=last_user_id, phone__gt=last_phone))
+        rows = list(chunk_qs[:chunk_size])
+        if not rows:
+            return
+
+        now = timezone.now()
+        summaries = []
+        for row in rows:
+            income = row["income"] or Decimal("0.00")
+            expense = row["expense"] or Decimal("0.00")
+            summaries.append(
+                DebtorLedgerSummary(
+                    user_id=row["user_id"],
+                    phone=row["phone"],
+                    currency_id=row["latest_currency_id"],
+                    income_total=income,
+                    expense_total=expense,
+                    balance=income - expense,
+                    last_transaction_date=row["last_date"],
+                    transaction_count=row["count"],
+                    updated_at=now,
+                )
+            )
+        DebtorLedgerSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=["user", "phone"],
+            update_fields=[
+                "currency",
+                "income_total",
+                "expense_total",
+                "balance",
+                "last_transaction_date",
+                "transaction_count",
+                "updated_at",
+            ],
+        )
+        last_key = (rows[-1]["user_id"], rows[-1]["phone"])
+        yield len(summaries)
 
 
 def ensure_virtual_card_for_user(user):
@@ -1,9 +1,10 @@
-﻿from django.db.models.signals import post_save
+﻿from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from users.models import User
 
-from .services import ensure_virtual_card_for_user
+from .models import Transaction
+from .services import bump_transaction_totals_version, ensure_virtual_card_for_user
 
 
 @receiver(post_save, sender=User)
@@ -12,3 +13,9 @@ def create_virtual_card_for_new_user(sender, instance, created, **kwargs):
         return
 
     ensure_virtual_card_for_user(instance)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def invalidate_transaction_totals(sender, instance, **kwargs):
+    bump_transaction_totals_version(instance.user_id)
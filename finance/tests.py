@@ -1,12 +1,39 @@
+import csv
+import io
+import json
+import zipfile
 from datetime import date
 from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
 
+from django.apps import apps as django_apps
+from django.contrib.admin.sites import AdminSite
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from users.models import User
-from .models import Category, Currency, Transaction
+from .admin import DebtorTransactionAdmin
+from .models import (
+    Category,
+    Currency,
+    DailyTransactionRollup,
+    DebtorBalance,
+    DebtorLedgerSummary,
+    DebtorTransaction,
+    Transaction,
+)
+from .pagination import KeysetPagination
+from .services import reconcile_debtor_balances, transaction_totals_cache_key
 
 
 class FinanceAPITests(APITestCase):
@@ -109,3 +136,632 @@ class FinanceAPITests(APITestCase):
         response = self.client.delete(reverse("category-detail", args=[self.category.id]))
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertTrue(Category.objects.filter(id=self.category.id).exists())
+
+
+class DebtorBalanceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000031", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.client.force_authenticate(user=self.user)
+
+    def _create(self, tx_type, amount):
+        response = self.client.post(
+            reverse("debtor-transaction-list"),
+            {"type": tx_type, "amount": amount, "currency": self.currency.id, "phone": "+998901234567"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def _balance(self):
+        return DebtorBalance.objects.get(user=self.user).balance
+
+    def test_create_update_delete_apply_deltas(self):
+        income_id = self._create(DebtorTransaction.Type.INCOME, "100.00")
+        expense_id = self._create(DebtorTransaction.Type.EXPENSE, "30.00")
+        self.assertEqual(self._balance(), Decimal("70.00"))
+
+        response = self.client.patch(
+            reverse("debtor-transaction-detail", args=[expense_id]),
+            {"type": DebtorTransaction.Type.INCOME, "amount": "10.00"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._balance(), Decimal("110.00"))
+
+        self.client.delete(reverse("debtor-transaction-detail", args=[income_id]))
+        self.assertEqual(self._balance(), Decimal("10.00"))
+
+        self.client.delete(reverse("debtor-transaction-detail", args=[expense_id]))
+        self.assertFalse(DebtorBalance.objects.filter(user=self.user).exists())
+
+    def test_create_does_not_reaggregate_history(self):
+        self._create(DebtorTransaction.Type.INCOME, "5.00")
+        DebtorTransaction.objects.bulk_create(
+            [
+                DebtorTransaction(
+                    user=self.user,
+                    type=DebtorTransaction.Type.INCOME,
+                    amount=Decimal("1.00"),
+                    currency=self.currency,
+                )
+                for _ in range(50)
+            ]
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self._create(DebtorTransaction.Type.INCOME, "1.00")
+
+        self.assertFalse(any("SUM(" in query["sql"] for query in queries.captured_queries))
+
+        # The bulk rows bypassed the balance on purpose; only the API write is applied.
+        self.assertEqual(self._balance(), Decimal("6.00"))
+
+    def test_reconcile_reports_and_repairs_drift(self):
+        self._create(DebtorTransaction.Type.INCOME, "40.00")
+        DebtorBalance.objects.filter(user=self.user).update(balance=Decimal("1.00"))
+
+        drift = reconcile_debtor_balances(repair=False)
+        self.assertEqual(drift, [(self.user.id, Decimal("1.00"), Decimal("40.00"))])
+        self.assertEqual(self._balance(), Decimal("1.00"))
+
+        out = StringIO()
+        call_command("reconcile_debtor_balances", stdout=out)
+        self.assertIn("Repaired drift for 1 users.", out.getvalue())
+        self.assertEqual(self._balance(), Decimal("40.00"))
+        self.assertEqual(reconcile_debtor_balances(repair=False), [])
+
+
+class DebtorLedgerSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000032", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.client.force_authenticate(user=self.user)
+
+    def _create(self, tx_type, amount):
+        response = self.client.post(
+            reverse("debtor-transaction-list"),
+            {"type": tx_type, "amount": amount, "currency": self.currency.id, "phone": "+998901234567"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def _summary(self, phone="+998901234567"):
+        return DebtorLedgerSummary.objects.get(user=self.user, phone=phone)
+
+    def test_summary_follows_writes(self):
+        income_id = self._create(DebtorTransaction.Type.INCOME, "100.00")
+        expense_id = self._create(DebtorTransaction.Type.EXPENSE, "30.00")
+
+        summary = self._summary()
+        self.assertEqual(summary.income_total, Decimal("100.00"))
+        self.assertEqual(summary.expense_total, Decimal("30.00"))
+        self.assertEqual(summary.balance, Decimal("70.00"))
+        self.assertEqual(summary.transaction_count, 2)
+        self.assertEqual(summary.currency, self.currency)
+        self.assertIsNotNone(summary.last_transaction_date)
+
+        self.client.patch(
+            reverse("debtor-transaction-detail", args=[expense_id]),
+            {"phone": "+998907654321"},
+            format="json",
+        )
+        self.assertEqual(self._summary().balance, Decimal("100.00"))
+        self.assertEqual(self._summary().transaction_count, 1)
+        self.assertEqual(self._summary("+998907654321").balance, Decimal("-30.00"))
+
+        self.client.delete(reverse("debtor-transaction-detail", args=[income_id]))
+        self.assertFalse(DebtorLedgerSummary.objects.filter(user=self.user, phone="+998901234567").exists())
+
+    def test_backfill_command_builds_summaries_in_chunks(self):
+        for i in range(5):
+            DebtorTransaction.objects.create(
+                user=self.user,
+                type=DebtorTransaction.Type.INCOME,
+                amount=Decimal("2.00"),
+                currency=self.currency,
+                phone=f"+99890000000{i}",
+            )
+        DebtorTransaction.objects.create(
+            user=self.user,
+            type=DebtorTransaction.Type.EXPENSE,
+            amount=Decimal("0.50"),
+            currency=self.currency,
+            phone="+998900000000",
+        )
+
+        out = StringIO()
+        call_command("backfill_debtor_ledger_summaries", chunk_size=2, stdout=out)
+
+        self.assertIn("Backfilled 5 debtor ledger summaries.", out.getvalue())
+        summary = self._summary("+998900000000")
+        self.assertEqual(summary.balance, Decimal("1.50"))
+        self.assertEqual(summary.transaction_count, 2)
+        self.assertEqual(DebtorLedgerSummary.objects.filter(user=self.user).count(), 5)
+
+    def test_data_migration_builds_missing_summaries(self):
+        self._create(DebtorTransaction.Type.INCOME, "40.00")
+        self._create(DebtorTransaction.Type.EXPENSE, "15.00")
+        DebtorLedgerSummary.objects.all().delete()
+
+        migration = import_module("finance.migrations.0010_backfill_debtor_ledger_summaries")
+        migration.backfill_ledger_summaries(django_apps, None)
+
+        summary = self._summary()
+        self.assertEqual((summary.balance, summary.transaction_count), (Decimal("25.00"), 2))
+
+
+class DebtorTransactionAdminTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000038", password="pass")
+        self.other = User.objects.create_user(phone="+10000000039", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.admin = DebtorTransactionAdmin(DebtorTransaction, AdminSite())
+        self.request = RequestFactory().post("/admin/")
+        self.request.user = User.objects.create_superuser(phone="+10000000040", password="pass")
+
+    def _add(self, tx_type, amount, phone="+998901234567"):
+        tx = DebtorTransaction(user=self.user, type=tx_type, amount=Decimal(amount), currency=self.currency, phone=phone)
+        self.admin.save_model(self.request, tx, form=None, change=False)
+        return tx
+
+    def _summary(self, user=None, phone="+998901234567"):
+        return DebtorLedgerSummary.objects.filter(user=user or self.user, phone=phone).first()
+
+    def _balance(self, user=None):
+        return DebtorBalance.objects.filter(user=user or self.user).values_list("balance", flat=True).first()
+
+    def test_add_applies_to_summary(self):
+        self._add(DebtorTransaction.Type.INCOME, "100.00")
+        self._add(DebtorTransaction.Type.EXPENSE, "30.00")
+
+        summary = self._summary()
+        self.assertEqual((summary.balance, summary.transaction_count), (Decimal("70.00"), 2))
+        self.assertEqual(self._balance(), Decimal("70.00"))
+
+    def test_change_moves_amounts_between_summaries(self):
+        tx = self._add(DebtorTransaction.Type.EXPENSE, "30.00")
+
+        tx = DebtorTransaction.objects.get(pk=tx.pk)
+        tx.type, tx.amount = DebtorTransaction.Type.INCOME, Decimal("10.00")
+        self.admin.save_model(self.request, tx, form=None, change=True)
+        self.assertEqual(self._summary().balance, Decimal("10.00"))
+        self.assertEqual(self._balance(), Decimal("10.00"))
+
+        tx = DebtorTransaction.objects.get(pk=tx.pk)
+        tx.phone = "+998907654321"
+        self.admin.save_model(self.request, tx, form=None, change=True)
+        self.assertIsNone(self._summary())
+        self.assertEqual(self._summary(phone="+998907654321").balance, Decimal("10.00"))
+
+        tx = DebtorTransaction.objects.get(pk=tx.pk)
+        tx.user = self.other
+        self.admin.save_model(self.request, tx, form=None, change=True)
+        self.assertIsNone(self._summary(phone="+998907654321"))
+        self.assertEqual(self._summary(user=self.other, phone="+998907654321").balance, Decimal("10.00"))
+        self.assertIsNone(self._balance())
+        self.assertEqual(self._balance(self.other), Decimal("10.00"))
+
+    def test_delete_reverts_summary(self):
+        income = self._add(DebtorTransaction.Type.INCOME, "100.00")
+        self._add(DebtorTransaction.Type.EXPENSE, "30.00")
+
+        self.admin.delete_model(self.request, income)
+
+        summary = self._summary()
+        self.assertEqual((summary.balance, summary.transaction_count), (Decimal("-30.00"), 1))
+        self.assertEqual(self._balance(), Decimal("-30.00"))
+
+    def test_bulk_delete_reverts_summaries(self):
+        self._add(DebtorTransaction.Type.INCOME, "100.00")
+        self._add(DebtorTransaction.Type.EXPENSE, "30.00")
+        kept = self._add(DebtorTransaction.Type.INCOME, "5.00", phone="+998907654321")
+
+        self.admin.delete_queryset(self.request, DebtorTransaction.objects.exclude(pk=kept.pk))
+
+        self.assertIsNone(self._summary())
+        self.assertEqual(self._summary(phone="+998907654321").balance, Decimal("5.00"))
+        self.assertEqual(self._balance(), Decimal("5.00"))
+        self.assertEqual(reconcile_debtor_balances(repair=False), [])
+
+
+class TransactionCursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000033", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.category = Category.objects.create(name="Salary")
+        self.client.force_authenticate(user=self.user)
+        self.transactions = [
+            Transaction.objects.create(
+                user=self.user,
+                type=Transaction.Type.INCOME,
+                amount=Decimal("1.00"),
+                currency=self.currency,
+                category=self.category,
+                date=date(2025, 1, 1 + i // 2),
+            )
+            for i in range(7)
+        ]
+
+    def test_cursor_pages_walk_feed_without_count(self):
+        expected = [tx.id for tx in sorted(self.transactions, key=lambda tx: (tx.date, tx.id), reverse=True)]
+        url = reverse("transaction-list")
+        params = {"pagination": "cursor", "page_size": 3}
+        seen = []
+
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            self.assertFalse(any("COUNT(" in query["sql"] for query in queries.captured_queries))
+            self.assertEqual(response.data["totals"]["income_total"], Decimal("7.00"))
+            seen.extend(item["id"] for item in response.data["results"])
+            url, params = response.data["next"], None
+
+        self.assertEqual(seen, expected)
+
+    def test_page_number_pagination_is_still_default(self):
+        response = self.client.get(reverse("transaction-list"), {"page_size": 3, "page": 3})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_cursor_page_size_is_parsed_and_clamped(self):
+        sizes = {}
+        for raw in ("2", "0", "-3", "abc", "1000"):
+            response = self.client.get(reverse("transaction-list"), {"pagination": "cursor", "page_size": raw})
+            sizes[raw] = len(response.data["results"])
+
+        self.assertEqual(sizes, {"2": 2, "0": 7, "-3": 7, "abc": 7, "1000": 7})
+        self.assertEqual(KeysetPagination().get_page_size(SimpleNamespace(query_params={"page_size": "500"})), 100)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse("transaction-list"), {"cursor": "not-a-cursor"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TransactionTotalsCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone="+10000000034", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.category = Category.objects.create(name="Salary")
+        self.client.force_authenticate(user=self.user)
+        for i in range(5):
+            self._create_transaction(day=1 + i)
+
+    def _create_transaction(self, day, amount="10.00"):
+        return Transaction.objects.create(
+            user=self.user,
+            type=Transaction.Type.INCOME,
+            amount=Decimal(amount),
+            currency=self.currency,
+            category=self.category,
+            date=date(2025, 1, day),
+        )
+
+    def _list(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("transaction-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        aggregated = any("SUM(" in query["sql"] for query in queries.captured_queries)
+        return response.data["totals"]["income_total"], aggregated
+
+    def test_paging_reuses_cached_totals(self):
+        self.assertEqual(self._list({"page_size": 2}), (Decimal("50.00"), True))
+        self.assertEqual(self._list({"page_size": 2, "page": 2}), (Decimal("50.00"), False))
+        self.assertEqual(self._list({"from": "2025-01-03"}), (Decimal("30.00"), True))
+
+    def test_write_invalidates_cached_totals(self):
+        self._list({})
+        transaction = self._create_transaction(day=10, amount="5.00")
+        self.assertEqual(self._list({}), (Decimal("55.00"), True))
+
+        transaction.delete()
+        self.assertEqual(self._list({}), (Decimal("50.00"), True))
+
+    def test_totals_cached_before_commit_are_invalidated_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_transaction(day=10, amount="5.00")
+            # A concurrent summary request still sees the committed rows only.
+            stale_key = transaction_totals_cache_key(self.user.id, {})
+            cache.set(stale_key, {"income_total": Decimal("50.00")})
+
+        self.assertNotEqual(transaction_totals_cache_key(self.user.id, {}), stale_key)
+        self.assertEqual(self._list({}), (Decimal("55.00"), True))
+
+    def test_cache_is_per_user(self):
+        self._list({})
+        other_user = User.objects.create_user(phone="+10000000035", password="pass")
+        self.client.force_authenticate(user=other_user)
+
+        self.assertEqual(self._list({}), (Decimal("0.00"), True))
+
+
+class TransactionSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000036", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.salary = Category.objects.create(name="Salary", name_en="Salary")
+        self.food = Category.objects.create(name="Food", name_en="Food")
+        self.client.force_authenticate(user=self.user)
+
+    def _create(self, tx_type, amount, category, day):
+        response = self.client.post(
+            reverse("transaction-list"),
+            {
+                "type": tx_type,
+                "amount": amount,
+                "currency": self.currency.id,
+                "category": category.id,
+                "date": day,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def _summary(self, params=None):
+        response = self.client.get(reverse("transaction-summary"), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_summary_groups_rollups_by_period_and_category(self):
+        self._create(Transaction.Type.INCOME, "100.00", self.salary, "2025-01-05")
+        self._create(Transaction.Type.EXPENSE, "20.00", self.food, "2025-01-05")
+        self._create(Transaction.Type.EXPENSE, "5.00", self.food, "2025-02-10")
+
+        data = self._summary({"group_by": "monthly"})
+
+        self.assertEqual(
+            [(str(row["period"])[:10], row["income_total"], row["expense_total"]) for row in data["results"]],
+            [("2025-01-01", Decimal("100.00"), Decimal("20.00")), ("2025-02-01", Decimal("0.00"), Decimal("5.00"))],
+        )
+        food = next(row for row in data["categories"] if row["category_id"] == self.food.id)
+        self.assertEqual((food["expense_total"], food["count"]), (Decimal("25.00"), 2))
+        self.assertEqual(data["totals"]["count"], 3)
+
+        yearly = self._summary({"group_by": "yearly", "type": Transaction.Type.EXPENSE})
+        self.assertEqual(len(yearly["results"]), 1)
+        self.assertEqual(yearly["totals"]["expense_total"], Decimal("25.00"))
+
+    def test_rollup_follows_update_and_delete(self):
+        tx_id = self._create(Transaction.Type.EXPENSE, "20.00", self.food, "2025-01-05")
+        self.client.patch(
+            reverse("transaction-detail", args=[tx_id]),
+            {"amount": "30.00", "date": "2025-03-01"},
+            format="json",
+        )
+        data = self._summary()
+        self.assertEqual([str(row["period"])[:10] for row in data["results"]], ["2025-03-01"])
+        self.assertEqual(data["totals"]["expense_total"], Decimal("30.00"))
+
+        self.client.delete(reverse("transaction-detail", args=[tx_id]))
+        self.assertEqual(self._summary()["results"], [])
+        self.assertFalse(DailyTransactionRollup.objects.filter(user=self.user).exists())
+
+    def test_rebuild_command_matches_transactions(self):
+        for day in (1, 1, 2):
+            Transaction.objects.create(
+                user=self.user,
+                type=Transaction.Type.INCOME,
+                amount=Decimal("10.00"),
+                currency=self.currency,
+                category=self.salary,
+                date=date(2025, 1, day),
+            )
+
+        out = StringIO()
+        call_command("rebuild_transaction_rollups", stdout=out)
+
+        self.assertIn("Rebuilt 2 daily transaction rollups.", out.getvalue())
+        data = self._summary({"group_by": "daily"})
+        self.assertEqual([row["count"] for row in data["results"]], [2, 1])
+
+    def test_data_migration_builds_rollups_for_existing_transactions(self):
+        self._create(Transaction.Type.INCOME, "100.00", self.salary, "2025-01-05")
+        self._create(Transaction.Type.EXPENSE, "20.00", self.food, "2025-01-05")
+        self._create(Transaction.Type.EXPENSE, "5.00", self.food, "2025-01-05")
+        DailyTransactionRollup.objects.all().delete()
+
+        migration = import_module("finance.migrations.0011_backfill_daily_transaction_rollups")
+        migration.backfill_daily_rollups(django_apps, None)
+
+        data = self._summary()
+        self.assertEqual(data["totals"]["count"], 3)
+        self.assertEqual(data["totals"]["expense_total"], Decimal("25.00"))
+        self.assertEqual(DailyTransactionRollup.objects.filter(user=self.user).count(), 2)
+
+    def test_invalid_group_by_is_rejected(self):
+        response = self.client.get(reverse("transaction-summary"), {"group_by": "hourly"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TransactionImportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone="+10000000037", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.inactive_currency = Currency.objects.create(code="EUR", name="Euro", is_active=False)
+        self.category = Category.objects.create(name="Food", name_en="Food")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("transaction-import-transactions")
+
+    def test_csv_upload_creates_valid_rows_and_reports_errors(self):
+        content = (
+            "type,amount,currency,category,date,note\n"
+            f"EXPENSE,12.50,USD,{self.category.id},2025-01-02,Lunch\n"
+            "INCOME,100,usd,food,2025-01-03,\n"
+            "BONUS,1,USD,food,2025-01-03,\n"
+            "EXPENSE,-5,EUR,unknown,not-a-date,\n"
+        )
+        upload = SimpleUploadedFile("transactions.csv", content.encode("utf-8"), content_type="text/csv")
+
+        response = self.client.post(self.url, {"file": upload}, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data["created"], response.data["failed"]), (2, 2))
+        self.assertEqual(response.data["errors"][0], {"row": 3, "errors": {"type": ["Invalid transaction type."]}})
+        self.assertEqual(
+            set(response.data["errors"][1]["errors"]),
+            {"amount", "currency", "category", "date"},
+        )
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            DailyTransactionRollup.objects.filter(user=self.user).aggregate(total=Sum("transaction_count"))["total"],
+            2,
+        )
+
+    def test_ndjson_body_is_streamed_in_batches(self):
+        lines = "\n".join(
+            json.dumps(
+                {
+                    "type": "EXPENSE",
+                    "amount": "1.00",
+                    "currency": self.currency.id,
+                    "category": self.category.id,
+                    "date": "2025-01-01",
+                }
+            )
+            for _ in range(2500)
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data=lines, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2500)
+        self.assertLess(len(queries), 100)
+        rollup = DailyTransactionRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.transaction_count, rollup.amount_total), (2500, Decimal("2500.00")))
+
+    def test_import_invalidates_cached_totals(self):
+        self.client.get(reverse("transaction-list"))
+        self.client.post(
+            self.url,
+            data=f"type,amount,currency,category,date\nINCOME,7,USD,{self.category.id},2025-01-01\n",
+            content_type="text/csv",
+        )
+
+        response = self.client.get(reverse("transaction-list"))
+        self.assertEqual(response.data["totals"]["income_total"], Decimal("7.00"))
+
+    def test_unicode_line_separators_inside_notes_do_not_split_rows(self):
+        note = "Tushlik\u2028kechki\x85ovqat\x0cva\x0bchoy"
+        content = (
+            "type,amount,currency,category,date,note\r\n"
+            f"EXPENSE,3,USD,{self.category.id},2025-01-02,{note}\r\n"
+            f"EXPENSE,4,USD,{self.category.id},2025-01-03,\"multi\nline\"\r\n"
+        )
+
+        response = self.client.post(self.url, data=content.encode("utf-8"), content_type="text/csv")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data["created"], response.data["failed"]), (2, 0))
+        self.assertEqual(
+            list(Transaction.objects.filter(user=self.user).order_by("date").values_list("note", flat=True)),
+            [note, "multi\nline"],
+        )
+
+    def test_dry_run_validates_without_inserting(self):
+        response = self.client.post(
+            f"{self.url}?dry_run=true",
+            data=f"type,amount,currency,category,date\nINCOME,7,USD,{self.category.id},2025-01-01\n",
+            content_type="text/csv",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+    def test_csv_without_required_columns_is_rejected(self):
+        response = self.client.post(self.url, data="type,amount\nINCOME,1\n", content_type="text/csv")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", response.data)
+
+
+class TransactionExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000038", password="pass")
+        self.other = User.objects.create_user(phone="+10000000039", password="pass")
+        self.currency = Currency.objects.create(code="USD", name="US Dollar", is_active=True)
+        self.category = Category.objects.create(name="Food", name_en="Food")
+        self.client.force_authenticate(user=self.user)
+        for day, tx_type, amount in (
+            (date(2025, 1, 1), Transaction.Type.INCOME, "100.00"),
+            (date(2025, 1, 2), Transaction.Type.EXPENSE, "25.50"),
+            (date(2025, 2, 1), Transaction.Type.EXPENSE, "10.00"),
+        ):
+            Transaction.objects.create(
+                user=self.user,
+                type=tx_type,
+                amount=Decimal(amount),
+                currency=self.currency,
+                category=self.category,
+                date=day,
+                note="Lunch, \"office\"",
+            )
+        Transaction.objects.create(
+            user=self.other,
+            type=Transaction.Type.INCOME,
+            amount=Decimal("1.00"),
+            currency=self.currency,
+            category=self.category,
+            date=date(2025, 1, 1),
+        )
+
+    def _csv_rows(self, response):
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.client.get(
+            reverse("transaction-export"),
+            {"type": "EXPENSE", "from": "2025-01-01", "to": "2025-01-31"},
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="transactions.csv"', response["Content-Disposition"])
+        rows = self._csv_rows(response)
+        self.assertEqual(rows[0], ["id", "date", "type", "amount", "currency", "category", "note"])
+        self.assertEqual(rows[1][1:], ["2025-01-02", "EXPENSE", "25.50", "USD", "Food", 'Lunch, "office"'])
+        self.assertEqual(len(rows), 2)
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        response = self.client.get(reverse("transaction-export"), {"file_format": "xlsx"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        self.assertIn("xl/workbook.xml", archive.namelist())
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        self.assertEqual(sheet.count("<row>"), 4)
+        self.assertIn("<v>25.50</v>", sheet)
+        self.assertIn('<t xml:space="preserve">Lunch, "office"</t>', sheet)
+
+    def test_invalid_format_is_rejected(self):
+        response = self.client.get(reverse("transaction-export"), {"file_format": "pdf"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_debtor_ledger_export_filters_by_phone(self):
+        for phone in ("+998901234567", "+998907654321"):
+            DebtorTransaction.objects.create(
+                user=self.user,
+                type=DebtorTransaction.Type.INCOME,
+                amount=Decimal("5.00"),
+                currency=self.currency,
+                phone=phone,
+            )
+
+        response = self.client.get(reverse("debtor-transaction-export"), {"phone": "+998901234567"})
+
+        rows = self._csv_rows(response)
+        self.assertEqual(rows[0], ["id", "date", "phone", "type", "amount", "currency", "note"])
+        self.assertEqual([row[2] for row in rows[1:]], ["+998901234567"])
@@ -1,19 +1,39 @@
-﻿from decimal import Decimal
+﻿import copy
+from decimal import Decimal
 
 from datetime import timedelta
 
-from django.db.models import Case, DecimalField, Sum, Value, When
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, Q, Sum, Value, When
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
 from django.utils.dateparse import parse_date
 from django.utils import timezone
 from django.utils.translation import gettext as _
-from rest_framework import viewsets, permissions
+from rest_framework import permissions, status, viewsets
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
-from .models import Category, Currency, Transaction, DebtorTransaction
-from .pagination import DefaultPagination
+from .exports import (
+    DEBTOR_TRANSACTION_EXPORT_COLUMNS,
+    TRANSACTION_EXPORT_COLUMNS,
+    export_queryset,
+    get_export_format,
+)
+from .importers import (
+    IMPORT_FORMAT_CSV,
+    IMPORT_FORMAT_NDJSON,
+    ImportFormatError,
+    import_transactions,
+    iter_csv_rows,
+    iter_ndjson_rows,
+    iter_text_lines,
+)
+from .models import Category, Currency, DailyTransactionRollup, Transaction, DebtorTransaction
+from .pagination import DefaultPagination, KeysetPagination
 from .permissions import IsAuthenticated, IsOwner
 from .serializers import (
     CategorySerializer,
@@ -26,11 +46,28 @@ from .serializers import (
 )
 from .services import (
     apply_transaction_to_balance,
+    apply_transaction_to_ledger_summary,
+    apply_transaction_to_rollup,
+    apply_transaction_update_to_balance,
+    apply_transaction_update_to_ledger_summary,
+    apply_transaction_update_to_rollup,
     ensure_virtual_card_for_user,
+    filter_transactions,
     get_balance_data_for_queryset,
-    recompute_debtor_balance,
+    get_transaction_totals_cache_timeout,
+    revert_transaction_from_balance,
+    revert_transaction_from_ledger_summary,
+    revert_transaction_from_rollup,
+    transaction_totals_cache_key,
 )
 
+SUMMARY_GROUPINGS = {
+    "daily": TruncDay,
+    "weekly": TruncWeek,
+    "monthly": TruncMonth,
+    "yearly": TruncYear,
+}
+
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -66,42 +103,62 @@ class VirtualCardMeView(APIView):
         card = ensure_virtual_card_for_user(request.user)
         return Response(VirtualCardSerializer(card).data)
 
+
 class TransactionViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsOwner]
     pagination_class = DefaultPagination
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or a cursor token) opts into keyset pages; page numbers stay the default.
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            if params.get("pagination") == "cursor" or "cursor" in params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
             return TransactionReadSerializer
         return TransactionWriteSerializer
 
-    def get_queryset(self):
-        queryset = (
-            Transaction.objects.filter(user=self.request.user)
-            .select_related("currency", "category")
-        )
+    def get_filters(self):
+        """
+        Validate the list filters and normalize them to explicit values.
+
+        Periods are resolved to concrete date ranges, so two requests that
+        select the same rows produce the same filter dict.
+        """
+        if hasattr(self, "_filters"):
+            return self._filters
 
-        period_param = self.request.query_params.get("period")
-        type_param = self.request.query_params.get("type")
+        params = self.request.query_params
+        filters = {}
+
+        period_param = params.get("period")
+        type_param = params.get("type")
         if type_param:
             if type_param not in Transaction.Type.values:
                 raise ValidationError({"type": _("Invalid transaction type.")})
-            queryset = queryset.filter(type=type_param)
+            filters["type"] = type_param
 
-        category_id = self.request.query_params.get("categoryId")
+        category_id = params.get("categoryId")
         if category_id:
             if not category_id.isdigit():
                 raise ValidationError({"categoryId": _("Invalid category id.")})
-            queryset = queryset.filter(category_id=int(category_id))
+            filters["category_id"] = int(category_id)
 
-        currency_id = self.request.query_params.get("currency")
+        currency_id = params.get("currency")
         if currency_id:
             if not currency_id.isdigit():
                 raise ValidationError({"currency": _("Invalid currency id.")})
-            queryset = queryset.filter(currency_id=int(currency_id))
+            filters["currency_id"] = int(currency_id)
 
-        from_param = self.request.query_params.get("from")
-        to_param = self.request.query_params.get("to")
+        from_param = params.get("from")
+        to_param = params.get("to")
         if period_param and (from_param or to_param):
             raise ValidationError({"period": _("Cannot combine period with from/to filters.")})
 
@@ -109,11 +166,14 @@ class TransactionViewSet(viewsets.ModelViewSet):
             period_value = period_param.lower()
             today = timezone.localdate()
             if period_value == "daily":
-                queryset = queryset.filter(date=today)
+                filters["date_from"] = filters["date_to"] = today
             elif period_value == "weekly":
-                queryset = queryset.filter(date__gte=today - timedelta(days=6), date__lte=today)
+                filters["date_from"] = today - timedelta(days=6)
+                filters["date_to"] = today
             elif period_value == "monthly":
-                queryset = queryset.filter(date__year=today.year, date__month=today.month)
+                next_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+                filters["date_from"] = today.replace(day=1)
+                filters["date_to"] = next_month - timedelta(days=1)
             else:
                 raise ValidationError({"period": _("Invalid period. Use daily, weekly, or monthly.")})
 
@@ -121,17 +181,30 @@ class TransactionViewSet(viewsets.ModelViewSet):
             from_date = parse_date(from_param)
             if not from_date:
                 raise ValidationError({"from": _("Invalid from date.")})
-            queryset = queryset.filter(date__gte=from_date)
+            filters["date_from"] = from_date
 
         if to_param:
             to_date = parse_date(to_param)
             if not to_date:
                 raise ValidationError({"to": _("Invalid to date.")})
-            queryset = queryset.filter(date__lte=to_date)
+            filters["date_to"] = to_date
 
-        return queryset
+        self._filters = filters
+        return filters
+
+    def get_queryset(self):
+        queryset = (
+            Transaction.objects.filter(user=self.request.user)
+            .select_related("currency", "category")
+        )
+        return filter_transactions(queryset, self.get_filters())
 
     def _get_totals(self, queryset):
+        cache_key = transaction_totals_cache_key(self.request.user.id, self.get_filters())
+        totals = cache.get(cache_key)
+        if totals is not None:
+            return totals
+
         totals = queryset.aggregate(
             income=Sum(
                 Case(
@@ -148,10 +221,12 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 )
             ),
         )
-        return {
+        totals = {
             "income_total": totals["income"] or Decimal("0.00"),
             "expense_total": totals["expense"] or Decimal("0.00"),
         }
+        cache.set(cache_key, totals, get_transaction_totals_cache_timeout())
+        return totals
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
@@ -167,9 +242,145 @@ class TransactionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response({"results": serializer.data, "totals": totals})
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save()
+        tx = serializer.save()
+        apply_transaction_to_rollup(tx)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_tx = copy.copy(serializer.instance)
+        tx = serializer.save()
+        apply_transaction_update_to_rollup(tx, old_tx)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        revert_transaction_from_rollup(instance)
+        instance.delete()
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_transactions(self, request):
+        """
+        Bulk import from a CSV or NDJSON upload.
+
+        Accepts a multipart ``file`` field or a raw ``text/csv`` /
+        ``application/x-ndjson`` body; ``file_format`` overrides the format
+        inferred from the file name or content type. The upload is parsed as
+        a stream and valid rows are inserted in batches; invalid rows are
+        skipped and reported with their row number. ``dry_run=true`` only
+        validates.
+        """
+        upload = None
+        content_type = (request.content_type or "").split(";")[0].strip().lower()
+        if content_type == "multipart/form-data":
+            upload = request.FILES.get("file")
+            if upload is None:
+                raise ValidationError({"file": _("File is required.")})
+            stream = upload
+        else:
+            stream = request.stream
+            if stream is None:
+                raise ValidationError({"file": _("File is required.")})
+
+        import_format = (request.query_params.get("file_format") or "").lower()
+        if not import_format:
+            name = (getattr(upload, "name", "") or "").lower()
+            upload_type = (getattr(upload, "content_type", "") or "").lower()
+            if name.endswith((".ndjson", ".jsonl")) or "ndjson" in upload_type or "ndjson" in content_type:
+                import_format = IMPORT_FORMAT_NDJSON
+            else:
+                import_format = IMPORT_FORMAT_CSV
+        if import_format not in (IMPORT_FORMAT_CSV, IMPORT_FORMAT_NDJSON):
+            raise ValidationError({"file_format": _("Invalid import format. Use csv or ndjson.")})
+
+        lines = iter_text_lines(stream)
+        rows = iter_csv_rows(lines) if import_format == IMPORT_FORMAT_CSV else iter_ndjson_rows(lines)
+        dry_run = (request.query_params.get("dry_run") or "").lower() in ("1", "true", "yes")
+
+        try:
+            result = import_transactions(user=request.user, rows=rows, dry_run=dry_run)
+        except ImportFormatError as exc:
+            raise ValidationError({"file": str(exc)})
+        except UnicodeDecodeError:
+            raise ValidationError({"file": _("File must be UTF-8 encoded.")})
+
+        response_status = status.HTTP_201_CREATED if result["created"] and not dry_run else status.HTTP_200_OK
+        return Response(result, status=response_status)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Download the filtered transactions as CSV or XLSX (``file_format``), streamed row by row."""
+        queryset = self.get_queryset().order_by("-date", "-id")
+        return export_queryset(
+            queryset,
+            columns=TRANSACTION_EXPORT_COLUMNS,
+            file_format=get_export_format(request),
+            filename="transactions",
+        )
 
+    @action(detail=False, methods=["get"])
+    def summary(self, request):
+        """
+        Income/expense totals bucketed by ``group_by`` (daily, weekly, monthly,
+        yearly) plus a per-category breakdown, read from the daily rollup.
+        Accepts the same filters as the list endpoint.
+        """
+        group_by = (request.query_params.get("group_by") or "monthly").lower()
+        trunc = SUMMARY_GROUPINGS.get(group_by)
+        if trunc is None:
+            raise ValidationError({"group_by": _("Invalid group_by. Use daily, weekly, monthly, or yearly.")})
+
+        rollups = filter_transactions(
+            DailyTransactionRollup.objects.filter(user=request.user),
+            self.get_filters(),
+        ).order_by()
+
+        income = Sum("amount_total", filter=Q(type=Transaction.Type.INCOME))
+        expense = Sum("amount_total", filter=Q(type=Transaction.Type.EXPENSE))
+        count = Sum("transaction_count")
+
+        periods = (
+            rollups.annotate(period=trunc("date"))
+            .values("period")
+            .annotate(income=income, expense=expense, count=count)
+            .order_by("period")
+        )
+        categories = (
+            rollups.values("category_id", "category__name_uz", "category__name_ru", "category__name_en")
+            .annotate(income=income, expense=expense, count=count)
+            .order_by("category_id")
+        )
+        totals = rollups.aggregate(income=income, expense=expense, count=count)
+
+        def _amounts(row):
+            return {
+                "income_total": row["income"] or Decimal("0.00"),
+                "expense_total": row["expense"] or Decimal("0.00"),
+                "count": row["count"] or 0,
+            }
+
+        return Response(
+            {
+                "group_by": group_by,
+                "results": [{"period": row["period"], **_amounts(row)} for row in periods],
+                "categories": [
+                    {
+                        "category_id": row["category_id"],
+                        "name_uz": row["category__name_uz"],
+                        "name_ru": row["category__name_ru"],
+                        "name_en": row["category__name_en"],
+                        **_amounts(row),
+                    }
+                    for row in categories
+                ],
+                "totals": _amounts(totals),
+            }
+        )
 
 
 class DebtorTransactionViewSet(viewsets.ModelViewSet):
@@ -215,17 +426,38 @@ class DebtorTransactionViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response({"results": serializer.data, "totals": totals})
 
+    @transaction.atomic
     def perform_create(self, serializer):
         tx = serializer.save(user=self.request.user)
         apply_transaction_to_balance(user=self.request.user, tx=tx)
+        apply_transaction_to_ledger_summary(user=self.request.user, tx=tx)
 
+    @transaction.atomic
     def perform_update(self, serializer):
-        serializer.save()
-        recompute_debtor_balance(user=self.request.user)
+        old = serializer.instance
+        old_type, old_amount, old_currency_id, old_phone = old.type, old.amount, old.currency_id, old.phone
+        tx = serializer.save()
+        apply_transaction_update_to_balance(
+            user=self.request.user,
+            tx=tx,
+            old_type=old_type,
+            old_amount=old_amount,
+            old_currency_id=old_currency_id,
+        )
+        apply_transaction_update_to_ledger_summary(
+            user=self.request.user,
+            tx=tx,
+            old_type=old_type,
+            old_amount=old_amount,
+            old_phone=old_phone,
+        )
 
+    @transaction.atomic
     def perform_destroy(self, instance):
+        tx_type, amount, phone = instance.type, instance.amount, instance.phone
         instance.delete()
-        recompute_debtor_balance(user=self.request.user)
+        revert_transaction_from_balance(user=self.request.user, tx_type=tx_type, amount=amount)
+        revert_transaction_from_ledger_summary(user=self.request.user, phone=phone, tx_type=tx_type, amount=amount)
 
     @action(detail=False, methods=["get"])
     def balance(self, request):
@@ -237,4 +469,18 @@ class DebtorTransactionViewSet(viewsets.ModelViewSet):
 
         return Response(balance_data)
 
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Download the debtor ledger (optionally one ``phone``) as CSV or XLSX."""
+        queryset = self.get_queryset()
+        phone = request.query_params.get("phone")
+        if phone:
+            queryset = queryset.filter(phone=phone)
+        return export_queryset(
+            queryset.order_by("-date", "-id"),
+            columns=DEBTOR_TRANSACTION_EXPORT_COLUMNS,
+            file_format=get_export_format(request),
+            filename="debtor-transactions",
+        )
+
 
@@ -0,0 +1,115 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+CATALOG_STATE_KEY = "market:catalog:state"
+CATALOG_RESPONSE_CACHE_PREFIX = "market:catalog:response"
+DEFAULT_CATALOG_RESPONSE_CACHE_TIMEOUT = 300
+DEFAULT_CATALOG_STATE_TIMEOUT = 30
+
+
+def _state_timeout():
+    timeout = getattr(settings, "CATALOG_STATE_TIMEOUT", DEFAULT_CATALOG_STATE_TIMEOUT)
+    return timeout or None
+
+
+def _new_state():
+    return (time.time_ns(), timezone.now())
+
+
+def get_catalog_state():
+    """
+    ``(version, last_modified)`` of the whole catalog.
+
+    Moved forward by ``bump_catalog_version`` on every write, so deletes
+    count too. With a process-local cache other processes' writes never
+    reach this copy, so the state expires after ``CATALOG_STATE_TIMEOUT``
+    seconds and is re-seeded. A re-seed cannot know what was deleted in the
+    meantime, so it stamps the current time: ``Last-Modified`` only ever
+    moves forward and an old ``If-Modified-Since`` never revalidates.
+    """
+    state = cache.get(CATALOG_STATE_KEY)
+    if state is None:
+        cache.add(CATALOG_STATE_KEY, _new_state(), _state_timeout())
+        state = cache.get(CATALOG_STATE_KEY) or _new_state()
+    return state
+
+
+def _bump():
+    cache.set(CATALOG_STATE_KEY, _new_state(), _state_timeout())
+
+
+def bump_catalog_version():
+    # Bump now for this process and again on commit, so nothing cached from the
+    # pre-commit state in between survives.
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def _request_fingerprint(request, version):
+    renderer = getattr(request, "accepted_media_type", "") or ""
+    raw = f"{version}|{request.get_full_path()}|{renderer}|{getattr(request, 'version', '')}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _patch_headers(response, etag, last_modified, anonymous):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, no_cache=True, **({"public": True} if anonymous else {"private": True}))
+    patch_vary_headers(response, ("Accept", "Authorization"))
+    return response
+
+
+def catalog_cached(view_method):
+    """
+    Conditional GET and anonymous response caching for read-only catalog actions.
+
+    Responses carry a strong ETag derived from the catalog version and the
+    request URL/representation, and a Last-Modified of the newest catalog
+    write. Matching ``If-None-Match``/``If-Modified-Since`` requests get a
+    304 without touching the catalog tables. Rendered 200 responses for
+    anonymous callers are shared through the cache until the next write.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        version, last_modified = get_catalog_state()
+        fingerprint = _request_fingerprint(request, version)
+        etag = quote_etag(fingerprint)
+        anonymous = not request.user.is_authenticated
+
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        conditional = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if conditional is not None:
+            return _patch_headers(conditional, etag, last_modified, anonymous)
+
+        cache_key = f"{CATALOG_RESPONSE_CACHE_PREFIX}:{fingerprint}" if anonymous else None
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                content, content_type = cached
+                return _patch_headers(HttpResponse(content, content_type=content_type), etag, last_modified, True)
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        _patch_headers(response, etag, last_modified, anonymous)
+        if cache_key is not None:
+            timeout = getattr(settings, "CATALOG_RESPONSE_CACHE_TIMEOUT", DEFAULT_CATALOG_RESPONSE_CACHE_TIMEOUT)
+            response.add_post_render_callback(
+                lambda rendered: cache.set(cache_key, (rendered.content, rendered["Content-Type"]), timeout)
+            )
+        return response
+
+    return wrapper
@@ -0,0 +1,139 @@
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from market.models import Category, Order, Product
+from market.services import place_order
+
+
+def order_with_row_lock(user, product, quantity):
+    """The previous OrderViewSet path: lock the product row, check, then save the new stock."""
+    with transaction.atomic():
+        locked = Product.objects.select_for_update().get(pk=product.pk)
+        if not locked.is_available or locked.stock < quantity:
+            raise ValueError({"quantity": "Not enough product stock."})
+        order = Order.objects.create(user=user, product=locked, quantity=quantity)
+        locked.stock -= quantity
+        update_fields = ["stock"]
+        if locked.stock == 0:
+            locked.is_available = False
+            update_fields.append("is_available")
+        locked.save(update_fields=update_fields)
+        return order
+
+
+def order_with_conditional_update(user, product, quantity):
+    return place_order(
+        user,
+        product,
+        quantity,
+        Order.PaymentMethod.CASH,
+        save_order=lambda: Order.objects.create(user=user, product=product, quantity=quantity),
+    )
+
+
+STRATEGIES = {
+    "lock": order_with_row_lock,
+    "conditional": order_with_conditional_update,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Place single-product orders for one hot product from concurrent threads and report "
+        "orders/sec for the row-lock path and the conditional UPDATE path. Writes a user, a "
+        "product and hundreds of orders to the configured database (removed afterwards), so it "
+        "only runs with DEBUG on or --yes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent buyers.")
+        parser.add_argument("--orders", type=int, default=400, help="Orders attempted per strategy.")
+        parser.add_argument(
+            "--strategy",
+            choices=[*STRATEGIES, "both"],
+            default="both",
+            help="Which reservation path to measure.",
+        )
+        parser.add_argument(
+            "--yes",
+            action="store_true",
+            help="Run even with DEBUG off, i.e. against a database that may hold real data.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["yes"]:
+            raise CommandError(
+                "Refusing to write benchmark rows with DEBUG off. Point it at a scratch database "
+                "and pass --yes to run anyway."
+            )
+
+        threads = max(1, options["threads"])
+        orders = max(threads, options["orders"])
+        strategies = list(STRATEGIES) if options["strategy"] == "both" else [options["strategy"]]
+
+        suffix = uuid.uuid4().hex[:8]
+        user = get_user_model().objects.create_user(phone=f"+000bench{suffix}", password=uuid.uuid4().hex)
+        category = Category.objects.create(name=f"benchmark-{suffix}")
+        product = Product.objects.create(name=f"benchmark-{suffix}", price=Decimal("1000"), category=category)
+        try:
+            for name in strategies:
+                self._run(name, STRATEGIES[name], user, product, threads, orders)
+        finally:
+            Order.objects.filter(product=product).delete()
+            product.delete()
+            category.delete()
+            user.delete()
+
+    def _run(self, name, place, user, product, threads, orders):
+        # Half the attempts can succeed, so sold-out rejections are part of the load too.
+        stock = orders // 2
+        Order.objects.filter(product=product).delete()
+        Product.objects.filter(pk=product.pk).update(stock=stock, is_available=True)
+
+        outcomes = Counter()
+        outcomes_lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def buyer(count):
+            local = Counter()
+            start.wait()
+            try:
+                for _ in range(count):
+                    try:
+                        place(user, product, 1)
+                        local["ok"] += 1
+                    except ValueError:
+                        local["rejected"] += 1
+                    except Exception as exc:  # noqa: BLE001
+                        local[type(exc).__name__] += 1
+            finally:
+                connection.close()
+                with outcomes_lock:
+                    outcomes.update(local)
+
+        per_thread = [orders // threads + (1 if index < orders % threads else 0) for index in range(threads)]
+        workers = [threading.Thread(target=buyer, args=(count,)) for count in per_thread]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        created = Order.objects.filter(product=product).count()
+        oversold = created - (stock - product.stock)
+        errors = {key: value for key, value in outcomes.items() if key not in {"ok", "rejected"}}
+        self.stdout.write(
+            f"{name:<12} {orders / elapsed:8.1f} attempts/s  {outcomes['ok'] / elapsed:8.1f} orders/s  "
+            f"placed={outcomes['ok']} rejected={outcomes['rejected']} errors={errors or 0} "
+            f"stock_left={product.stock} oversold={oversold}"
+        )
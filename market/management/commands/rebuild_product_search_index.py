@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from market.caching import bump_catalog_version
+from market.search import get_product_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the product table."
+
+    def handle(self, *args, **options):
+        backend = get_product_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt product search index with {type(backend).__name__}."))
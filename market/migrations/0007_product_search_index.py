@@ -0,0 +1,97 @@
+from django.db import migrations
+
+
+# Frozen copies of market.search at the time of this migration; later tokenizer
+# changes belong in a new migration (or rebuild_product_search_index), not here.
+FTS_TABLE = "market_product_fts"
+SEARCH_TABLE = "market_product_search"
+APOSTROPHES = ("'", "`", "\u2018", "\u2019", "\u02bb", "\u02bc")
+
+
+def normalize_search_text(text):
+    text = (text or "").lower().replace("\u0451", "\u0435")
+    for apostrophe in APOSTROPHES:
+        text = text.replace(apostrophe, "")
+    return text
+
+
+def _product_rows(apps):
+    Product = apps.get_model("market", "Product")
+    return [
+        (
+            product_id,
+            normalize_search_text(name),
+            normalize_search_text(category_name),
+            normalize_search_text(description),
+        )
+        for product_id, name, category_name, description in Product.objects.values_list(
+            "id", "name", "category__name", "description"
+        ).iterator()
+    ]
+
+
+def create_postgres_search_index(apps, schema_editor):
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+        "product_id bigint PRIMARY KEY REFERENCES market_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+        "name text NOT NULL, "
+        "document tsvector NOT NULL)"
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx ON {SEARCH_TABLE} USING gin (document)"
+    )
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_name_trgm_idx ON {SEARCH_TABLE} USING gin (name gin_trgm_ops)"
+    )
+    rows = [
+        (product_id, name, name, category, description)
+        for product_id, name, category, description in _product_rows(apps)
+    ]
+    if rows:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, name, document) "
+                "VALUES (%s, %s, setweight(to_tsvector('simple', %s), 'A') "
+                "|| setweight(to_tsvector('simple', %s), 'B') || setweight(to_tsvector('simple', %s), 'D'))",
+                rows,
+            )
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        create_postgres_search_index(apps, schema_editor)
+        return
+    if connection.vendor != "sqlite":
+        return
+
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        "USING fts5(name, category, description, tokenize='unicode61 remove_diacritics 0')"
+    )
+    rows = _product_rows(apps)
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, category, description) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("market", "0006_order_latitude_order_longitude"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
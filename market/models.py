@@ -49,7 +49,8 @@ class Order(models.Model):
         on_delete=models.CASCADE,
         related_name="orders",
     )
-    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="orders")
+    # Single-product orders; checkout orders leave this empty and list their OrderItem rows.
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="orders", null=True, blank=True)
     quantity = models.PositiveIntegerField(default=1)
     location = models.CharField(max_length=255, blank=True, default="")
     latitude = models.DecimalField(
@@ -79,3 +80,16 @@ class Order(models.Model):
 
     def __str__(self):
         return f"Order({self.id}) user={self.user_id} status={self.status}"
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="order_items")
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"OrderItem({self.id}) order={self.order_id} product={self.product_id} x{self.quantity}"
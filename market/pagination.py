@@ -0,0 +1,28 @@
+from finance.pagination import KeysetPagination
+
+
+class ProductCursorPagination(KeysetPagination):
+    ordering = ("created_at", "id")
+
+
+class ProductSearchCursorPagination(KeysetPagination):
+    """Keyset pages in relevance order, keyed on the backend's ``search_rank`` annotation."""
+
+    ordering = ("search_rank", "id")
+
+    def parse_cursor_value(self, model, value):
+        return float(value)
+
+
+def wants_cursor_pages(request):
+    # ?pagination=cursor (or a cursor token) opts into compact keyset pages; the full list stays the default.
+    params = request.query_params
+    return params.get("pagination") == "cursor" or "cursor" in params
+
+
+def get_product_paginator(request, queryset):
+    if not wants_cursor_pages(request):
+        return None
+    if "search_rank" in queryset.query.annotations:
+        return ProductSearchCursorPagination()
+    return ProductCursorPagination()
@@ -0,0 +1,232 @@
+import re
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+FTS_TABLE = "market_product_fts"
+SEARCH_TABLE = "market_product_search"
+TOKEN_PATTERN = re.compile(r"\w+")
+# Uzbek Latin writes o'/g' and the tutuq belgisi with several apostrophe look-alikes,
+# and users often leave them out entirely, so they are dropped rather than split on.
+APOSTROPHES = ("'", "`", "\u2018", "\u2019", "\u02bb", "\u02bc")
+# Relative weight of the name, category name and description columns.
+NAME_WEIGHT = 10.0
+CATEGORY_WEIGHT = 4.0
+DESCRIPTION_WEIGHT = 1.0
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def normalize_search_text(text):
+    text = (text or "").lower().replace("\u0451", "\u0435")
+    for apostrophe in APOSTROPHES:
+        text = text.replace(apostrophe, "")
+    return text
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize_search_text(text))
+
+
+class SubstringSearchBackend:
+    """The original ``icontains`` search: unranked, no index; used on other databases."""
+
+    def search(self, queryset, query):
+        query = (query or "").strip()
+        return queryset.filter(
+            Q(name__icontains=query) | Q(description__icontains=query) | Q(category__name__icontains=query)
+        ).distinct()
+
+    def index_products(self, products):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+def _product_batches(size=1000):
+    from .models import Product
+
+    batch = []
+    for product in Product.objects.select_related("category").order_by("id").iterator(chunk_size=size):
+        batch.append(product)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _search_rows(products):
+    return [
+        (
+            product.id,
+            normalize_search_text(product.name),
+            normalize_search_text(product.category.name),
+            normalize_search_text(product.description),
+        )
+        for product in products
+    ]
+
+
+class SQLiteFTSSearchBackend:
+    """
+    FTS5 table holding normalized product text, ranked with ``bm25``.
+
+    Rows share the product id as ``rowid`` and are written in the same
+    transaction as the product (see ``market.signals``), so a rollback
+    leaves the index consistent. Every query word matches as a prefix.
+    """
+
+    def _match_query(self, query):
+        return " ".join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self._match_query(query)
+        if not match:
+            return queryset.none()
+
+        qn = connection.ops.quote_name
+        table = qn(FTS_TABLE)
+        product_id = f"{qn(queryset.model._meta.db_table)}.{qn('id')}"
+        rank = f"-bm25({table}, {NAME_WEIGHT}, {CATEGORY_WEIGHT}, {DESCRIPTION_WEIGHT})"
+        return (
+            queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match]))
+            .annotate(
+                # A rowid lookup inside the FTS index for each matched product, not a table scan.
+                search_rank=RawSQL(
+                    f"SELECT {rank} FROM {table} WHERE {table} MATCH %s AND {table}.rowid = {product_id}",
+                    [match],
+                )
+            )
+            .order_by("-search_rank", "-id")
+        )
+
+    def index_products(self, products):
+        rows = _search_rows(products)
+        if not rows:
+            return
+        table = connection.ops.quote_name(FTS_TABLE)
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, name, category, description) VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        table = connection.ops.quote_name(FTS_TABLE)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {table} WHERE rowid = %s",
+                [(product_id,) for product_id in product_ids],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(FTS_TABLE)}")
+        for batch in _product_batches():
+            self.index_products(batch)
+
+
+class PostgresSearchBackend:
+    """
+    Weighted ``tsvector`` match with prefix terms, plus ``pg_trgm`` similarity
+    on the name so misspelled queries still find something.
+
+    ``market_product_search`` stores the vector and the folded name per
+    product, with a GIN index on each; like the SQLite table it is written
+    in the product's transaction. The trigram match uses the ``%`` operator,
+    so its cut-off is ``pg_trgm.similarity_threshold`` (0.3 by default).
+    """
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+
+        qn = connection.ops.quote_name
+        table = qn(SEARCH_TABLE)
+        product_id = f"{qn(queryset.model._meta.db_table)}.{qn('id')}"
+        ts_query = " & ".join(f"{token}:*" for token in tokens)
+        name_query = " ".join(tokens)
+        return (
+            queryset.filter(
+                id__in=RawSQL(
+                    f"SELECT product_id FROM {table} "
+                    "WHERE document @@ to_tsquery('simple', %s) OR name %% %s",
+                    [ts_query, name_query],
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f"SELECT ts_rank(document, to_tsquery('simple', %s)) + similarity(name, %s) "
+                    f"FROM {table} WHERE product_id = {product_id}",
+                    [ts_query, name_query],
+                )
+            )
+            .order_by("-search_rank", "-id")
+        )
+
+    def index_products(self, products):
+        rows = [
+            (product_id, name, name, category, description)
+            for product_id, name, category, description in _search_rows(products)
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {connection.ops.quote_name(SEARCH_TABLE)} (product_id, name, document) "
+                "VALUES (%s, %s, setweight(to_tsvector('simple', %s), 'A') "
+                "|| setweight(to_tsvector('simple', %s), 'B') || setweight(to_tsvector('simple', %s), 'D')) "
+                "ON CONFLICT (product_id) DO UPDATE SET name = EXCLUDED.name, document = EXCLUDED.document",
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(SEARCH_TABLE)} WHERE product_id = ANY(%s)",
+                [list(product_ids)],
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {connection.ops.quote_name(SEARCH_TABLE)}")
+        for batch in _product_batches():
+            self.index_products(batch)
+
+
+VENDOR_BACKENDS = {
+    "sqlite": "market.search.SQLiteFTSSearchBackend",
+    "postgresql": "market.search.PostgresSearchBackend",
+}
+
+
+def get_product_search_backend():
+    """``PRODUCT_SEARCH_BACKEND`` if set, otherwise the backend for the database vendor."""
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, "PRODUCT_SEARCH_BACKEND", None) or VENDOR_BACKENDS.get(
+                    connection.vendor, "market.search.SubstringSearchBackend"
+                )
+                _backend = import_string(path)()
+    return _backend
+
+
+def search_products(queryset, query):
+    """Products matching ``query``, best match first (annotated with ``search_rank`` when ranked)."""
+    return get_product_search_backend().search(queryset, query)
@@ -1,6 +1,22 @@
-from rest_framework import serializers
+from rest_framework import permissions, serializers
 
-from .models import Category, Order, Product
+from .models import Category, Order, OrderItem, Product
+
+
+class SparseFieldsetMixin:
+    """Honours ``?fields=id,name,...`` on read requests by dropping every other field."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return
+        requested = request.query_params.get("fields")
+        if not requested:
+            return
+        allowed = {name.strip() for name in requested.split(",") if name.strip()}
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -10,7 +26,7 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=Category.objects.all(),
@@ -61,6 +77,8 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
+        if "image_urls" not in data:
+            return data
         image_urls = instance.image_urls or []
         if not image_urls and instance.image_url:
             image_urls = [instance.image_url]
@@ -76,8 +94,60 @@ class ProductSerializer(serializers.ModelSerializer):
         return merged
 
 
+MAX_CHECKOUT_ITEMS = 100
+
+# Columns ProductListSerializer reads (plus the pagination key); list querysets load only these.
+PRODUCT_LIST_COLUMNS = (
+    "id",
+    "name",
+    "price",
+    "discount_price",
+    "image_url",
+    "image_urls",
+    "category_id",
+    "stock",
+    "is_available",
+    "created_at",
+)
+
+
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Catalog row: category by id and the first image only."""
+
+    category_id = serializers.IntegerField(read_only=True)
+    image_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = [
+            "id",
+            "name",
+            "price",
+            "discount_price",
+            "image_url",
+            "category_id",
+            "stock",
+            "is_available",
+        ]
+        read_only_fields = fields
+
+    def get_image_url(self, instance):
+        image_urls = instance.image_urls or []
+        return image_urls[0] if image_urls else instance.image_url
+
+
+class OrderItemSerializer(serializers.ModelSerializer):
+    product = ProductListSerializer(read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ["id", "product", "quantity", "unit_price"]
+        read_only_fields = fields
+
+
 class OrderSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
+    items = OrderItemSerializer(many=True, read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.filter(is_available=True),
         source="product",
@@ -91,6 +161,7 @@ class OrderSerializer(serializers.ModelSerializer):
             "product",
             "product_id",
             "quantity",
+            "items",
             "location",
             "latitude",
             "longitude",
@@ -100,7 +171,7 @@ class OrderSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         ]
-        read_only_fields = ["id", "created_at", "updated_at", "product"]
+        read_only_fields = ["id", "created_at", "updated_at", "product", "items"]
 
     def validate_quantity(self, value):
         if value <= 0:
@@ -128,3 +199,25 @@ class OrderSerializer(serializers.ModelSerializer):
         if value is not None and not -180 <= value <= 180:
             raise serializers.ValidationError("Longitude must be between -180 and 180.")
         return value
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CheckoutSerializer(OrderSerializer):
+    """Cart checkout: the delivery and payment fields of an order plus its line items."""
+
+    product_id = None
+    items = CheckoutItemSerializer(many=True, allow_empty=False, max_length=MAX_CHECKOUT_ITEMS)
+
+    class Meta(OrderSerializer.Meta):
+        fields = ["items", "location", "latitude", "longitude", "note", "payment_method"]
+        read_only_fields = []
+
+    def validate_items(self, items):
+        quantities = {}
+        for item in items:
+            quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+        return quantities
@@ -1,6 +1,14 @@
 from decimal import Decimal, InvalidOperation
 
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, PositiveIntegerField, Q, When
+
+from finance.models import VirtualCard
+from finance.services import ensure_virtual_card_for_user
+
+from .models import Order, OrderItem, Product
+from .search import search_products
+from .signals import stock_changed
 
 
 def parse_bool_param(raw_value, field_name):
@@ -36,11 +44,7 @@ def filter_products(
     max_price=None,
 ):
     if q:
-        queryset = queryset.filter(
-            Q(name__icontains=q)
-            | Q(description__icontains=q)
-            | Q(category__name__icontains=q)
-        )
+        queryset = search_products(queryset, q)
 
     if category_id:
         queryset = queryset.filter(category_id=category_id)
@@ -57,4 +61,120 @@ def filter_products(
     if parsed_max_price is not None:
         queryset = queryset.filter(price__lte=parsed_max_price)
 
-    return queryset.distinct()
+    return queryset
+
+
+def unit_price_for(product):
+    return product.discount_price if product.discount_price is not None else product.price
+
+
+def decrement_stock(quantities):
+    """
+    Take ``{product_id: quantity}`` out of stock in one conditional UPDATE.
+
+    Every row is guarded by ``is_available AND stock >= quantity``, so no
+    row lock is needed. Returns False unless all rows matched; the caller
+    must then roll back its transaction. Products whose stock reaches zero
+    are marked unavailable and ``stock_changed`` is sent.
+    """
+    guard = Q()
+    stock_cases = []
+    sold_out_cases = []
+    for product_id, quantity in quantities.items():
+        guard |= Q(id=product_id, stock__gte=quantity)
+        stock_cases.append(When(id=product_id, then=F("stock") - quantity))
+        sold_out_cases.append(When(id=product_id, stock=quantity, then=False))
+
+    updated = Product.objects.filter(guard, is_available=True).update(
+        stock=Case(*stock_cases, default=F("stock"), output_field=PositiveIntegerField()),
+        is_available=Case(*sold_out_cases, default=F("is_available"), output_field=BooleanField()),
+    )
+    if updated != len(quantities):
+        return False
+
+    sold_out_ids = list(Product.objects.filter(id__in=quantities, stock=0).order_by().values_list("id", flat=True))
+    stock_changed.send(sender=Product, product_ids=list(quantities), sold_out_ids=sold_out_ids)
+    return True
+
+
+def debit_virtual_card(user, amount):
+    """Take ``amount`` from the user's virtual card in one conditional UPDATE; no row lock."""
+    debited = VirtualCard.objects.filter(user=user, balance__gte=amount).update(balance=F("balance") - amount)
+    if not debited:
+        raise ValueError({"balance": "Insufficient virtual card balance."})
+
+
+def place_order(user, product, quantity, payment_method, save_order):
+    """
+    Reserve stock for a single-product order without locking the product row.
+
+    The conditional UPDATE in ``decrement_stock`` both checks and takes the
+    stock, so concurrent buyers of the same product never wait on each
+    other's transactions; a virtual card is debited the same way.
+    ``save_order`` is called inside the transaction to create the order.
+    """
+    total_price = unit_price_for(product) * Decimal(quantity)
+    with transaction.atomic():
+        if not decrement_stock({product.id: quantity}):
+            is_available = Product.objects.filter(pk=product.pk).values_list("is_available", flat=True).first()
+            if not is_available:
+                raise ValueError({"product_id": "Product is not available."})
+            raise ValueError({"quantity": "Not enough product stock."})
+
+        if payment_method == Order.PaymentMethod.VIRTUAL_CARD:
+            debit_virtual_card(user, total_price)
+
+        return save_order()
+
+
+def place_checkout_order(user, quantities, payment_method=Order.PaymentMethod.CASH, **order_fields):
+    """
+    Create one order for ``{product_id: quantity}`` in a single transaction.
+
+    Product rows are locked in id order, so concurrent checkouts of
+    overlapping carts always queue in the same order instead of
+    deadlocking. Stock is taken with one conditional UPDATE and the virtual
+    card, if used, is debited once for the whole cart with the same
+    conditional UPDATE as ``place_order``.
+    """
+    if payment_method == Order.PaymentMethod.VIRTUAL_CARD:
+        ensure_virtual_card_for_user(user)
+
+    product_ids = sorted(quantities)
+    with transaction.atomic():
+        products = list(Product.objects.select_for_update().filter(id__in=product_ids).order_by("id"))
+        missing = set(product_ids) - {product.id for product in products}
+        if missing:
+            raise ValueError({"items": f"Unknown product ids: {', '.join(map(str, sorted(missing)))}."})
+
+        total_price = Decimal("0")
+        for product in products:
+            quantity = quantities[product.id]
+            if not product.is_available:
+                raise ValueError({"items": f"Product {product.id} is not available."})
+            if product.stock < quantity:
+                raise ValueError({"items": f"Not enough stock for product {product.id}."})
+            total_price += unit_price_for(product) * Decimal(quantity)
+
+        if payment_method == Order.PaymentMethod.VIRTUAL_CARD:
+            debit_virtual_card(user, total_price)
+
+        if not decrement_stock(quantities):
+            raise ValueError({"items": "Not enough product stock."})
+
+        order = Order.objects.create(
+            user=user,
+            quantity=sum(quantities.values()),
+            payment_method=payment_method,
+            **order_fields,
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product=product,
+                quantity=quantities[product.id],
+                unit_price=unit_price_for(product),
+            )
+            for product in products
+        )
+    return order
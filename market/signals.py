@@ -0,0 +1,43 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .caching import bump_catalog_version
+from .models import Category, Product
+from .search import get_product_search_backend
+
+SEARCHABLE_FIELDS = {"name", "description", "category"}
+
+# Sent after bulk stock UPDATEs, which bypass post_save. Arguments: product_ids, sold_out_ids.
+stock_changed = Signal()
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, update_fields=None, **kwargs):
+    bump_catalog_version()
+    # Stock and availability updates from orders leave the indexed text untouched.
+    if update_fields is not None and not SEARCHABLE_FIELDS.intersection(update_fields):
+        return
+    get_product_search_backend().index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    bump_catalog_version()
+    get_product_search_backend().remove_products([instance.id])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    bump_catalog_version()
+    if not created:
+        get_product_search_backend().index_products(instance.products.select_related("category").iterator())
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_on_category_delete(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(stock_changed)
+def invalidate_catalog_on_stock_change(sender, **kwargs):
+    bump_catalog_version()
@@ -1,5 +1,13 @@
+import time
 from decimal import Decimal
+from io import StringIO
 
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import parse_http_date
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -8,6 +16,9 @@ from finance.models import VirtualCard
 from users.models import User
 
 from .models import Category, Order, Product
+from .search import FTS_TABLE
+from .services import decrement_stock
+from .signals import stock_changed
 
 
 class OrderVirtualCardPaymentTests(APITestCase):
@@ -190,3 +201,385 @@ class OrderVirtualCardPaymentTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         card.refresh_from_db()
         self.assertEqual(card.balance, Decimal("0.00"))
+
+
+class OrderStockReservationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+998901112234", password="pass")
+        self.product = Product.objects.create(
+            name="Burger",
+            price=Decimal("25000.00"),
+            category=Category.objects.create(name="Food"),
+            stock=10,
+            is_available=True,
+        )
+        self.url = reverse("market-order-list")
+        self.client.force_authenticate(user=self.user)
+
+    def _order(self, quantity, **fields):
+        return self.client.post(
+            self.url,
+            {"product_id": self.product.id, "quantity": quantity, "payment_method": Order.PaymentMethod.CASH, **fields},
+            format="json",
+        )
+
+    def test_stock_is_taken_without_locking_the_row(self):
+        # The conditional UPDATE plus the indexed sold-out lookup; no SELECT ... FOR UPDATE.
+        with self.assertNumQueries(2):
+            self.assertTrue(decrement_stock({self.product.id: 3}))
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.is_available), (7, True))
+
+    def test_last_units_mark_the_product_sold_out(self):
+        received = []
+
+        def receiver(sender, product_ids, sold_out_ids, **kwargs):
+            received.append((product_ids, sold_out_ids))
+
+        stock_changed.connect(receiver)
+        self.addCleanup(stock_changed.disconnect, receiver)
+
+        self.assertEqual(self._order(4).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._order(6).status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(received, [([self.product.id], []), ([self.product.id], [self.product.id])])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.is_available), (0, False))
+
+    def test_order_is_rejected_when_stock_runs_out_after_validation(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+
+        response = self._order(2)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("quantity", response.data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_product_made_unavailable_after_validation_is_not_sold(self):
+        Product.objects.filter(pk=self.product.pk).update(is_available=False)
+
+        response = self._order(1)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("product_id", response.data)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+    def test_benchmark_command_refuses_to_run_without_confirmation(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_order_creation", stdout=StringIO())
+
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_failed_card_debit_returns_the_stock(self):
+        VirtualCard.objects.filter(user=self.user).update(balance=Decimal("1000.00"))
+
+        response = self._order(2, payment_method=Order.PaymentMethod.VIRTUAL_CARD)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("balance", response.data)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("market-product-search")
+        self.drinks = Category.objects.create(name="Ichimliklar")
+        self.food = Category.objects.create(name="Taomlar")
+        self.cola = Product.objects.create(name="Coca-Cola 1L", price=Decimal("12000"), category=self.drinks)
+        self.plov = Product.objects.create(
+            name="O‘zbek oshi",
+            description="Choyxona usulida, coca-cola bilan",
+            price=Decimal("35000"),
+            category=self.food,
+        )
+        self.honey = Product.objects.create(name="Мёд натуральный", price=Decimal("50000"), category=self.food)
+
+    def _ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["id"] for item in response.json()]
+
+    def test_results_are_ranked_with_name_matches_first(self):
+        self.assertEqual(self._ids(q="cola"), [self.cola.id, self.plov.id])
+
+    def test_prefix_apostrophe_and_cyrillic_folding(self):
+        self.assertEqual(self._ids(q="ozbek osh"), [self.plov.id])
+        self.assertEqual(self._ids(q="o'zbek"), [self.plov.id])
+        self.assertEqual(self._ids(q="мед"), [self.honey.id])
+        self.assertEqual(self._ids(q="ichim"), [self.cola.id])
+
+    def test_filters_still_apply(self):
+        self.assertEqual(self._ids(q="cola", max_price="20000"), [self.cola.id])
+        self.assertEqual(self._ids(q="cola", category_id=self.food.id), [self.plov.id])
+
+    def test_index_follows_product_and_category_writes(self):
+        self.cola.name = "Pepsi 1L"
+        self.cola.save()
+        self.plov.delete()
+        self.food.name = "Shirinliklar"
+        self.food.save()
+
+        self.assertEqual(self._ids(q="cola"), [])
+        self.assertEqual(self._ids(q="pepsi"), [self.cola.id])
+        self.assertEqual(self._ids(q="shirin"), [self.honey.id])
+
+    def test_rebuild_command_restores_the_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        self.assertEqual(self._ids(q="cola"), [])
+
+        call_command("rebuild_product_search_index", stdout=StringIO())
+
+        self.assertEqual(self._ids(q="cola"), [self.cola.id, self.plov.id])
+
+
+class ProductCatalogPaginationTests(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name="Ichimliklar")
+        self.other = Category.objects.create(name="Taomlar")
+        self.products = [
+            Product.objects.create(
+                name=f"Sharbat {i}",
+                description="Uzun tavsif " * 50,
+                price=Decimal("1000") * (i + 1),
+                category=self.category,
+                image_urls=[f"https://cdn.example.com/{i}-a.jpg", f"https://cdn.example.com/{i}-b.jpg"],
+            )
+            for i in range(5)
+        ]
+        Product.objects.create(name="Osh", price=Decimal("30000"), category=self.other)
+
+    def _collect(self, url, params):
+        ids, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages += 1
+            ids.extend(item["id"] for item in response.data["results"])
+            if response.data["next"] is None:
+                return ids, pages
+            response = self.client.get(response.data["next"])
+
+    def test_list_without_opt_in_keeps_the_full_representation(self):
+        response = self.client.get(reverse("market-product-list"))
+
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[0]["category"]["name"], "Taomlar")
+
+    def test_cursor_pages_use_the_compact_representation(self):
+        ids, pages = self._collect(reverse("market-product-list"), {"pagination": "cursor", "page_size": 2})
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+        response = self.client.get(reverse("market-product-list"), {"pagination": "cursor", "page_size": 2})
+        first = response.json()["results"][0]
+        self.assertEqual(
+            set(first),
+            {"id", "name", "price", "discount_price", "image_url", "category_id", "stock", "is_available"},
+        )
+        self.assertEqual(first["category_id"], self.other.id)
+
+    def test_sparse_fieldset(self):
+        response = self.client.get(
+            reverse("market-product-list"),
+            {"pagination": "cursor", "fields": "id,name,image_url"},
+        )
+
+        self.assertEqual(set(response.data["results"][1]), {"id", "name", "image_url"})
+        self.assertEqual(response.data["results"][1]["image_url"], "https://cdn.example.com/4-a.jpg")
+        detail = self.client.get(reverse("market-product-detail", args=[self.products[0].id]), {"fields": "id,price"})
+        self.assertEqual(detail.data, {"id": self.products[0].id, "price": "1000.00"})
+
+    def test_search_pages_follow_relevance(self):
+        Product.objects.create(name="Olma", description="Sharbat uchun", price=Decimal("5000"), category=self.other)
+
+        ids, pages = self._collect(
+            reverse("market-product-search"),
+            {"q": "sharbat", "pagination": "cursor", "page_size": 2},
+        )
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids[:5], [product.id for product in reversed(self.products)])
+        self.assertEqual(Product.objects.get(id=ids[-1]).name, "Olma")
+
+    def test_category_products_are_paginated(self):
+        url = reverse("market-category-products", args=[self.category.id])
+        self.client.force_authenticate(user=User.objects.create_user(phone="+998901112299", password="pass"))
+
+        ids, pages = self._collect(url, {"pagination": "cursor", "page_size": 4})
+
+        self.assertEqual(pages, 2)
+        self.assertEqual(sorted(ids), sorted(product.id for product in self.products))
+
+
+class CatalogHTTPCachingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Ichimliklar")
+        self.product = Product.objects.create(name="Choy", price=Decimal("8000"), category=self.category)
+        self.url = reverse("market-product-list")
+
+    def test_conditional_get_returns_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(revalidated["ETag"], etag)
+
+        by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(by_date.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_differs_per_representation(self):
+        list_etag = self.client.get(self.url)["ETag"]
+        detail_etag = self.client.get(reverse("market-product-detail", args=[self.product.id]))["ETag"]
+        search_etag = self.client.get(reverse("market-product-search"), {"q": "choy"})["ETag"]
+
+        self.assertEqual(len({list_etag, detail_etag, search_etag}), 3)
+
+    def test_anonymous_responses_are_shared_until_a_write(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.url)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached["ETag"], first["ETag"])
+
+        self.product.price = Decimal("9000")
+        self.product.save()
+        updated = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(updated["ETag"], first["ETag"])
+        self.assertEqual(updated.json()[0]["price"], "9000.00")
+
+    def test_deletes_invalidate_and_authenticated_responses_are_private(self):
+        self.client.force_authenticate(user=User.objects.create_user(phone="+998901112288", password="pass"))
+        first = self.client.get(self.url)
+        self.assertIn("private", first["Cache-Control"])
+
+        Product.objects.create(name="Qahva", price=Decimal("15000"), category=self.category).delete()
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, status.HTTP_200_OK)
+
+
+@override_settings(CATALOG_STATE_TIMEOUT=1)
+class CatalogStateExpiryTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(
+            name="Choy", price=Decimal("8000"), category=Category.objects.create(name="Ichimliklar")
+        )
+        self.url = reverse("market-product-list")
+
+    def test_state_expires_so_writes_this_process_never_saw_show_up(self):
+        first = self.client.get(self.url)
+
+        # A bulk update sends no signals, just like a write made by another process.
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal("9500"))
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED
+        )
+
+        time.sleep(1.1)
+        refreshed = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=first["ETag"], HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+
+        self.assertEqual(refreshed.status_code, status.HTTP_200_OK)
+        self.assertEqual(refreshed.json()[0]["price"], "9500.00")
+        self.assertGreater(parse_http_date(refreshed["Last-Modified"]), parse_http_date(first["Last-Modified"]))
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+998901112277", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("market-order-checkout")
+        category = Category.objects.create(name="Food")
+        self.burger = Product.objects.create(name="Burger", price=Decimal("25000"), category=category, stock=5)
+        self.cola = Product.objects.create(
+            name="Cola",
+            price=Decimal("10000"),
+            discount_price=Decimal("8000"),
+            category=category,
+            stock=2,
+        )
+        self.card = VirtualCard.objects.get(user=self.user)
+        self.card.balance = Decimal("100000.00")
+        self.card.save(update_fields=["balance"])
+
+    def _checkout(self, items, **fields):
+        return self.client.post(self.url, {"items": items, "location": "Tashkent", **fields}, format="json")
+
+    def test_cart_is_ordered_with_one_stock_update_and_one_card_debit(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._checkout(
+                [
+                    {"product_id": self.cola.id, "quantity": 1},
+                    {"product_id": self.burger.id, "quantity": 2},
+                    {"product_id": self.cola.id, "quantity": 1},
+                ],
+                payment_method=Order.PaymentMethod.VIRTUAL_CARD,
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(response.data["product"])
+        self.assertEqual(response.data["quantity"], 4)
+        self.assertEqual(
+            [(item["product"]["id"], item["quantity"], item["unit_price"]) for item in response.data["items"]],
+            [(self.burger.id, 2, "25000.00"), (self.cola.id, 2, "8000.00")],
+        )
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, Decimal("34000.00"))
+        self.burger.refresh_from_db()
+        self.cola.refresh_from_db()
+        self.assertEqual((self.burger.stock, self.burger.is_available), (3, True))
+        self.assertEqual((self.cola.stock, self.cola.is_available), (0, False))
+
+        statements = [query["sql"] for query in queries.captured_queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE "market_product"')]), 1)
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE "finance_virtualcard"')]), 1)
+
+    def test_cart_is_rejected_atomically(self):
+        response = self._checkout(
+            [{"product_id": self.burger.id, "quantity": 1}, {"product_id": self.cola.id, "quantity": 3}]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("items", response.data)
+        self.burger.refresh_from_db()
+        self.assertEqual(self.burger.stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_insufficient_balance_and_unknown_products_are_rejected(self):
+        expensive = self._checkout(
+            [{"product_id": self.burger.id, "quantity": 5}],
+            payment_method=Order.PaymentMethod.VIRTUAL_CARD,
+        )
+        unknown = self._checkout([{"product_id": 999999, "quantity": 1}])
+        empty = self._checkout([])
+
+        self.assertEqual(expensive.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("balance", expensive.data)
+        self.assertEqual(unknown.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(empty.status_code, status.HTTP_400_BAD_REQUEST)
+        self.burger.refresh_from_db()
+        self.assertEqual(self.burger.stock, 5)
+
+    def test_checkout_orders_are_listed_with_their_items(self):
+        self._checkout([{"product_id": self.burger.id, "quantity": 1}])
+
+        response = self.client.get(reverse("market-order-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["items"][0]["product"]["name"], "Burger")
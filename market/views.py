@@ -1,16 +1,32 @@
-from decimal import Decimal
-
-from django.db import transaction
-from finance.models import VirtualCard
 from finance.services import ensure_virtual_card_for_user
-from rest_framework import permissions, viewsets
+from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
+from .caching import catalog_cached
 from .models import Category, Order, Product
-from .serializers import CategorySerializer, OrderSerializer, ProductSerializer
-from .services import filter_products
+from .pagination import ProductCursorPagination, get_product_paginator, wants_cursor_pages
+from .serializers import (
+    PRODUCT_LIST_COLUMNS,
+    CategorySerializer,
+    CheckoutSerializer,
+    OrderSerializer,
+    ProductListSerializer,
+    ProductSerializer,
+)
+from .services import filter_products, place_checkout_order, place_order
+
+
+def paginated_products_response(view, request, queryset, serializer_class):
+    paginator = get_product_paginator(request, queryset)
+    if paginator is None:
+        serializer = serializer_class(queryset, many=True, context=view.get_serializer_context())
+        return Response(serializer.data)
+
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    serializer = ProductListSerializer(page, many=True, context=view.get_serializer_context())
+    return paginator.get_paginated_response(serializer.data)
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -18,12 +34,23 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @catalog_cached
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @catalog_cached
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=True, methods=["get"], url_path="products")
+    @catalog_cached
     def products(self, request, pk=None):
         category = self.get_object()
-        queryset = Product.objects.select_related("category").filter(category=category)
-        serializer = ProductSerializer(queryset, many=True)
-        return Response(serializer.data)
+        if wants_cursor_pages(request):
+            queryset = Product.objects.only(*PRODUCT_LIST_COLUMNS).filter(category=category)
+        else:
+            queryset = Product.objects.select_related("category").filter(category=category)
+        return paginated_products_response(self, request, queryset, ProductSerializer)
 
 
 class ProductViewSet(viewsets.ModelViewSet):
@@ -31,12 +58,40 @@ class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            self._paginator = ProductCursorPagination() if wants_cursor_pages(self.request) else None
+        return self._paginator
+
+    def _compact(self):
+        return self.action in {"list", "search"} and wants_cursor_pages(self.request)
+
+    def get_queryset(self):
+        if self._compact():
+            return Product.objects.only(*PRODUCT_LIST_COLUMNS)
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self._compact():
+            return ProductListSerializer
+        return super().get_serializer_class()
+
     def get_permissions(self):
         if self.action in {"list", "retrieve", "search"}:
             return [permissions.AllowAny()]
         return [permission() for permission in self.permission_classes]
 
+    @catalog_cached
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @catalog_cached
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=False, methods=["get"], url_path="search")
+    @catalog_cached
     def search(self, request):
         try:
             queryset = filter_products(
@@ -50,8 +105,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         except ValueError as exc:
             raise ValidationError(exc.args[0])
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return paginated_products_response(self, request, queryset, self.get_serializer_class())
 
 
 class OrderViewSet(viewsets.ModelViewSet):
@@ -59,10 +113,29 @@ class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Order.objects.select_related(
-            "product",
-            "product__category",
-        ).filter(user=self.request.user)
+        return (
+            Order.objects.select_related(
+                "product",
+                "product__category",
+            )
+            .prefetch_related("items__product")
+            .filter(user=self.request.user)
+        )
+
+    @action(detail=False, methods=["post"], url_path="checkout")
+    def checkout(self, request):
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fields = dict(serializer.validated_data)
+        quantities = fields.pop("items")
+
+        try:
+            order = place_checkout_order(request.user, quantities, **fields)
+        except ValueError as exc:
+            raise ValidationError(exc.args[0])
+
+        order = self.get_queryset().get(pk=order.pk)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -76,34 +149,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         if payment_method == Order.PaymentMethod.VIRTUAL_CARD:
             ensure_virtual_card_for_user(user)
 
-        with transaction.atomic():
-            product = Product.objects.select_for_update().get(pk=product.pk)
-            if not product.is_available:
-                raise ValidationError({"product_id": "Product is not available."})
-            if product.stock < quantity:
-                raise ValidationError({"quantity": "Not enough product stock."})
-
-            unit_price = (
-                product.discount_price
-                if product.discount_price is not None
-                else product.price
+        try:
+            place_order(
+                user,
+                product,
+                quantity,
+                payment_method,
+                save_order=lambda: serializer.save(user=user, product=product),
             )
-            total_price = unit_price * Decimal(quantity)
-
-            if payment_method == Order.PaymentMethod.VIRTUAL_CARD:
-                card = VirtualCard.objects.select_for_update().get(user=user)
-                if card.balance < total_price:
-                    raise ValidationError({"balance": "Insufficient virtual card balance."})
-
-            serializer.save(user=user, product=product)
-
-            product.stock -= quantity
-            product_update_fields = ["stock"]
-            if product.stock == 0:
-                product.is_available = False
-                product_update_fields.append("is_available")
-            product.save(update_fields=product_update_fields)
-
-            if payment_method == Order.PaymentMethod.VIRTUAL_CARD:
-                card.balance -= total_price
-                card.save(update_fields=["balance"])
+        except ValueError as exc:
+            raise ValidationError(exc.args[0])
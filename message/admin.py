@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Message
+from .models import Message, UnreadMessageCounter
+from .services import rebuild_unread_counters
 
 
 @admin.register(Message)
@@ -9,3 +10,19 @@ class MessageAdmin(admin.ModelAdmin):
     list_filter = ("is_read", "created_at")
     search_fields = ("user__phone", "text", "link", "link_name")
     fields = ("user", "text", "link", "link_name", "is_read", "created_at")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # New messages are counted by the post_save signal; edits can move or (un)read one.
+        if change and {"user", "is_read"} & set(form.changed_data):
+            user_ids = {obj.user_id}
+            if "user" in form.changed_data and form.initial.get("user"):
+                user_ids.add(form.initial["user"])
+            rebuild_unread_counters(user_ids)
+
+
+@admin.register(UnreadMessageCounter)
+class UnreadMessageCounterAdmin(admin.ModelAdmin):
+    list_display = ("user", "unread_count", "updated_at")
+    search_fields = ("user__phone",)
+    readonly_fields = ("user", "unread_count", "updated_at")
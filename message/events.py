@@ -0,0 +1,239 @@
+import asyncio
+import collections
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+
+DEFAULT_MESSAGE_EVENTS_BACKEND = "message.events.InProcessMessageBroker"
+DEFAULT_SUBSCRIPTION_BUFFER = 100
+DEFAULT_STREAM_HEARTBEAT = 15
+DEFAULT_STREAM_MAX_DURATION = 300
+STREAM_RETRY_MS = 3000
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """
+    Buffer of events for one open stream.
+
+    ``push`` may be called from any thread. Readers either block a thread
+    with ``get`` (WSGI) or await ``aget`` on the event loop (ASGI), which
+    costs no thread while idle. When the buffer overflows the oldest events
+    are dropped and ``overflowed`` is set so the client can resync.
+    """
+
+    def __init__(self, broker, user_id, maxsize=DEFAULT_SUBSCRIPTION_BUFFER):
+        self.broker = broker
+        self.user_id = user_id
+        self.overflowed = False
+        self._events = collections.deque()
+        self._maxsize = maxsize
+        self._condition = threading.Condition()
+        self._waiter = None
+
+    def push(self, event):
+        with self._condition:
+            if len(self._events) >= self._maxsize:
+                self._events.popleft()
+                self.overflowed = True
+            self._events.append(event)
+            self._condition.notify_all()
+            waiter = self._waiter
+        if waiter is not None:
+            loop, ready = waiter
+            loop.call_soon_threadsafe(ready.set)
+
+    def _drain(self):
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+    def get(self, timeout=None):
+        with self._condition:
+            self._condition.wait_for(lambda: self._events, timeout)
+            return self._drain()
+
+    async def aget(self, timeout=None):
+        with self._condition:
+            if self._events:
+                return self._drain()
+            ready = asyncio.Event()
+            self._waiter = (asyncio.get_running_loop(), ready)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._condition:
+            self._waiter = None
+            return self._drain()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InProcessMessageBroker:
+    """
+    Delivers events to subscriptions opened in this process only.
+
+    Messages created by another process (the broadcast worker, another
+    gunicorn worker) never reach it, so streams also poll the database
+    whenever they wake up; see ``cross_process``.
+    """
+
+    # Brokers that see every process's publishes (e.g. Redis pub/sub) set this
+    # so streams can skip the database poll.
+    cross_process = False
+
+    def __init__(self, buffer_size=DEFAULT_SUBSCRIPTION_BUFFER):
+        self.buffer_size = buffer_size
+        self._subscriptions = collections.defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, maxsize=self.buffer_size)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscriptions
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+        return len(subscriptions)
+
+
+def get_message_broker():
+    global _broker
+
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, "MESSAGE_EVENTS_BACKEND", DEFAULT_MESSAGE_EVENTS_BACKEND)
+                _broker = import_string(backend)(
+                    buffer_size=getattr(settings, "MESSAGE_STREAM_BUFFER_SIZE", DEFAULT_SUBSCRIPTION_BUFFER)
+                )
+    return _broker
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    lines.extend(f"data: {line}" for line in payload.splitlines())
+    return "\n".join(lines) + "\n\n"
+
+
+def _stream_settings():
+    return (
+        getattr(settings, "MESSAGE_STREAM_HEARTBEAT", DEFAULT_STREAM_HEARTBEAT),
+        getattr(settings, "MESSAGE_STREAM_MAX_DURATION", DEFAULT_STREAM_MAX_DURATION),
+    )
+
+
+def _poller(broker, load_backlog):
+    """``load_backlog`` when the broker cannot see other processes' messages, otherwise None."""
+    return None if getattr(broker, "cross_process", False) else load_backlog
+
+
+def _merge(events, polled):
+    if not polled:
+        return events
+    merged = {event["id"]: event for event in polled}
+    merged.update((event["id"], event) for event in events)
+    return [merged[event_id] for event_id in sorted(merged)]
+
+
+class _EventWriter:
+    """Shared SSE formatting: skips events already sent during catch-up and reports overflow once."""
+
+    def __init__(self, subscription, last_id):
+        self.subscription = subscription
+        self.last_id = last_id
+
+    def format(self, events):
+        chunks = []
+        if self.subscription.overflowed:
+            self.subscription.overflowed = False
+            chunks.append(format_sse({"reason": "overflow"}, event="resync"))
+        for event in events:
+            if event["id"] <= self.last_id:
+                continue
+            self.last_id = event["id"]
+            chunks.append(format_sse(event, event="message", event_id=event["id"]))
+        return "".join(chunks)
+
+
+def stream_message_events(user_id, last_id=None, load_backlog=None):
+    """
+    Blocking SSE generator for WSGI workers; holds a thread for the stream's lifetime.
+
+    The subscription is opened before ``load_backlog(user_id, last_id)`` runs,
+    so nothing created between the catch-up query and the live feed is lost.
+    Unless the broker is cross-process, ``load_backlog`` runs again on every
+    wake-up (at least once per heartbeat) to pick up other processes' messages.
+    """
+    heartbeat, max_duration = _stream_settings()
+    deadline = time.monotonic() + max_duration
+    broker = get_message_broker()
+    poll = _poller(broker, load_backlog) if last_id is not None else None
+    with broker.subscribe(user_id) as subscription:
+        writer = _EventWriter(subscription, last_id or 0)
+        backlog = load_backlog(user_id, last_id) if last_id is not None and load_backlog else []
+        yield f"retry: {STREAM_RETRY_MS}\n\n" + writer.format(backlog)
+        while (remaining := deadline - time.monotonic()) > 0:
+            events = subscription.get(timeout=min(heartbeat, remaining))
+            if poll is not None:
+                events = _merge(events, poll(user_id, writer.last_id))
+            yield writer.format(events) or ": ping\n\n"
+
+
+async def astream_message_events(user_id, last_id=None, load_backlog=None):
+    """Async SSE generator for ASGI; an idle stream only costs a pending await."""
+    heartbeat, max_duration = _stream_settings()
+    deadline = time.monotonic() + max_duration
+    broker = get_message_broker()
+    poll = _poller(broker, load_backlog) if last_id is not None else None
+    subscription = broker.subscribe(user_id)
+    try:
+        writer = _EventWriter(subscription, last_id or 0)
+        backlog = []
+        if last_id is not None and load_backlog:
+            backlog = await sync_to_async(load_backlog)(user_id, last_id)
+        yield f"retry: {STREAM_RETRY_MS}\n\n" + writer.format(backlog)
+        while (remaining := deadline - time.monotonic()) > 0:
+            events = await subscription.aget(timeout=min(heartbeat, remaining))
+            if poll is not None:
+                events = _merge(events, await sync_to_async(poll)(user_id, writer.last_id))
+            yield writer.format(events) or ": ping\n\n"
+    finally:
+        subscription.close()
@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from message.services import iter_user_id_chunks, rebuild_unread_counters
+
+
+class Command(BaseCommand):
+    help = "Recount UnreadMessageCounter rows from the message table in chunks of users."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Limit the rebuild to this user id. Can be passed multiple times.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of users recounted per chunk.",
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options["user_ids"]:
+            users = users.filter(id__in=options["user_ids"])
+
+        total = 0
+        for user_ids in iter_user_id_chunks(users, options["chunk_size"]):
+            rebuild_unread_counters(user_ids)
+            total += len(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt unread counters for {total} users."))
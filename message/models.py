@@ -17,6 +17,27 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(
+                fields=["user"],
+                condition=models.Q(is_read=False),
+                name="message_unread_user_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Message({self.pk}) for user {self.user_id}"
+
+
+class UnreadMessageCounter(models.Model):
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="unread_message_counter",
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"UnreadMessageCounter(user {self.user_id}: {self.unread_count})"
@@ -1,12 +1,133 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Value
+from django.db.models.functions import Greatest
+
 from users.models import UserDevice
 from users.services.push_notifications import send_bulk_fcm_notifications
 
-from .models import Message
+from .events import get_message_broker
+from .models import Message, UnreadMessageCounter
+from .serializers import MessageSerializer
 
 
 MESSAGE_PUSH_TITLE = "New message"
 MESSAGE_PUSH_TYPE = "in_app_message"
 MESSAGE_PUSH_TARGET = "system_messages"
+MESSAGE_BULK_CHUNK_SIZE = 1000
+MESSAGE_STREAM_BACKLOG_LIMIT = 100
+UNREAD_COUNT_CACHE_PREFIX = "message:unread"
+UNREAD_COUNT_CACHE_TIMEOUT = 300
+
+
+def unread_count_cache_key(user_id) -> str:
+    return f"{UNREAD_COUNT_CACHE_PREFIX}:{user_id}"
+
+
+def _invalidate_unread_counts(user_ids) -> None:
+    keys = [unread_count_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    # Again after commit, in case a concurrent read cached the pre-commit value meanwhile.
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def rebuild_unread_counters(user_ids) -> dict[int, int]:
+    """Recount unread messages for ``user_ids`` from the message table and store the result."""
+    user_ids = list(user_ids)
+    counts = dict.fromkeys(user_ids, 0)
+    counts.update(
+        Message.objects.filter(user_id__in=user_ids, is_read=False)
+        .values_list("user_id")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    UnreadMessageCounter.objects.bulk_create(
+        [UnreadMessageCounter(user_id=user_id, unread_count=count) for user_id, count in counts.items()],
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=["unread_count", "updated_at"],
+    )
+    _invalidate_unread_counts(user_ids)
+    return counts
+
+
+def change_unread_counts(user_ids, delta: int, rebuild_missing: bool = True) -> None:
+    """
+    Apply ``delta`` to the stored unread counters of ``user_ids``.
+
+    Call after the message rows are written: users without a counter row
+    yet get one rebuilt from the table, which already includes the change.
+    Deletes pass ``rebuild_missing=False`` so a cascading user delete does
+    not recreate the counter it is removing.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not delta:
+        return
+
+    existing = set(UnreadMessageCounter.objects.filter(user_id__in=user_ids).values_list("user_id", flat=True))
+    if existing:
+        UnreadMessageCounter.objects.filter(user_id__in=existing).update(
+            unread_count=Greatest(F("unread_count") + delta, Value(0)),
+        )
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    if missing and rebuild_missing:
+        rebuild_unread_counters(missing)
+    _invalidate_unread_counts(existing)
+
+
+def get_unread_count(user_id) -> int:
+    """Serve the badge count from cache, then the counter row, rebuilding it if absent."""
+    key = unread_count_cache_key(user_id)
+    count = cache.get(key)
+    if count is not None:
+        return count
+
+    count = (
+        UnreadMessageCounter.objects.filter(user_id=user_id).values_list("unread_count", flat=True).first()
+    )
+    if count is None:
+        count = rebuild_unread_counters([user_id])[user_id]
+    cache.set(key, count, getattr(settings, "MESSAGE_UNREAD_CACHE_TIMEOUT", UNREAD_COUNT_CACHE_TIMEOUT))
+    return count
+
+
+def mark_message_read(message: Message) -> bool:
+    """Mark one message read; returns False if it already was."""
+    with transaction.atomic():
+        updated = Message.objects.filter(pk=message.pk, is_read=False).update(is_read=True)
+        if updated:
+            change_unread_counts([message.user_id], -updated)
+    message.is_read = True
+    return bool(updated)
+
+
+def mark_all_messages_read(user_id) -> int:
+    with transaction.atomic():
+        updated = Message.objects.filter(user_id=user_id, is_read=False).update(is_read=True)
+        if updated:
+            change_unread_counts([user_id], -updated)
+    return updated
+
+
+def publish_new_messages(messages) -> None:
+    """Hand committed messages to open streams; users without a stream cost a dict lookup."""
+    broker = get_message_broker()
+    for message in messages:
+        if broker.has_subscribers(message.user_id):
+            broker.publish(message.user_id, dict(MessageSerializer(message).data))
+
+
+def latest_message_id(user_id) -> int:
+    return Message.objects.filter(user_id=user_id).aggregate(latest=Max("id"))["latest"] or 0
+
+
+def load_message_backlog(user_id, last_id: int) -> list[dict]:
+    """Messages a reconnecting stream missed after ``last_id``, oldest first."""
+    messages = Message.objects.filter(user_id=user_id, id__gt=last_id).order_by("id")[:MESSAGE_STREAM_BACKLOG_LIMIT]
+    return [dict(item) for item in MessageSerializer(messages, many=True).data]
 
 
 def build_message_push_payload(message: Message) -> dict[str, str]:
@@ -22,13 +143,41 @@ def build_message_push_payload(message: Message) -> dict[str, str]:
     return payload
 
 
-def send_push_for_message(message: Message) -> tuple[int, int]:
-    tokens = list(
-        UserDevice.objects.filter(user=message.user, notifications_enabled=True)
+def build_bulk_message_push_payload(link: str | None = None, link_name: str | None = None) -> dict[str, str]:
+    return {
+        "type": MESSAGE_PUSH_TYPE,
+        "target": MESSAGE_PUSH_TARGET,
+        "link": link or "",
+        "link_name": link_name or "",
+    }
+
+
+def get_push_tokens_for_users(user_ids) -> list[str]:
+    return list(
+        UserDevice.objects.filter(user_id__in=user_ids, notifications_enabled=True)
         .exclude(fcm_token="")
         .values_list("fcm_token", flat=True)
         .distinct()
     )
+
+
+def bulk_create_messages(user_ids, text: str, link: str | None = None, link_name: str | None = None) -> int:
+    # bulk_create skips post_save, so no per-message push is sent and counters are updated here.
+    with transaction.atomic():
+        messages = Message.objects.bulk_create(
+            [
+                Message(user_id=user_id, text=text, link=link, link_name=link_name)
+                for user_id in user_ids
+            ],
+            batch_size=MESSAGE_BULK_CHUNK_SIZE,
+        )
+        change_unread_counts(user_ids, 1)
+        transaction.on_commit(lambda: publish_new_messages(messages))
+    return len(user_ids)
+
+
+def send_push_for_message(message: Message) -> tuple[int, int]:
+    tokens = get_push_tokens_for_users([message.user_id])
     if not tokens:
         return 0, 0
 
@@ -41,37 +190,49 @@ def send_push_for_message(message: Message) -> tuple[int, int]:
     )
 
 
-def create_messages_for_users(user_qs, text: str, link: str | None = None, link_name: str | None = None) -> tuple[int, int, int]:
-    user_ids = list(user_qs.values_list("id", flat=True))
-    if not user_ids:
-        return 0, 0, 0
+def iter_user_id_chunks(user_qs, chunk_size: int = MESSAGE_BULK_CHUNK_SIZE):
+    """Yield lists of user ids ordered by id, fetching one keyset page at a time."""
+    queryset = user_qs.order_by("id").values_list("id", flat=True)
+    last_id = 0
+    while True:
+        user_ids = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not user_ids:
+            return
+        yield user_ids
+        last_id = user_ids[-1]
 
-    Message.objects.bulk_create(
-        [
-            Message(user_id=user_id, text=text, link=link, link_name=link_name)
-            for user_id in user_ids
-        ],
-        batch_size=1000,
-    )
 
-    tokens = list(
-        UserDevice.objects.filter(user_id__in=user_ids, notifications_enabled=True)
-        .exclude(fcm_token="")
-        .values_list("fcm_token", flat=True)
-        .distinct()
-    )
-    if not tokens:
-        return len(user_ids), 0, 0
+def create_messages_for_users(
+    user_qs,
+    text: str,
+    link: str | None = None,
+    link_name: str | None = None,
+    chunk_size: int = MESSAGE_BULK_CHUNK_SIZE,
+) -> tuple[int, int, int]:
+    """
+    Create one message per user and push it to their devices.
 
-    sent, failed = send_bulk_fcm_notifications(
-        tokens=tokens,
-        title=MESSAGE_PUSH_TITLE,
-        body=text[:500],
-        data={
-            "type": MESSAGE_PUSH_TYPE,
-            "target": MESSAGE_PUSH_TARGET,
-            "link": link or "",
-            "link_name": link_name or "",
-        },
-    )
-    return len(user_ids), sent, failed
+    Users are handled ``chunk_size`` at a time: each chunk is inserted and
+    its tokens are pushed before the next chunk is read, so memory does not
+    grow with the audience.
+    """
+    created = sent = failed = 0
+    body = text[:500]
+    data = build_bulk_message_push_payload(link, link_name)
+
+    for user_ids in iter_user_id_chunks(user_qs, chunk_size):
+        created += bulk_create_messages(user_ids, text=text, link=link, link_name=link_name)
+
+        tokens = get_push_tokens_for_users(user_ids)
+        if not tokens:
+            continue
+        chunk_sent, chunk_failed = send_bulk_fcm_notifications(
+            tokens=tokens,
+            title=MESSAGE_PUSH_TITLE,
+            body=body,
+            data=data,
+        )
+        sent += chunk_sent
+        failed += chunk_failed
+
+    return created, sent, failed
@@ -1,11 +1,21 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from .models import Message
-from .services import send_push_for_message
+from .services import change_unread_counts, publish_new_messages, send_push_for_message
 
 
 @receiver(post_save, sender=Message)
 def send_message_created_push(sender, instance, created, **kwargs):
     if created:
+        if not instance.is_read:
+            change_unread_counts([instance.user_id], 1)
+        transaction.on_commit(lambda: publish_new_messages([instance]))
         send_push_for_message(instance)
+
+
+@receiver(post_delete, sender=Message)
+def update_unread_counter_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        change_unread_counts([instance.user_id], -1, rebuild_missing=False)
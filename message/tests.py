@@ -1,17 +1,27 @@
+import asyncio
+import threading
+from io import StringIO
 from unittest.mock import patch
 
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from users.models import User, UserDevice
 
-from .models import Message
-from .services import create_messages_for_users, send_push_for_message
+from .events import InProcessMessageBroker, astream_message_events, get_message_broker
+from .models import Message, UnreadMessageCounter
+from .services import bulk_create_messages, create_messages_for_users, send_push_for_message
 
 
 class MessageAPITests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(phone="+10000000011", password="pass")
         self.other_user = User.objects.create_user(phone="+10000000012", password="pass")
         self.message = Message.objects.create(
@@ -126,3 +136,180 @@ class MessagePushTests(APITestCase):
                 "link_name": "Open",
             },
         )
+
+    @patch("message.services.send_bulk_fcm_notifications", return_value=(1, 0))
+    def test_create_messages_for_users_pushes_each_chunk_separately(self, send_bulk_mock):
+        created_count, sent, failed = create_messages_for_users(
+            user_qs=User.objects.filter(id__in=[self.user.id, self.other_user.id]),
+            text="Chunked message",
+            chunk_size=1,
+        )
+
+        self.assertEqual((created_count, sent, failed), (2, 2, 0))
+        self.assertEqual(Message.objects.filter(text="Chunked message").count(), 2)
+        self.assertEqual(
+            [call.kwargs["tokens"] for call in send_bulk_mock.call_args_list],
+            [["token-1"], ["token-2"]],
+        )
+
+
+class UnreadCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(phone="+10000000031", password="pass")
+        self.other_user = User.objects.create_user(phone="+10000000032", password="pass")
+        self.client.force_authenticate(user=self.user)
+
+    def _unread_count(self):
+        response = self.client.get(reverse("message-unread-count"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["unread_count"]
+
+    def _stored(self, user):
+        return UnreadMessageCounter.objects.get(user=user).unread_count
+
+    def test_counter_follows_create_read_and_read_all(self):
+        first = Message.objects.create(user=self.user, text="One")
+        Message.objects.create(user=self.user, text="Two")
+        Message.objects.create(user=self.user, text="Three")
+        self.assertEqual(self._unread_count(), 3)
+
+        self.client.post(reverse("message-read", args=[first.id]))
+        self.client.post(reverse("message-read", args=[first.id]))
+        self.assertEqual(self._stored(self.user), 2)
+        self.assertEqual(self._unread_count(), 2)
+
+        self.client.post(reverse("message-read-all"))
+        self.assertEqual(self._unread_count(), 0)
+
+    def test_bulk_create_and_delete_update_counters(self):
+        Message.objects.create(user=self.user, text="Existing")
+
+        bulk_create_messages(list(User.objects.values_list("id", flat=True)), text="Broadcast")
+
+        self.assertEqual(self._stored(self.user), 2)
+        self.assertEqual(self._stored(self.other_user), 1)
+
+        Message.objects.filter(user=self.user, text="Broadcast").delete()
+        self.assertEqual(self._unread_count(), 1)
+
+    def test_unread_count_is_served_from_cache(self):
+        Message.objects.create(user=self.user, text="One")
+        self.assertEqual(self._unread_count(), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._unread_count(), 1)
+        self.assertEqual(len(queries), 0)
+
+    def test_rebuild_command_repairs_drift(self):
+        Message.objects.create(user=self.user, text="One")
+        UnreadMessageCounter.objects.filter(user=self.user).update(unread_count=7)
+
+        call_command("rebuild_unread_counters", stdout=StringIO())
+
+        self.assertEqual(self._stored(self.user), 1)
+        self.assertEqual(self._stored(self.other_user), 0)
+
+
+class MessageBrokerTests(SimpleTestCase):
+    def test_publish_reaches_only_the_users_subscriptions(self):
+        broker = InProcessMessageBroker()
+        subscription = broker.subscribe(1)
+        other = broker.subscribe(2)
+
+        threading.Timer(0.05, broker.publish, args=(1, {"id": 5})).start()
+
+        self.assertEqual(subscription.get(timeout=2), [{"id": 5}])
+        self.assertEqual(other.get(timeout=0.05), [])
+        subscription.close()
+        other.close()
+        self.assertFalse(broker.has_subscribers(1))
+
+    def test_async_reader_is_woken_from_another_thread(self):
+        broker = InProcessMessageBroker()
+        subscription = broker.subscribe(1)
+
+        async def read():
+            threading.Timer(0.05, broker.publish, args=(1, {"id": 7})).start()
+            return await subscription.aget(timeout=2)
+
+        self.assertEqual(asyncio.run(read()), [{"id": 7}])
+
+    def test_overflow_drops_oldest_events(self):
+        broker = InProcessMessageBroker(buffer_size=2)
+        subscription = broker.subscribe(1)
+        for i in range(3):
+            broker.publish(1, {"id": i})
+
+        self.assertEqual(subscription.get(timeout=0), [{"id": 1}, {"id": 2}])
+        self.assertTrue(subscription.overflowed)
+
+
+@override_settings(MESSAGE_STREAM_HEARTBEAT=0.2, MESSAGE_STREAM_MAX_DURATION=2)
+class MessageStreamTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone="+10000000041", password="pass")
+        self.other_user = User.objects.create_user(phone="+10000000042", password="pass")
+        self.client.force_authenticate(user=self.user)
+
+    def _open(self, **extra):
+        response = self.client.get(reverse("message-stream"), HTTP_ACCEPT="text/event-stream", **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response, iter(response.streaming_content)
+
+    def test_new_messages_are_pushed_to_the_open_stream(self):
+        response, chunks = self._open()
+        self.assertIn(b"retry:", next(chunks))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(user=self.other_user, text="Not yours")
+            message = Message.objects.create(user=self.user, text="Live message")
+
+        chunk = next(chunks).decode("utf-8")
+        self.assertIn(f"id: {message.id}\nevent: message\n", chunk)
+        self.assertIn('"text": "Live message"', chunk)
+        self.assertNotIn("Not yours", chunk)
+        self.assertEqual(next(chunks), b": ping\n\n")
+        response.close()
+        self.assertFalse(get_message_broker().has_subscribers(self.user.id))
+
+    def test_messages_created_by_another_process_arrive_by_polling(self):
+        Message.objects.create(user=self.user, text="Before connecting")
+        response, chunks = self._open()
+        self.assertNotIn(b"Before connecting", next(chunks))
+
+        # Without on-commit callbacks nothing is published in this process,
+        # as with a message written by the broadcast worker.
+        message = Message.objects.create(user=self.user, text="From the worker")
+
+        chunk = next(chunks).decode("utf-8")
+        self.assertIn(f"id: {message.id}\nevent: message\n", chunk)
+        self.assertIn('"text": "From the worker"', chunk)
+        self.assertEqual(next(chunks), b": ping\n\n")
+        response.close()
+
+    def test_reconnect_replays_messages_after_last_event_id(self):
+        first = Message.objects.create(user=self.user, text="Seen")
+        Message.objects.create(user=self.user, text="Missed")
+
+        response, chunks = self._open(HTTP_LAST_EVENT_ID=str(first.id))
+
+        chunk = next(chunks).decode("utf-8")
+        self.assertIn("Missed", chunk)
+        self.assertNotIn("Seen", chunk)
+        response.close()
+
+    def test_async_stream_for_asgi(self):
+        async def read():
+            stream = astream_message_events(self.user.id)
+            chunks = [await stream.__anext__()]
+            threading.Timer(0.05, get_message_broker().publish, args=(self.user.id, {"id": 99, "text": "hi"})).start()
+            chunks.append(await stream.__anext__())
+            await stream.aclose()
+            return chunks
+
+        chunks = asyncio.run(read())
+        self.assertIn("retry:", chunks[0])
+        self.assertIn("id: 99", chunks[1])
+        self.assertFalse(get_message_broker().has_subscribers(self.user.id))
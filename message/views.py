@@ -1,10 +1,23 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .events import astream_message_events, stream_message_events
 from .models import Message
+from .renderers import EventStreamRenderer
 from .serializers import MessageSerializer
+from .services import (
+    get_unread_count,
+    latest_message_id,
+    load_message_backlog,
+    mark_all_messages_read,
+    mark_message_read,
+)
 
 
 class MessageViewSet(viewsets.ReadOnlyModelViewSet):
@@ -16,19 +29,50 @@ class MessageViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="unread-count")
     def unread_count(self, request):
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({"unread_count": count})
+        return Response({"unread_count": get_unread_count(request.user.id)})
 
     @action(detail=True, methods=["post"], url_path="read")
     def read(self, request, pk=None):
         message = self.get_object()
         if not message.is_read:
-            message.is_read = True
-            message.save(update_fields=["is_read"])
+            mark_message_read(message)
         serializer = self.get_serializer(message)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["post"], url_path="read-all")
     def read_all(self, request):
-        updated_count = self.get_queryset().filter(is_read=False).update(is_read=True)
+        updated_count = mark_all_messages_read(request.user.id)
         return Response({"updated_count": updated_count}, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="stream",
+        renderer_classes=[JSONRenderer, EventStreamRenderer],
+    )
+    def stream(self, request):
+        """
+        Server-sent events feed of the user's new messages.
+
+        A reconnecting client sends ``Last-Event-ID`` (or ``?last_id=``) and
+        first receives what it missed; a fresh client starts from its newest
+        message. Under ASGI the stream is an async generator, so idle
+        connections hold no worker thread.
+        """
+        raw_last_id = request.headers.get("Last-Event-ID") or request.query_params.get("last_id")
+        last_id = None
+        if raw_last_id:
+            if not raw_last_id.isdigit():
+                raise ValidationError({"last_id": "Invalid message id."})
+            last_id = int(raw_last_id)
+        else:
+            last_id = latest_message_id(request.user.id)
+
+        stream = astream_message_events if isinstance(request._request, ASGIRequest) else stream_message_events
+        response = StreamingHttpResponse(
+            stream(request.user.id, last_id=last_id, load_backlog=load_message_backlog),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
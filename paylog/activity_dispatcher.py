@@ -0,0 +1,266 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE_URL = "https://api.telegram.org"
+TELEGRAM_MESSAGE_LIMIT = 4096
+BATCH_SEPARATOR = "\n\n"
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_FLUSH_INTERVAL_MS = 2000
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_SEND_TIMEOUT = 5
+
+_STOP = object()
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def send_telegram_message(token, chat_id, text, *, api_base_url=TELEGRAM_API_BASE_URL, timeout=DEFAULT_SEND_TIMEOUT):
+    url = f"{api_base_url.rstrip('/')}/bot{token}/sendMessage"
+    payload = urllib.parse.urlencode({"chat_id": chat_id, "text": text}).encode("utf-8")
+    req = urllib.request.Request(url, data=payload)
+    with urllib.request.urlopen(req, timeout=timeout) as res:
+        res.read()
+
+
+def split_batch(texts, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Join event texts into as few Telegram messages as fit under ``limit``."""
+    chunks = []
+    current = ""
+    for text in texts:
+        text = text[:limit]
+        candidate = f"{current}{BATCH_SEPARATOR}{text}" if current else text
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = text
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TelegramActivityDispatcher:
+    """
+    Delivers activity events to Telegram from a background thread.
+
+    Events are put on a bounded queue and coalesced into one message per
+    ``batch_size`` events or ``flush_interval`` seconds, whichever comes first.
+    When the queue is full new events are dropped and counted; the count is
+    reported with the next delivered batch.
+    """
+
+    def __init__(
+        self,
+        token,
+        chat_id,
+        *,
+        api_base_url=TELEGRAM_API_BASE_URL,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL_MS / 1000,
+        max_queue_size=DEFAULT_QUEUE_SIZE,
+        timeout=DEFAULT_SEND_TIMEOUT,
+        sender=send_telegram_message,
+    ):
+        self.token = token
+        self.chat_id = chat_id
+        self.api_base_url = api_base_url
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.timeout = timeout
+        self._sender = sender
+        self._queue = queue.Queue(maxsize=max(1, max_queue_size))
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.dropped = 0
+        self._unreported_dropped = 0
+        self.sent_batches = 0
+        self.failed_batches = 0
+
+    def submit(self, text):
+        if self._closed:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(text)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._unreported_dropped += 1
+            return False
+
+    def flush(self, timeout=None):
+        """Block until every queued event has been delivered or ``timeout`` expires."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=DEFAULT_SEND_TIMEOUT, wait=True):
+        """
+        Stop accepting events and let the worker deliver what is queued.
+
+        With ``wait=False`` this returns at once and the worker finishes the
+        backlog on its own; otherwise it waits up to ``timeout`` for it.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._thread
+        if thread is None:
+            return
+        # The stop marker may not fit a full queue; the worker also exits once closed and drained.
+        try:
+            if wait:
+                self._queue.put(_STOP, timeout=timeout)
+            else:
+                self._queue.put_nowait(_STOP)
+        except queue.Full:
+            pass
+        if wait:
+            thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run,
+                name="telegram-activity-dispatcher",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval or 1.0)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+
+            if first is _STOP:
+                self._queue.task_done()
+                self._drain_remaining()
+                return
+
+            batch = [first]
+            stop = self._collect(batch)
+            self._deliver(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                self._drain_remaining()
+                return
+
+    def _collect(self, batch):
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and not self._closed:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _drain_remaining(self):
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    continue
+                batch.append(item)
+            if not batch:
+                return
+            self._deliver(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _deliver(self, batch):
+        with self._lock:
+            dropped, self._unreported_dropped = self._unreported_dropped, 0
+        texts = list(batch)
+        if dropped:
+            texts.append(f"Dropped activity events: {dropped}")
+
+        for chunk in split_batch(texts):
+            try:
+                self._sender(
+                    self.token,
+                    self.chat_id,
+                    chunk,
+                    api_base_url=self.api_base_url,
+                    timeout=self.timeout,
+                )
+                self.sent_batches += 1
+            except Exception:
+                self.failed_batches += 1
+                logger.exception("Failed to send API activity to Telegram.")
+
+
+def get_activity_dispatcher(token, chat_id):
+    """Return the process-wide dispatcher, rebuilding it when the Telegram target changes."""
+    global _dispatcher
+
+    with _dispatcher_lock:
+        current = _dispatcher
+        if current is not None and (current.token, current.chat_id) == (token, chat_id):
+            return current
+
+        _dispatcher = TelegramActivityDispatcher(
+            token,
+            chat_id,
+            api_base_url=getattr(settings, "TELEGRAM_API_BASE_URL", TELEGRAM_API_BASE_URL),
+            batch_size=getattr(settings, "TELEGRAM_ACTIVITY_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+            flush_interval=getattr(settings, "TELEGRAM_ACTIVITY_FLUSH_INTERVAL_MS", DEFAULT_FLUSH_INTERVAL_MS) / 1000,
+            max_queue_size=getattr(settings, "TELEGRAM_ACTIVITY_QUEUE_SIZE", DEFAULT_QUEUE_SIZE),
+        )
+
+    # Called from request middleware: the old worker drains its backlog in the background.
+    if current is not None:
+        current.shutdown(wait=False)
+    return _dispatcher
+
+
+def shutdown_activity_dispatcher(timeout=DEFAULT_SEND_TIMEOUT):
+    global _dispatcher
+
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.shutdown(timeout)
+
+
+atexit.register(shutdown_activity_dispatcher)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AI_REPLY_CACHE_ALIAS = "ai_replies"
+DEFAULT_AI_REPLY_CACHE_TIMEOUT = 3600
+DEFAULT_AI_REPLY_CACHE_STATS_LOG_EVERY = 100
+KEY_VERSION = 1
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = " .!?,;:…"
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _endpoint_options(endpoint):
+    return getattr(settings, "AI_REPLY_CACHE", {}).get(endpoint, {})
+
+
+def _timeout(endpoint):
+    return _endpoint_options(endpoint).get("timeout", DEFAULT_AI_REPLY_CACHE_TIMEOUT)
+
+
+def _cache():
+    return caches[getattr(settings, "AI_REPLY_CACHE_ALIAS", DEFAULT_AI_REPLY_CACHE_ALIAS)]
+
+
+def _record(endpoint, event):
+    with _stats_lock:
+        _stats[(endpoint, event)] += 1
+        hits, misses = _stats[(endpoint, "hits")], _stats[(endpoint, "misses")]
+
+    # Lookups are counted per process; every N of them the running totals go to the log.
+    log_every = getattr(settings, "AI_REPLY_CACHE_STATS_LOG_EVERY", DEFAULT_AI_REPLY_CACHE_STATS_LOG_EVERY)
+    lookups = hits + misses
+    if event in ("hits", "misses") and log_every and lookups % log_every == 0:
+        logger.info(
+            "AI reply cache %s: %d hits, %d misses, hit ratio %.2f",
+            endpoint,
+            hits,
+            misses,
+            hits / lookups,
+        )
+
+
+def normalize_prompt(text):
+    """Case, spacing and trailing punctuation do not change the answer to "Salom!" vs "salom"."""
+    return _WHITESPACE_RE.sub(" ", text).strip().strip(_TRAILING_PUNCTUATION).casefold()
+
+
+def reply_cache_key(endpoint, model, messages):
+    """
+    Content address for the reply to ``messages`` (chat-completion dicts, last one the prompt).
+
+    The prompt is normalized; the preceding messages are fingerprinted as-is.
+    ``history_messages`` in the endpoint's options limits how many of them
+    count (``None`` means all of them, so cached replies never ignore context).
+    Returns None when caching is disabled for the endpoint or there is no prompt.
+    """
+    if not messages or not _timeout(endpoint):
+        return None
+
+    *context, prompt = messages
+    depth = _endpoint_options(endpoint).get("history_messages")
+    if depth is not None:
+        context = context[-depth:] if depth else []
+
+    payload = json.dumps(
+        [
+            model,
+            [[item["role"], item["content"].strip()] for item in context],
+            normalize_prompt(prompt["content"]),
+        ],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"ai-reply:v{KEY_VERSION}:{endpoint}:{digest}"
+
+
+def get_cached_reply(endpoint, key):
+    if key is None:
+        return None
+    reply = _cache().get(key)
+    _record(endpoint, "hits" if reply is not None else "misses")
+    if reply is not None:
+        logger.debug("AI reply cache hit for %s", endpoint)
+    return reply
+
+
+def store_reply(endpoint, key, reply):
+    if key is None or not reply:
+        return
+    _cache().set(key, reply, _timeout(endpoint))
+    _record(endpoint, "stores")
+
+
+def reply_cache_stats():
+    """Per-endpoint hit/miss/store counts for this process, plus the hit ratio."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    stats = {}
+    for (endpoint, event), count in snapshot.items():
+        stats.setdefault(endpoint, {"hits": 0, "misses": 0, "stores": 0})[event] = count
+    for values in stats.values():
+        lookups = values["hits"] + values["misses"]
+        values["hit_ratio"] = round(values["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+def reset_reply_cache_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -1,13 +1,9 @@
 import json
-import logging
-import urllib.parse
-import urllib.request
 
 from django.conf import settings
 from django.utils import timezone
 
-
-logger = logging.getLogger(__name__)
+from .activity_dispatcher import get_activity_dispatcher
 
 
 class TelegramApiActivityMiddleware:
@@ -16,6 +12,9 @@ class TelegramApiActivityMiddleware:
     - which endpoint was called
     - what action was attempted (HTTP method)
     - user name and phone (when available)
+
+    Delivery happens on a background dispatcher so the response is never
+    held up by Telegram.
     """
 
     def __init__(self, get_response):
@@ -70,7 +69,7 @@ class TelegramApiActivityMiddleware:
             f"API: {endpoint}\n"
             f"Status: {status_code}"
         )
-        self._send_telegram_message(token, chat_id, text)
+        get_activity_dispatcher(token, chat_id).submit(text)
 
     @staticmethod
     def _extract_payload(request):
@@ -95,14 +94,3 @@ class TelegramApiActivityMiddleware:
             "DELETE": "Ma'lumotni o'chirish",
         }
         return actions.get(method, "API ga murojaat")
-
-    @staticmethod
-    def _send_telegram_message(token, chat_id, text):
-        try:
-            url = f"https://api.telegram.org/bot{token}/sendMessage"
-            payload = urllib.parse.urlencode({"chat_id": chat_id, "text": text}).encode("utf-8")
-            req = urllib.request.Request(url, data=payload)
-            with urllib.request.urlopen(req, timeout=5) as res:
-                res.read()
-        except Exception:
-            logger.exception("Failed to send API activity to Telegram.")
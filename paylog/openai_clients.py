@@ -0,0 +1,74 @@
+import atexit
+import logging
+import threading
+
+import httpx
+from django.conf import settings
+from openai import DefaultHttpxClient, OpenAI
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_TIMEOUT = 30.0
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _build_client(api_key, base_url):
+    limits = httpx.Limits(
+        max_connections=getattr(settings, "OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS),
+        max_keepalive_connections=getattr(
+            settings, "OPENAI_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        keepalive_expiry=getattr(settings, "OPENAI_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY),
+    )
+    kwargs = {
+        "api_key": api_key,
+        "timeout": getattr(settings, "OPENAI_TIMEOUT", DEFAULT_TIMEOUT),
+        # The SDK retries connection errors, 408/409/429 and 5xx with exponential backoff.
+        "max_retries": getattr(settings, "OPENAI_MAX_RETRIES", DEFAULT_MAX_RETRIES),
+        "http_client": DefaultHttpxClient(limits=limits),
+    }
+    if base_url:
+        kwargs["base_url"] = base_url
+    return OpenAI(**kwargs)
+
+
+def get_openai_client(api_key, base_url=None):
+    """
+    Return the process-wide client for ``(base_url, api_key)``.
+
+    Clients are thread-safe and keep their HTTP connections alive, so
+    requests after the first skip DNS, TCP and TLS setup. Use
+    ``client.with_options(...)`` for per-call overrides; the copy shares
+    the same connection pool.
+    """
+    key = (base_url or "", api_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _build_client(api_key, base_url)
+    return client
+
+
+def close_openai_clients():
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to close OpenAI client.")
+
+
+atexit.register(close_openai_clients)
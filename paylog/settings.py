@@ -116,6 +116,25 @@ DATABASES = {
 }
 
 
+# Cache
+# Versioned caches (e.g. transaction totals) are invalidated through this backend;
+# use a shared one such as Redis when running more than one worker process.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    },
+    # Repeated AI prompts; least recently used replies are culled once MAX_ENTRIES is reached.
+    "ai_replies": {
+        "BACKEND": os.getenv("AI_REPLY_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("AI_REPLY_CACHE_LOCATION", "ai-replies"),
+        "TIMEOUT": 3600,
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("AI_REPLY_CACHE_MAX_ENTRIES", "1000"))},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -182,9 +201,21 @@ REST_FRAMEWORK = {
 
 MAX_OTP_ATTEMPTS = 5
 
+MESSAGE_UNREAD_CACHE_TIMEOUT = int(os.getenv("MESSAGE_UNREAD_CACHE_TIMEOUT", "300"))
+# In-process pub/sub only reaches streams served by the same process; streams also poll the
+# database on every heartbeat for messages created elsewhere (broadcast worker, other workers).
+MESSAGE_EVENTS_BACKEND = os.getenv("MESSAGE_EVENTS_BACKEND", "message.events.InProcessMessageBroker")
+MESSAGE_STREAM_HEARTBEAT = int(os.getenv("MESSAGE_STREAM_HEARTBEAT", "15"))
+MESSAGE_STREAM_MAX_DURATION = int(os.getenv("MESSAGE_STREAM_MAX_DURATION", "300"))
+TRANSACTION_TOTALS_CACHE_TIMEOUT = int(os.getenv("TRANSACTION_TOTALS_CACHE_TIMEOUT", "300"))
+
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
 TELEGRAM_LOGGING_ENABLED = os.getenv('TELEGRAM_LOGGING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "https://api.telegram.org")
+TELEGRAM_ACTIVITY_BATCH_SIZE = int(os.getenv("TELEGRAM_ACTIVITY_BATCH_SIZE", "20"))
+TELEGRAM_ACTIVITY_FLUSH_INTERVAL_MS = int(os.getenv("TELEGRAM_ACTIVITY_FLUSH_INTERVAL_MS", "2000"))
+TELEGRAM_ACTIVITY_QUEUE_SIZE = int(os.getenv("TELEGRAM_ACTIVITY_QUEUE_SIZE", "1000"))
 
 TEST_LOGIN_ENABLED = os.getenv("TEST_LOGIN_ENABLED", "true").lower() in ("1", "true", "yes")
 TEST_LOGIN_PHONE = os.getenv("TEST_LOGIN_PHONE", "+998940000000")
@@ -193,7 +224,43 @@ TEST_DELETE_ENABLED = os.getenv("TEST_DELETE_ENABLED", "false").lower() in ("1",
 TEST_DELETE_PHONE = os.getenv("TEST_DELETE_PHONE", TEST_LOGIN_PHONE)
 TEST_DELETE_OTP = os.getenv("TEST_DELETE_OTP", "99999")
 OPENAI_API_KEY = 'change_me'
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
 AI_CHAT_ALLOWED_PHONE = os.getenv("AI_CHAT_ALLOWED_PHONE", "")
+AI_HISTORY_MAX_MESSAGES = int(os.getenv("AI_HISTORY_MAX_MESSAGES", "20"))
+AI_HISTORY_TOKEN_BUDGET = int(os.getenv("AI_HISTORY_TOKEN_BUDGET", "3000"))
+AI_HISTORY_SUMMARY_BATCH = int(os.getenv("AI_HISTORY_SUMMARY_BATCH", "10"))
+# Overflow is summarized by a background thread after the request commits; the model call
+# gets its own, shorter timeout and falls back to a truncated transcript on failure.
+AI_HISTORY_SUMMARY_IN_BACKGROUND = os.getenv("AI_HISTORY_SUMMARY_IN_BACKGROUND", "true").lower() in ("1", "true", "yes")
+AI_HISTORY_SUMMARY_TIMEOUT = float(os.getenv("AI_HISTORY_SUMMARY_TIMEOUT", "15"))
+# Seconds a rendered anonymous catalog response is shared; catalog writes invalidate it sooner.
+CATALOG_RESPONSE_CACHE_TIMEOUT = int(os.getenv("CATALOG_RESPONSE_CACHE_TIMEOUT", "300"))
+# Seconds the catalog version lives before it is re-seeded, which bounds how long another
+# process's writes go unnoticed with a per-process cache. 0 keeps it until the next write;
+# only use that with a cache shared by every process (Redis, Memcached, database).
+CATALOG_STATE_TIMEOUT = int(os.getenv("CATALOG_STATE_TIMEOUT", "30"))
+# Dotted path of the product full-text search backend; empty picks one for the database
+# vendor (SQLite FTS5, Postgres tsvector + pg_trgm, otherwise plain icontains).
+PRODUCT_SEARCH_BACKEND = os.getenv("PRODUCT_SEARCH_BACKEND", "")
+# Match AI chat messages against the in-process product index (no queries) instead of
+# the search backend above.
+AI_CHAT_PRODUCT_INDEX = os.getenv("AI_CHAT_PRODUCT_INDEX", "true").lower() in ("1", "true", "yes")
+# Seconds before the in-process product index used by AI chat matching is rebuilt from the
+# database; it is also updated on product saves, so this only bounds other processes' writes.
+PRODUCT_INDEX_MAX_AGE = int(os.getenv("PRODUCT_INDEX_MAX_AGE", "300"))
+AI_REPLY_CACHE_ALIAS = "ai_replies"
+# Each process logs its reply cache hit ratio every N lookups per endpoint (0 turns it off).
+AI_REPLY_CACHE_STATS_LOG_EVERY = int(os.getenv("AI_REPLY_CACHE_STATS_LOG_EVERY", "100"))
+# Per endpoint: "timeout" in seconds (0 disables caching) and "history_messages",
+# how many earlier messages are part of the cache key (None = the whole history).
+AI_REPLY_CACHE = {
+    "ai_chat": {"timeout": int(os.getenv("AI_CHAT_REPLY_CACHE_TIMEOUT", "3600")), "history_messages": None},
+    "users": {"timeout": int(os.getenv("AI_ASSISTANT_REPLY_CACHE_TIMEOUT", "3600"))},
+}
 AI_CHAT_STATIC_REPLY = os.getenv("AI_CHAT_STATIC_REPLY", "Salom! Hozir AI chat vaqtincha cheklangan.")
 FCM_SERVER_KEY = os.getenv("FCM_SERVER_KEY", "")
 
@@ -201,5 +268,10 @@ FCM_SERVER_KEY = os.getenv("FCM_SERVER_KEY", "")
 
 
 FCM_SERVICE_ACCOUNT_PATH = os.getenv("FCM_SERVICE_ACCOUNT_PATH", "serviceAccountKey.json")
+FCM_SENDER_BACKEND = os.getenv("FCM_SENDER_BACKEND", "users.services.push_notifications.FirebaseMulticastSender")
+FCM_MAX_WORKERS = int(os.getenv("FCM_MAX_WORKERS", "4"))
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "1000"))
+# Seconds without a heartbeat after which a running broadcast is taken over by another worker.
+BROADCAST_JOB_STALE_AFTER = int(os.getenv("BROADCAST_JOB_STALE_AFTER", "300"))
 
 
@@ -0,0 +1,165 @@
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from . import activity_dispatcher
+from .activity_dispatcher import TelegramActivityDispatcher, get_activity_dispatcher, split_batch
+from .middleware import TelegramApiActivityMiddleware
+
+
+class TelegramStubServer:
+    """Local stand-in for the Telegram Bot API that records sendMessage calls."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = urllib.parse.parse_qs(self.rfile.read(length).decode("utf-8"))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                stub.messages.append(body["text"][0])
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'{"ok": true}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TelegramActivityDispatcherTests(SimpleTestCase):
+    def test_events_are_coalesced_into_batches(self):
+        with TelegramStubServer() as stub:
+            dispatcher = TelegramActivityDispatcher(
+                "token", "chat", api_base_url=stub.url, batch_size=10, flush_interval=0.5
+            )
+            for i in range(25):
+                dispatcher.submit(f"event-{i}")
+            self.assertTrue(dispatcher.flush(timeout=5))
+            dispatcher.shutdown()
+
+        delivered = [line for message in stub.messages for line in message.split("\n\n")]
+        self.assertEqual(delivered, [f"event-{i}" for i in range(25)])
+        self.assertLessEqual(len(stub.messages), 3)
+
+    def test_submit_does_not_wait_for_slow_telegram(self):
+        with TelegramStubServer(delay=0.5) as stub:
+            dispatcher = TelegramActivityDispatcher(
+                "token", "chat", api_base_url=stub.url, batch_size=5, flush_interval=0.01
+            )
+            started = time.monotonic()
+            for i in range(50):
+                dispatcher.submit(f"event-{i}")
+            elapsed = time.monotonic() - started
+            dispatcher.shutdown(timeout=10)
+
+        self.assertLess(elapsed, 0.2)
+        self.assertEqual(sum(len(message.split("\n\n")) for message in stub.messages), 50)
+
+    def test_overflow_is_dropped_and_reported(self):
+        release = threading.Event()
+        sent = []
+
+        def blocking_sender(token, chat_id, text, **kwargs):
+            release.wait(5)
+            sent.append(text)
+
+        dispatcher = TelegramActivityDispatcher(
+            "token", "chat", batch_size=1, flush_interval=0, max_queue_size=2, sender=blocking_sender
+        )
+        results = [dispatcher.submit(f"event-{i}") for i in range(10)]
+        time.sleep(0.05)
+        self.assertIn(False, results)
+        self.assertGreater(dispatcher.dropped, 0)
+
+        release.set()
+        dispatcher.submit("after")
+        dispatcher.shutdown()
+
+        self.assertTrue(any("Dropped activity events:" in text for text in sent))
+
+    def test_shutdown_flushes_pending_events(self):
+        sent = []
+        dispatcher = TelegramActivityDispatcher(
+            "token",
+            "chat",
+            batch_size=100,
+            flush_interval=60,
+            sender=lambda token, chat_id, text, **kwargs: sent.append(text),
+        )
+        dispatcher.submit("one")
+        dispatcher.submit("two")
+        dispatcher.shutdown()
+
+        self.assertEqual(sent, ["one\n\ntwo"])
+
+    def test_retargeting_does_not_wait_for_the_old_dispatcher(self):
+        release = threading.Event()
+        sent = []
+
+        def blocking_sender(token, chat_id, text, **kwargs):
+            release.wait(5)
+            sent.append(text)
+
+        old = TelegramActivityDispatcher("old-token", "chat", batch_size=1, flush_interval=0, sender=blocking_sender)
+        old.submit("one")
+        old.submit("two")
+        time.sleep(0.05)
+
+        with patch.object(activity_dispatcher, "_dispatcher", old):
+            started = time.monotonic()
+            current = get_activity_dispatcher("new-token", "chat")
+            elapsed = time.monotonic() - started
+            current.shutdown()
+
+        self.assertLess(elapsed, 0.5)
+        self.assertIsNot(current, old)
+        self.assertFalse(old.submit("late"))
+
+        release.set()
+        old._thread.join(5)
+        self.assertEqual(sent, ["one", "two"])
+
+    def test_split_batch_respects_message_limit(self):
+        chunks = split_batch(["a" * 6, "b" * 6, "c" * 6], limit=14)
+        self.assertEqual(chunks, ["a" * 6 + "\n\n" + "b" * 6, "c" * 6])
+
+
+class TelegramApiActivityMiddlewareTests(SimpleTestCase):
+    @override_settings(
+        TELEGRAM_LOGGING_ENABLED=True,
+        TELEGRAM_BOT_TOKEN="token",
+        TELEGRAM_CHAT_ID="chat",
+    )
+    @patch("paylog.middleware.get_activity_dispatcher")
+    def test_api_request_is_queued_instead_of_sent_inline(self, get_dispatcher_mock):
+        request = RequestFactory().get("/api/v1/finance/transactions/")
+        middleware = TelegramApiActivityMiddleware(lambda req: HttpResponse(status=200))
+
+        response = middleware(request)
+
+        self.assertEqual(response.status_code, 200)
+        get_dispatcher_mock.assert_called_once_with("token", "chat")
+        submit_mock = get_dispatcher_mock.return_value.submit
+        submit_mock.assert_called_once()
+        self.assertIn("API: /api/v1/finance/transactions/", submit_mock.call_args.args[0])
@@ -5,10 +5,8 @@ from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import path, reverse
 
-from message.services import create_messages_for_users
-
-from .models import OTP, TelegramOTP, UserDevice
-from .services.push_notifications import send_bulk_fcm_notifications
+from .models import OTP, BroadcastJob, TelegramOTP, UserDevice
+from .services.broadcasts import enqueue_broadcast
 
 User = get_user_model()
 
@@ -165,42 +163,38 @@ class UserAdmin(admin.ModelAdmin):
                 title = form.cleaned_data["title"].strip()
                 body = form.cleaned_data["message"].strip()
 
-                user_qs = User.objects.none()
+                user_ids = None
                 if recipient_mode == PushNotificationAdminForm.RECIPIENT_SELECTED:
                     id_list = [int(x) for x in form.cleaned_data["selected_user_ids"].split(",") if x.strip().isdigit()]
-                    user_qs = User.objects.filter(id__in=id_list)
-                elif recipient_mode == PushNotificationAdminForm.RECIPIENT_ALL:
-                    user_qs = User.objects.all()
+                    user_ids = list(User.objects.filter(id__in=id_list).values_list("id", flat=True))
                 elif recipient_mode == PushNotificationAdminForm.RECIPIENT_PHONES:
-                    user_qs = User.objects.filter(phone__in=form.cleaned_data["phone_list"])
+                    user_ids = list(
+                        User.objects.filter(phone__in=form.cleaned_data["phone_list"]).values_list("id", flat=True)
+                    )
 
-                tokens = list(
-                    UserDevice.objects.filter(user__in=user_qs, notifications_enabled=True)
-                    .exclude(fcm_token="")
-                    .values_list("fcm_token", flat=True)
-                    .distinct()
-                )
+                devices = UserDevice.objects.filter(notifications_enabled=True).exclude(fcm_token="")
+                if user_ids is not None:
+                    devices = devices.filter(user_id__in=user_ids)
 
-                if not tokens:
+                if not devices.exists():
                     self.message_user(
                         request,
                         "No active devices with FCM tokens found for selected recipients.",
                         level=messages.WARNING,
                     )
                 else:
-                    sent, failed = send_bulk_fcm_notifications(tokens=tokens, title=title, body=body)
-                    if failed:
-                        self.message_user(
-                            request,
-                            f"Push sent to {sent} devices, failed for {failed} devices.",
-                            level=messages.WARNING,
-                        )
-                    else:
-                        self.message_user(
-                            request,
-                            f"Push sent successfully to {sent} devices.",
-                            level=messages.SUCCESS,
-                        )
+                    job = enqueue_broadcast(
+                        kind=BroadcastJob.KIND_PUSH,
+                        title=title,
+                        text=body,
+                        user_ids=user_ids,
+                        created_by=request.user,
+                    )
+                    self.message_user(
+                        request,
+                        f"Push broadcast #{job.id} queued for {job.total_users} users.",
+                        level=messages.SUCCESS,
+                    )
 
                 return HttpResponseRedirect(reverse("admin:users_user_changelist"))
         else:
@@ -227,35 +221,30 @@ class UserAdmin(admin.ModelAdmin):
                 link_name = (form.cleaned_data.get("link_name") or "").strip() or None
                 link = form.cleaned_data.get("link") or None
 
+                user_ids = None
                 if recipient_mode == MessageAdminForm.RECIPIENT_SELECTED:
                     id_list = [int(x) for x in form.cleaned_data["selected_user_ids"].split(",") if x.strip().isdigit()]
-                    user_qs = User.objects.filter(id__in=id_list)
-                else:
-                    user_qs = User.objects.all()
+                    user_ids = list(User.objects.filter(id__in=id_list).values_list("id", flat=True))
 
-                created_count, sent, failed = create_messages_for_users(
-                    user_qs=user_qs,
-                    text=text,
-                    link=link,
-                    link_name=link_name,
-                )
-
-                if not created_count:
+                has_recipients = bool(user_ids) if user_ids is not None else User.objects.exists()
+                if not has_recipients:
                     self.message_user(
                         request,
                         "No users found for the selected recipient mode.",
                         level=messages.WARNING,
                     )
-                elif failed:
-                    self.message_user(
-                        request,
-                        f"Created {created_count} messages. Push sent to {sent} devices, failed for {failed} devices.",
-                        level=messages.WARNING,
-                    )
                 else:
+                    job = enqueue_broadcast(
+                        kind=BroadcastJob.KIND_MESSAGE,
+                        text=text,
+                        link=link,
+                        link_name=link_name,
+                        user_ids=user_ids,
+                        created_by=request.user,
+                    )
                     self.message_user(
                         request,
-                        f"Created {created_count} messages and sent push to {sent} devices.",
+                        f"Message broadcast #{job.id} queued for {job.total_users} users.",
                         level=messages.SUCCESS,
                     )
 
@@ -295,6 +284,40 @@ class TelegramOTPAdmin(admin.ModelAdmin):
     list_filter = ("is_used",)
 
 
+@admin.register(BroadcastJob)
+class BroadcastJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "kind",
+        "status",
+        "total_users",
+        "processed_users",
+        "remaining_users",
+        "sent",
+        "failed",
+        "pruned",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("kind", "status")
+    search_fields = ("title", "text")
+    actions = ["requeue_jobs"]
+    readonly_fields = [field.name for field in BroadcastJob._meta.fields] + ["remaining_users"]
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Requeue selected jobs (resume from last processed user)")
+    def requeue_jobs(self, request, queryset):
+        updated = queryset.exclude(status=BroadcastJob.STATUS_COMPLETED).update(
+            status=BroadcastJob.STATUS_PENDING,
+            locked_by="",
+            error="",
+            finished_at=None,
+        )
+        self.message_user(request, f"Requeued {updated} broadcast jobs.", level=messages.SUCCESS)
+
+
 @admin.register(UserDevice)
 class UserDeviceAdmin(admin.ModelAdmin):
     list_display = (
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.services.broadcasts import get_worker_id, run_pending_broadcasts
+
+
+class Command(BaseCommand):
+    help = "Run queued admin broadcasts (push and in-app messages) in resumable chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the jobs that are currently queued, then exit.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Number of recipients handled per chunk (defaults to BROADCAST_CHUNK_SIZE).",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        worker_id = get_worker_id()
+        self.stdout.write(f"Broadcast worker {worker_id} started.")
+
+        while True:
+            processed = run_pending_broadcasts(worker_id=worker_id, chunk_size=options["chunk_size"])
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} broadcast jobs."))
+            if options["once"]:
+                return
+            time.sleep(options["poll_interval"])
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.11 on 2026-10-18 05:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_remove_otp_users_otp_phone_c8c281_idx_otp_purpose_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('push', 'Push notification'), ('message', 'In-app message')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('title', models.CharField(blank=True, default='', max_length=120)),
+                ('text', models.TextField()),
+                ('link', models.URLField(blank=True, null=True)),
+                ('link_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('user_ids', models.JSONField(blank=True, null=True)),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('processed_users', models.PositiveIntegerField(default=0)),
+                ('last_user_id', models.PositiveBigIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('pruned', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('locked_by', models.CharField(blank=True, default='', max_length=64)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='users_broad_status_a7efb9_idx')],
+            },
+        ),
+    ]
@@ -154,3 +154,67 @@ class UserDevice(models.Model):
     def __str__(self):
         return f"{self.user_id}:{self.platform}:{self.device_id}"
 
+
+
+class BroadcastJob(models.Model):
+    KIND_PUSH = "push"
+    KIND_MESSAGE = "message"
+
+    KIND_CHOICES = (
+        (KIND_PUSH, "Push notification"),
+        (KIND_MESSAGE, "In-app message"),
+    )
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    title = models.CharField(max_length=120, blank=True, default="")
+    text = models.TextField()
+    link = models.URLField(null=True, blank=True)
+    link_name = models.CharField(max_length=255, null=True, blank=True)
+    # Explicit recipient ids; null means every user.
+    user_ids = models.JSONField(null=True, blank=True)
+    total_users = models.PositiveIntegerField(default=0)
+    processed_users = models.PositiveIntegerField(default=0)
+    # Keyset cursor: users with a greater id are still to be processed.
+    last_user_id = models.PositiveBigIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    pruned = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    locked_by = models.CharField(max_length=64, blank=True, default="")
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        "users.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} broadcast #{self.pk} ({self.status})"
+
+    @property
+    def remaining_users(self):
+        return max(self.total_users - self.processed_users, 0)
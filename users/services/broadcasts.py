@@ -0,0 +1,185 @@
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from message.services import (
+    MESSAGE_PUSH_TITLE,
+    build_bulk_message_push_payload,
+    bulk_create_messages,
+    get_push_tokens_for_users,
+)
+from users.models import BroadcastJob, User
+
+from .push_notifications import deliver_fcm_notifications
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROADCAST_CHUNK_SIZE = 1000
+DEFAULT_BROADCAST_STALE_AFTER = 300
+
+
+class BroadcastJobLost(Exception):
+    """Raised when another worker has taken over a job this worker was running."""
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+
+def _recipients(user_ids):
+    queryset = User.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(id__in=user_ids)
+    return queryset
+
+
+def enqueue_broadcast(
+    *,
+    kind: str,
+    text: str,
+    title: str = "",
+    link: str | None = None,
+    link_name: str | None = None,
+    user_ids: list[int] | None = None,
+    created_by=None,
+) -> BroadcastJob:
+    """Store a broadcast for the worker; ``user_ids=None`` targets every user."""
+    if user_ids is not None:
+        user_ids = sorted(set(user_ids))
+    return BroadcastJob.objects.create(
+        kind=kind,
+        text=text,
+        title=title,
+        link=link,
+        link_name=link_name,
+        user_ids=user_ids,
+        total_users=_recipients(user_ids).count(),
+        created_by=created_by,
+    )
+
+
+def claim_broadcast_job(worker_id: str, stale_after: int | None = None) -> BroadcastJob | None:
+    """
+    Take the oldest pending job, or a running one whose worker stopped heartbeating.
+
+    Claiming is a conditional UPDATE on the values just read, so two workers
+    racing for the same row cannot both win.
+    """
+    if stale_after is None:
+        stale_after = getattr(settings, "BROADCAST_JOB_STALE_AFTER", DEFAULT_BROADCAST_STALE_AFTER)
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=stale_after)
+
+    candidates = (
+        BroadcastJob.objects.filter(
+            Q(status=BroadcastJob.STATUS_PENDING)
+            | Q(status=BroadcastJob.STATUS_RUNNING, heartbeat_at__lt=stale_before)
+        )
+        .order_by("created_at", "id")
+        .values_list("id", "status", "locked_by")[:10]
+    )
+    for job_id, job_status, locked_by in candidates:
+        claimed = BroadcastJob.objects.filter(id=job_id, status=job_status, locked_by=locked_by).update(
+            status=BroadcastJob.STATUS_RUNNING,
+            locked_by=worker_id,
+            heartbeat_at=now,
+            started_at=F("started_at") if job_status == BroadcastJob.STATUS_RUNNING else now,
+        )
+        if claimed:
+            if job_status == BroadcastJob.STATUS_RUNNING:
+                logger.warning("Resuming stale broadcast job %s previously held by %s", job_id, locked_by)
+            return BroadcastJob.objects.get(id=job_id)
+    return None
+
+
+def _update_owned(job: BroadcastJob, worker_id: str, **fields) -> None:
+    fields.setdefault("heartbeat_at", timezone.now())
+    updated = BroadcastJob.objects.filter(
+        id=job.id,
+        status=BroadcastJob.STATUS_RUNNING,
+        locked_by=worker_id,
+    ).update(**fields)
+    if not updated:
+        raise BroadcastJobLost(job.id)
+
+
+def process_broadcast_chunk(job: BroadcastJob, worker_id: str, chunk_size: int | None = None) -> bool:
+    """
+    Handle the next ``chunk_size`` recipients after ``job.last_user_id``.
+
+    Returns False once no recipients are left. In-app messages are created
+    in the same transaction that advances the cursor, so a restarted worker
+    never duplicates them; pushes are sent after that commit.
+    """
+    chunk_size = chunk_size or getattr(settings, "BROADCAST_CHUNK_SIZE", DEFAULT_BROADCAST_CHUNK_SIZE)
+    user_ids = list(
+        _recipients(job.user_ids)
+        .filter(id__gt=job.last_user_id)
+        .order_by("id")
+        .values_list("id", flat=True)[:chunk_size]
+    )
+    if not user_ids:
+        _update_owned(job, worker_id, status=BroadcastJob.STATUS_COMPLETED, finished_at=timezone.now(), locked_by="")
+        return False
+
+    progress = {
+        "last_user_id": user_ids[-1],
+        "processed_users": F("processed_users") + len(user_ids),
+    }
+    if job.kind == BroadcastJob.KIND_MESSAGE:
+        with transaction.atomic():
+            bulk_create_messages(user_ids, text=job.text, link=job.link, link_name=job.link_name)
+            _update_owned(job, worker_id, **progress)
+        title = MESSAGE_PUSH_TITLE
+        data = build_bulk_message_push_payload(job.link, job.link_name)
+    else:
+        title = job.title
+        data = None
+
+    tokens = get_push_tokens_for_users(user_ids)
+    report = deliver_fcm_notifications(tokens=tokens, title=title, body=job.text[:500], data=data)
+
+    counters = {
+        "sent": F("sent") + report.sent,
+        "failed": F("failed") + report.failed,
+        "pruned": F("pruned") + report.pruned,
+    }
+    if job.kind == BroadcastJob.KIND_PUSH:
+        counters.update(progress)
+    _update_owned(job, worker_id, **counters)
+    job.last_user_id = user_ids[-1]
+    return True
+
+
+def run_broadcast_job(job: BroadcastJob, worker_id: str, chunk_size: int | None = None) -> None:
+    try:
+        while process_broadcast_chunk(job, worker_id, chunk_size=chunk_size):
+            pass
+    except BroadcastJobLost:
+        logger.warning("Broadcast job %s was taken over by another worker", job.id)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Broadcast job %s failed", job.id)
+        BroadcastJob.objects.filter(id=job.id, locked_by=worker_id).update(
+            status=BroadcastJob.STATUS_FAILED,
+            error=str(exc),
+            locked_by="",
+            finished_at=timezone.now(),
+        )
+
+
+def run_pending_broadcasts(worker_id: str | None = None, chunk_size: int | None = None) -> int:
+    """Process jobs until none can be claimed; returns how many were run."""
+    worker_id = worker_id or get_worker_id()
+    count = 0
+    while True:
+        job = claim_broadcast_job(worker_id)
+        if job is None:
+            return count
+        run_broadcast_job(job, worker_id, chunk_size=chunk_size)
+        count += 1
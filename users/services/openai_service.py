@@ -1,5 +1,10 @@
 from django.conf import settings
-from openai import OpenAI
+
+from paylog.ai_reply_cache import get_cached_reply, reply_cache_key, store_reply
+from paylog.openai_clients import get_openai_client
+
+ASSISTANT_MODEL = "gpt-4o-mini"
+REPLY_CACHE_ENDPOINT = "users"
 
 
 class OpenAIServiceError(Exception):
@@ -11,15 +16,21 @@ def get_ai_reply(message: str) -> str:
     if not api_key:
         raise OpenAIServiceError("OPENAI_API_KEY is not configured in settings.py")
 
+    cache_key = reply_cache_key(REPLY_CACHE_ENDPOINT, ASSISTANT_MODEL, [{"role": "user", "content": message}])
+    cached_reply = get_cached_reply(REPLY_CACHE_ENDPOINT, cache_key)
+    if cached_reply is not None:
+        return cached_reply
+
     try:
-        client = OpenAI(api_key=api_key)
+        client = get_openai_client(api_key)
         response = client.responses.create(
-            model="gpt-4o-mini",
+            model=ASSISTANT_MODEL,
             input=message,
         )
         reply = response.output_text.strip()
         if not reply:
             raise OpenAIServiceError("Empty response from OpenAI")
+        store_reply(REPLY_CACHE_ENDPOINT, cache_key, reply)
         return reply
     except OpenAIServiceError:
         raise
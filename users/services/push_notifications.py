@@ -1,12 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 import logging
 from typing import Iterable
 
 from django.conf import settings
+from django.utils.module_loading import import_string
+
+from users.models import UserDevice
 
 logger = logging.getLogger(__name__)
 _firebase_app = None
 
+FCM_MULTICAST_LIMIT = 500
+DEFAULT_FCM_MAX_WORKERS = 4
+DEFAULT_FCM_SENDER_BACKEND = "users.services.push_notifications.FirebaseMulticastSender"
+PRUNE_CHUNK_SIZE = 500
+
+# Per-token delivery outcomes.
+TOKEN_SENT = "sent"
+TOKEN_UNREGISTERED = "unregistered"
+TOKEN_INVALID = "invalid"
+TOKEN_TRANSIENT = "transient"
+TOKEN_FAILED = "failed"
+# Outcomes that will never succeed again for the same token. Only FCM's
+# per-token UNREGISTERED and SENDER_ID_MISMATCH errors prove that; an invalid
+# argument usually means a bad payload, which is not the device's fault.
+DEAD_TOKEN_STATUSES = (TOKEN_UNREGISTERED, TOKEN_INVALID)
+
+
+@dataclass
+class TokenResult:
+    token: str
+    status: str
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status == TOKEN_SENT
+
+
+@dataclass
+class DeliveryReport:
+    results: list[TokenResult] = field(default_factory=list)
+    batches: int = 0
+    pruned: int = 0
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.sent
+
+    def tokens_with_status(self, *statuses: str) -> list[str]:
+        return [result.token for result in self.results if result.status in statuses]
+
+    def stats(self) -> dict[str, int]:
+        counts = {TOKEN_SENT: 0, TOKEN_UNREGISTERED: 0, TOKEN_INVALID: 0, TOKEN_TRANSIENT: 0, TOKEN_FAILED: 0}
+        for result in self.results:
+            counts[result.status] += 1
+        counts["batches"] = self.batches
+        counts["pruned"] = self.pruned
+        return counts
+
 
 def _resolve_service_account_path() -> Path | None:
     raw_path = getattr(settings, "FCM_SERVICE_ACCOUNT_PATH", "").strip()
@@ -72,13 +130,156 @@ def send_fcm_notification(token: str, title: str, body: str, data: dict | None =
         return False, str(exc)
 
 
-def send_bulk_fcm_notifications(tokens: Iterable[str], title: str, body: str, data: dict | None = None) -> tuple[int, int]:
-    sent = 0
-    failed = 0
+def classify_fcm_error(exc: Exception) -> str:
+    try:
+        from firebase_admin import exceptions, messaging
+    except ImportError:
+        return TOKEN_FAILED
+
+    if isinstance(exc, messaging.UnregisteredError):
+        return TOKEN_UNREGISTERED
+    if isinstance(exc, messaging.SenderIdMismatchError):
+        return TOKEN_INVALID
+    if isinstance(
+        exc,
+        (
+            messaging.QuotaExceededError,
+            exceptions.UnavailableError,
+            exceptions.InternalError,
+            exceptions.DeadlineExceededError,
+            exceptions.ResourceExhaustedError,
+        ),
+    ):
+        return TOKEN_TRANSIENT
+    return TOKEN_FAILED
+
+
+def classify_fcm_batch_error(exc: Exception) -> str:
+    """Status for every token of a batch whose multicast call itself raised; never a dead-token status."""
+    status = classify_fcm_error(exc)
+    return TOKEN_FAILED if status in DEAD_TOKEN_STATUSES else status
+
+
+class FirebaseMulticastSender:
+    """Sends one batch of up to 500 tokens with a single Firebase multicast call."""
+
+    def send_multicast(self, tokens: list[str], title: str, body: str, data: dict[str, str]) -> list[TokenResult]:
+        app, init_error = _get_firebase_app()
+        if init_error:
+            return [TokenResult(token, TOKEN_FAILED, init_error) for token in tokens]
+
+        from firebase_admin import messaging
+
+        message = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(title=title, body=body),
+            data=data,
+        )
+        try:
+            response = messaging.send_each_for_multicast(message, app=app)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("FCM multicast failed for %s tokens: %s", len(tokens), exc)
+            status = classify_fcm_batch_error(exc)
+            return [TokenResult(token, status, str(exc)) for token in tokens]
+
+        results = []
+        for token, item in zip(tokens, response.responses):
+            if item.success:
+                results.append(TokenResult(token, TOKEN_SENT))
+            else:
+                results.append(TokenResult(token, classify_fcm_error(item.exception), str(item.exception)))
+        return results
+
+
+def get_fcm_sender():
+    backend = getattr(settings, "FCM_SENDER_BACKEND", DEFAULT_FCM_SENDER_BACKEND)
+    return import_string(backend)()
+
+
+def _iter_batches(tokens: Iterable[str], size: int):
+    batch = []
+    seen = set()
     for token in tokens:
-        ok, _ = send_fcm_notification(token=token, title=title, body=body, data=data)
-        if ok:
-            sent += 1
-        else:
-            failed += 1
-    return sent, failed
+        if not token or token in seen:
+            continue
+        seen.add(token)
+        batch.append(token)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def deliver_fcm_notifications(
+    tokens: Iterable[str],
+    title: str,
+    body: str,
+    data: dict | None = None,
+    *,
+    sender=None,
+    batch_size: int | None = None,
+    max_workers: int | None = None,
+    prune_dead_tokens: bool = True,
+) -> DeliveryReport:
+    """
+    Send a notification to many tokens in multicast batches over a bounded thread pool.
+
+    Tokens are de-duplicated and split into batches of at most 500; each
+    batch is one multicast call. Returns a report with the classified
+    per-token outcome. Devices whose token FCM individually reported as
+    unregistered or belonging to another sender are deleted afterwards
+    unless ``prune_dead_tokens`` is False.
+    """
+    sender = sender or get_fcm_sender()
+    batch_size = min(batch_size or FCM_MULTICAST_LIMIT, FCM_MULTICAST_LIMIT)
+    max_workers = max_workers or getattr(settings, "FCM_MAX_WORKERS", DEFAULT_FCM_MAX_WORKERS)
+    normalized_data = {str(k): str(v) for k, v in (data or {}).items()}
+
+    report = DeliveryReport()
+    batches = list(_iter_batches(tokens, batch_size))
+    if not batches:
+        return report
+
+    def _send(batch):
+        try:
+            return sender.send_multicast(batch, title, body, normalized_data)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("FCM batch of %s tokens failed", len(batch))
+            return [TokenResult(token, TOKEN_FAILED, str(exc)) for token in batch]
+
+    if len(batches) == 1 or max_workers <= 1:
+        outcomes = map(_send, batches)
+    else:
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix="fcm")
+        with executor:
+            outcomes = list(executor.map(_send, batches))
+
+    for results in outcomes:
+        report.batches += 1
+        report.results.extend(results)
+
+    if prune_dead_tokens:
+        report.pruned = prune_dead_fcm_tokens(report.tokens_with_status(*DEAD_TOKEN_STATUSES))
+
+    logger.info("FCM delivery finished: %s", report.stats())
+    return report
+
+
+def prune_dead_fcm_tokens(tokens: list[str]) -> int:
+    """Delete devices whose tokens FCM will never deliver to; returns the number removed."""
+    if not tokens:
+        return 0
+
+    pruned = 0
+    for start in range(0, len(tokens), PRUNE_CHUNK_SIZE):
+        deleted, _ = UserDevice.objects.filter(fcm_token__in=tokens[start:start + PRUNE_CHUNK_SIZE]).delete()
+        pruned += deleted
+    if pruned:
+        logger.info("Pruned %s dead FCM device tokens", pruned)
+    return pruned
+
+
+def send_bulk_fcm_notifications(tokens: Iterable[str], title: str, body: str, data: dict | None = None) -> tuple[int, int]:
+    report = deliver_fcm_notifications(tokens=tokens, title=title, body=body, data=data)
+    return report.sent, report.failed
@@ -0,0 +1,284 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from message.models import Message
+
+from .models import BroadcastJob, User, UserDevice
+from .services.broadcasts import claim_broadcast_job, enqueue_broadcast, process_broadcast_chunk
+from .services.push_notifications import (
+    TOKEN_FAILED,
+    TOKEN_INVALID,
+    TOKEN_SENT,
+    TOKEN_TRANSIENT,
+    TOKEN_UNREGISTERED,
+    FirebaseMulticastSender,
+    TokenResult,
+    deliver_fcm_notifications,
+    send_bulk_fcm_notifications,
+)
+
+
+class InMemoryMulticastSender:
+    """
+    Sender that records batches instead of calling Firebase.
+
+    Tokens listed in ``token_statuses`` get that status; all others succeed.
+    """
+
+    def __init__(self):
+        self.outbox = []
+        self.token_statuses = {}
+        self._lock = threading.Lock()
+
+    def send_multicast(self, tokens, title, body, data):
+        with self._lock:
+            self.outbox.append({"tokens": list(tokens), "title": title, "body": body, "data": data})
+        return [TokenResult(token, self.token_statuses.get(token, TOKEN_SENT)) for token in tokens]
+
+
+def use_in_memory_sender(test_case):
+    """Route every push sent during ``test_case`` to a fresh ``InMemoryMulticastSender``."""
+    sender = InMemoryMulticastSender()
+    patcher = patch("users.services.push_notifications.get_fcm_sender", return_value=sender)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+    return sender
+
+
+class FcmDeliveryTests(TestCase):
+    def setUp(self):
+        self.sender = use_in_memory_sender(self)
+
+    def test_tokens_are_deduplicated_and_sent_in_multicast_batches(self):
+        tokens = [f"token-{i}" for i in range(1200)] + ["token-0", ""]
+
+        report = deliver_fcm_notifications(tokens, "Title", "Body", {"id": 1})
+
+        self.assertEqual(sorted(len(batch["tokens"]) for batch in self.sender.outbox), [200, 500, 500])
+        self.assertEqual(self.sender.outbox[0]["data"], {"id": "1"})
+        self.assertEqual((report.sent, report.failed, report.batches), (1200, 0, 3))
+
+    def test_per_token_results_are_classified(self):
+        self.sender.token_statuses = {
+            "gone": TOKEN_UNREGISTERED,
+            "bad": TOKEN_INVALID,
+            "busy": TOKEN_TRANSIENT,
+        }
+
+        report = deliver_fcm_notifications(["ok", "gone", "bad", "busy"], "Title", "Body")
+
+        self.assertEqual(report.tokens_with_status(TOKEN_UNREGISTERED, TOKEN_INVALID), ["gone", "bad"])
+        self.assertEqual(
+            report.stats(),
+            {"sent": 1, "unregistered": 1, "invalid": 1, "transient": 1, "failed": 0, "batches": 1, "pruned": 0},
+        )
+        self.assertEqual(send_bulk_fcm_notifications(["ok", "gone"], "Title", "Body"), (1, 1))
+
+    def test_batches_run_concurrently_on_a_bounded_pool(self):
+        lock = threading.Lock()
+        active = 0
+        peak = 0
+
+        class SlowSender:
+            def send_multicast(self, tokens, title, body, data):
+                nonlocal active, peak
+                with lock:
+                    active += 1
+                    peak = max(peak, active)
+                time.sleep(0.05)
+                with lock:
+                    active -= 1
+                return [TokenResult(token, TOKEN_SENT) for token in tokens]
+
+        started = time.monotonic()
+        report = deliver_fcm_notifications(
+            [f"token-{i}" for i in range(10)],
+            "Title",
+            "Body",
+            sender=SlowSender(),
+            batch_size=1,
+            max_workers=3,
+        )
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(report.sent, 10)
+        self.assertEqual(peak, 3)
+        self.assertLess(elapsed, 0.45)
+
+    def test_failing_batch_marks_its_tokens_failed(self):
+        class BrokenSender:
+            def send_multicast(self, tokens, title, body, data):
+                raise RuntimeError("connection reset")
+
+        report = deliver_fcm_notifications(["a", "b"], "Title", "Body", sender=BrokenSender())
+
+        self.assertEqual(report.stats()[TOKEN_FAILED], 2)
+        self.assertEqual(report.results[0].error, "connection reset")
+
+    def test_dead_tokens_are_pruned_after_delivery(self):
+        user = User.objects.create_user(phone="+10000000050", password="pass")
+        for token in ("live", "gone", "bad", "busy"):
+            UserDevice.objects.create(
+                user=user,
+                fcm_token=token,
+                platform=UserDevice.PLATFORM_ANDROID,
+                device_id=f"device-{token}",
+            )
+        self.sender.token_statuses = {
+            "gone": TOKEN_UNREGISTERED,
+            "bad": TOKEN_INVALID,
+            "busy": TOKEN_TRANSIENT,
+        }
+
+        report = deliver_fcm_notifications(["live", "gone", "bad", "busy"], "Title", "Body")
+
+        self.assertEqual(report.pruned, 2)
+        self.assertEqual(
+            set(UserDevice.objects.values_list("fcm_token", flat=True)),
+            {"live", "busy"},
+        )
+
+        report = deliver_fcm_notifications(["busy"], "Title", "Body", prune_dead_tokens=False)
+        self.assertEqual(report.pruned, 0)
+
+    @patch("users.services.push_notifications._get_firebase_app", return_value=(object(), ""))
+    def test_payload_error_keeps_devices(self, _app_mock):
+        from firebase_admin import exceptions
+
+        user = User.objects.create_user(phone="+10000000051", password="pass")
+        for token in ("first", "second"):
+            UserDevice.objects.create(
+                user=user,
+                fcm_token=token,
+                platform=UserDevice.PLATFORM_ANDROID,
+                device_id=f"device-{token}",
+            )
+
+        error = exceptions.InvalidArgumentError("Message payload exceeds the 4096 bytes limit")
+        with patch("firebase_admin.messaging.send_each_for_multicast", side_effect=error):
+            report = deliver_fcm_notifications(
+                ["first", "second"], "Title", "Body", {"blob": "x" * 5000}, sender=FirebaseMulticastSender()
+            )
+
+        self.assertEqual((report.sent, report.failed, report.pruned), (0, 2, 0))
+        self.assertEqual(UserDevice.objects.filter(user=user).count(), 2)
+
+
+class FirebaseMulticastSenderTests(SimpleTestCase):
+    @patch("users.services.push_notifications._get_firebase_app", return_value=(object(), ""))
+    def test_firebase_errors_are_classified(self, _app_mock):
+        from firebase_admin import exceptions, messaging
+
+        response = SimpleNamespace(
+            responses=[
+                SimpleNamespace(success=True, exception=None),
+                SimpleNamespace(success=False, exception=messaging.UnregisteredError("gone")),
+                SimpleNamespace(success=False, exception=messaging.SenderIdMismatchError("other project")),
+                SimpleNamespace(success=False, exception=exceptions.InvalidArgumentError("bad payload")),
+                SimpleNamespace(success=False, exception=exceptions.UnavailableError("retry later")),
+            ]
+        )
+        with patch("firebase_admin.messaging.send_each_for_multicast", return_value=response) as send_mock:
+            results = FirebaseMulticastSender().send_multicast(["a", "b", "c", "d", "e"], "Title", "Body", {})
+
+        send_mock.assert_called_once()
+        self.assertEqual(
+            [result.status for result in results],
+            [TOKEN_SENT, TOKEN_UNREGISTERED, TOKEN_INVALID, TOKEN_FAILED, TOKEN_TRANSIENT],
+        )
+
+    @patch("users.services.push_notifications._get_firebase_app", return_value=(object(), ""))
+    def test_batch_level_error_never_marks_tokens_dead(self, _app_mock):
+        from firebase_admin import messaging
+
+        error = messaging.UnregisteredError("whole request rejected")
+        with patch("firebase_admin.messaging.send_each_for_multicast", side_effect=error):
+            results = FirebaseMulticastSender().send_multicast(["a", "b"], "Title", "Body", {})
+
+        self.assertEqual([result.status for result in results], [TOKEN_FAILED, TOKEN_FAILED])
+
+    @patch("users.services.push_notifications._get_firebase_app", return_value=(None, "not configured"))
+    def test_missing_configuration_fails_every_token(self, _app_mock):
+        results = FirebaseMulticastSender().send_multicast(["a", "b"], "Title", "Body", {})
+
+        self.assertEqual([(result.status, result.error) for result in results], [(TOKEN_FAILED, "not configured")] * 2)
+
+
+class BroadcastJobTests(TestCase):
+    def setUp(self):
+        self.sender = use_in_memory_sender(self)
+        self.users = [User.objects.create_user(phone=f"+1000000006{i}", password="pass") for i in range(5)]
+        for user in self.users[:3]:
+            UserDevice.objects.create(
+                user=user,
+                fcm_token=f"token-{user.id}",
+                platform=UserDevice.PLATFORM_ANDROID,
+                device_id=f"device-{user.id}",
+            )
+
+    def test_admin_queues_broadcast_instead_of_sending(self):
+        admin_user = User.objects.create_superuser(phone="+10000000069", password="pass")
+        self.client.force_login(admin_user)
+
+        response = self.client.post(
+            reverse("admin:users_user_send_message"),
+            {"recipient_mode": "all", "text": "Hello everyone"},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        job = BroadcastJob.objects.get()
+        self.assertEqual((job.kind, job.status, job.total_users, job.user_ids), ("message", "pending", 6, None))
+        self.assertFalse(Message.objects.exists())
+        self.assertEqual(self.sender.outbox, [])
+
+    def test_worker_processes_message_broadcast_in_chunks(self):
+        job = enqueue_broadcast(kind=BroadcastJob.KIND_MESSAGE, text="Hello", link="https://example.com", link_name="Open")
+
+        call_command("process_broadcast_jobs", "--once", "--chunk-size", "2", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BroadcastJob.STATUS_COMPLETED)
+        self.assertEqual((job.processed_users, job.remaining_users, job.sent, job.failed), (5, 0, 3, 0))
+        self.assertEqual(Message.objects.filter(text="Hello").count(), 5)
+        self.assertEqual(len(self.sender.outbox), 2)
+        self.assertEqual(self.sender.outbox[0]["data"]["link_name"], "Open")
+
+    def test_stale_job_is_resumed_without_duplicates(self):
+        job = enqueue_broadcast(kind=BroadcastJob.KIND_MESSAGE, text="Resume me")
+        crashed = claim_broadcast_job("worker-a")
+        process_broadcast_chunk(crashed, "worker-a", chunk_size=2)
+        self.assertIsNone(claim_broadcast_job("worker-b"))
+
+        BroadcastJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        resumed = claim_broadcast_job("worker-b")
+        self.assertEqual((resumed.id, resumed.locked_by, resumed.processed_users), (job.id, "worker-b", 2))
+        while process_broadcast_chunk(resumed, "worker-b", chunk_size=2):
+            pass
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_users), (BroadcastJob.STATUS_COMPLETED, 5))
+        self.assertEqual(Message.objects.filter(text="Resume me").count(), 5)
+
+    def test_push_broadcast_targets_selected_users(self):
+        job = enqueue_broadcast(
+            kind=BroadcastJob.KIND_PUSH,
+            title="Title",
+            text="Body",
+            user_ids=[self.users[0].id, self.users[3].id],
+        )
+
+        call_command("process_broadcast_jobs", "--once", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total_users, job.processed_users, job.sent), ("completed", 2, 2, 1))
+        self.assertEqual(self.sender.outbox[0]["tokens"], [f"token-{self.users[0].id}"])
+        self.assertFalse(Message.objects.exists())